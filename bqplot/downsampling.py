@@ -0,0 +1,749 @@
+# Copyright 2015 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+
+============
+Downsampling
+============
+
+Reducers of the points of marks, used by their `downsampling` attribute, the
+aggregation of scattered points in a grid used by `DensityScatter` and the
+resampling of candles used by `OHLC`.
+
+A reducer takes sorted abscissas `x`, ordinates `y` (1d, or 2d with a
+series per row), the domain [lo, hi] of x and a number of buckets (e.g. one
+per pixel), and returns the sorted indices of the points to keep. Reducers
+registered with `aggregate=True` return the boundaries of buckets of
+consecutive points instead, which are averaged.
+
+.. currentmodule:: bqplot.downsampling
+
+.. autosummary::
+   :toctree: _generate/
+
+   register_reducer
+   downsample
+   m4_indices
+   minmax_indices
+   lttb_indices
+   every_nth_indices
+   mean_boundaries
+   MinMaxPyramid
+   TilePyramid
+   density_grid
+   ohlc_period
+   resample_ohlc
+"""
+
+import os
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+
+# name -> (reducer, aggregate)
+reducers = {}
+
+# number of points read at a time from memory-mapped data
+_CHUNK_SIZE = 1 << 20
+
+
+def register_reducer(name, aggregate=False):
+    """Decorator registering a reducer under a name.
+
+    Parameters
+    ----------
+    name: string
+        Value of the `downsampling` attribute of the marks using it.
+    aggregate: bool (default: False)
+        Whether the reducer returns the boundaries of buckets to average,
+        rather than the indices of the points to keep.
+    """
+    def wrap(reducer):
+        reducers[name] = (reducer, aggregate)
+        return reducer
+    return wrap
+
+
+def as_numbers(values):
+    """Numeric view of an array of numbers or dates (as int64)."""
+    values = np.asarray(values)
+    if values.dtype.kind in 'mM':
+        return values.view(np.int64)
+    return values
+
+
+def is_sorted(values):
+    """Whether an array of numbers or dates is sorted (in increasing order),
+    checked a chunk at a time."""
+    numbers = as_numbers(values)
+    for start in range(0, len(numbers) - 1, _CHUNK_SIZE):
+        chunk = numbers[start:start + _CHUNK_SIZE + 1]
+        if not np.all(chunk[1:] >= chunk[:-1]):
+            return False
+    return True
+
+
+def _search_sorted(values, bounds, side='left'):
+    # np.searchsorted, without the conversion of integer values (e.g. dates
+    # as numbers) to the float type of the bounds, which copies them
+    if values.dtype.kind in 'iu':
+        info = np.iinfo(values.dtype)
+        bounds = (np.ceil if side == 'left' else np.floor)(bounds)
+        bounds = np.clip(bounds, info.min, info.max).astype(values.dtype)
+    return np.searchsorted(values, bounds, side=side)
+
+
+def _window(x, lo, hi):
+    # Points in the domain, and the ones right before and after it so that
+    # lines leave the plot area.
+    start = max(_search_sorted(x, lo, side='left') - 1, 0)
+    stop = min(_search_sorted(x, hi, side='right') + 1, len(x))
+    return start, stop
+
+
+def _buckets(xs, lo, hi, width):
+    # Starts and sizes of the non empty buckets of consecutive points in the
+    # same division of the domain, the points outside of it get a bucket on
+    # either side.
+    edges = _search_sorted(xs, lo + (hi - lo) * np.arange(width + 1) / width)
+    starts = np.unique(np.append(edges, 0))
+    starts = starts[starts < len(xs)]
+    return starts, np.diff(np.append(starts, len(xs)))
+
+
+def _first_per_bucket(hit, starts):
+    # Position of the first hit of each bucket (of each row), the buckets
+    # without a hit are dropped.
+    rows, positions = np.divmod(np.flatnonzero(hit), hit.shape[-1])
+    buckets = rows * len(starts) + np.searchsorted(starts, positions, side='right')
+    first = np.ones(len(buckets), dtype=bool)
+    first[1:] = buckets[1:] != buckets[:-1]
+    return positions[first]
+
+
+def _bucket_chunks(starts, counts):
+    # Ranges of consecutive buckets of about _CHUNK_SIZE points (more for a
+    # larger bucket), and the range of their points
+    chunks = (starts - starts[0]) // _CHUNK_SIZE
+    firsts = np.flatnonzero(np.append(True, chunks[1:] != chunks[:-1]))
+    lasts = np.append(firsts[1:], len(starts))
+    for first, last in zip(firsts.tolist(), lasts.tolist()):
+        yield first, last, starts[first], starts[last - 1] + counts[last - 1]
+
+
+def _extrema(ys, starts, counts):
+    # First min and max points of each bucket, and the first NaN for the gaps,
+    # a chunk of buckets at a time so that memory-mapped data is not read at
+    # once
+    kept = []
+    for first, last, lo, hi in _bucket_chunks(starts, counts):
+        chunk, chunk_starts = ys[..., lo:hi], starts[first:last] - lo
+        for reduce in (np.fmin, np.fmax):
+            extremes = np.repeat(reduce.reduceat(chunk, chunk_starts, axis=-1),
+                                 counts[first:last], axis=-1)
+            kept.append(lo + _first_per_bucket(chunk == extremes, chunk_starts))
+        if chunk.dtype.kind == 'f':
+            kept.append(lo + _first_per_bucket(np.isnan(chunk), chunk_starts))
+    return kept
+
+
+@register_reducer('m4')
+def m4_indices(x, y, lo, hi, width):
+    """Indices of the first, last, min and max points of each bucket.
+
+    This draws the same lines as the whole data at the resolution of the
+    buckets, e.g. one per pixel.
+    """
+    x, y = as_numbers(x), as_numbers(y)
+    start, stop = _window(x, lo, hi)
+    if stop - start <= 4 * width or hi <= lo:
+        return np.arange(start, stop)
+    ys = y[..., start:stop]
+    starts, counts = _buckets(x[start:stop], lo, hi, width)
+    kept = [starts, starts + counts - 1] + _extrema(ys, starts, counts)
+    return start + np.unique(np.concatenate(kept))
+
+
+@register_reducer('minmax')
+def minmax_indices(x, y, lo, hi, width):
+    """Indices of the min and max points of each bucket."""
+    x, y = as_numbers(x), as_numbers(y)
+    start, stop = _window(x, lo, hi)
+    if stop - start <= 2 * width or hi <= lo:
+        return np.arange(start, stop)
+    ys = y[..., start:stop]
+    starts, counts = _buckets(x[start:stop], lo, hi, width)
+    kept = [[0, stop - start - 1]] + _extrema(ys, starts, counts)
+    return start + np.unique(np.concatenate(kept))
+
+
+def _bucket_means(values, starts, counts):
+    # Means of the buckets, a chunk of buckets at a time
+    means = np.empty(len(starts))
+    for first, last, lo, hi in _bucket_chunks(starts, counts):
+        sums = np.add.reduceat(values[lo:hi].astype(np.float64), starts[first:last] - lo)
+        means[first:last] = sums / counts[first:last]
+    return means
+
+
+def _lttb_row(xs, ys, starts, counts):
+    # Largest-Triangle-Three-Buckets: the point of each bucket forming the
+    # largest triangle with the point kept in the previous bucket and the
+    # mean of the next bucket. The points are read a bucket at a time.
+    ends = starts + counts
+    mean_x = _bucket_means(xs, starts, counts)
+    mean_y = _bucket_means(ys, starts, counts)
+    kept = np.empty(len(starts), dtype=np.int64)
+    kept[0], kept[-1] = 0, len(xs) - 1
+    a_x, a_y = float(xs[0]), float(ys[0])
+    for i in range(1, len(starts) - 1):
+        s, e = starts[i], ends[i]
+        c_x, c_y = mean_x[i + 1], mean_y[i + 1]
+        b_x, b_y = xs[s:e].astype(np.float64), ys[s:e].astype(np.float64)
+        area = np.abs((a_x - c_x) * (b_y - a_y) - (a_x - b_x) * (c_y - a_y))
+        # NaN areas (gaps) are never the largest, unless the bucket is a gap
+        best = s + (np.nanargmax(area) if not np.isnan(area).all() else 0)
+        kept[i] = best
+        a_x, a_y = float(xs[best]), float(ys[best])
+    return kept
+
+
+@register_reducer('lttb')
+def lttb_indices(x, y, lo, hi, width):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    A point per bucket, chosen to preserve the visual shape of smooth
+    curves. The points of each bucket are processed at once, the buckets
+    one after the other.
+    """
+    x, y = as_numbers(x), as_numbers(y)
+    start, stop = _window(x, lo, hi)
+    if stop - start <= 2 * width or hi <= lo:
+        return np.arange(start, stop)
+    # views, memory-mapped data is read a bucket at a time
+    xs = x[start:stop]
+    ys = np.atleast_2d(y[..., start:stop])
+    starts, counts = _buckets(xs, lo, hi, width)
+    if len(starts) < 3:
+        return start + np.unique([0, len(xs) - 1])
+    kept = [_lttb_row(xs, row, starts, counts) for row in ys]
+    return start + np.unique(np.concatenate(kept))
+
+
+@register_reducer('every_nth')
+def every_nth_indices(x, y, lo, hi, width):
+    """Indices of every n-th point, so that there is about a point per bucket."""
+    start, stop = _window(as_numbers(x), lo, hi)
+    step = max((stop - start) // max(width, 1), 1)
+    return np.unique(np.append(np.arange(start, stop, step), stop - 1))
+
+
+@register_reducer('mean', aggregate=True)
+def mean_boundaries(x, y, lo, hi, width):
+    """Boundaries of the buckets, the points of which are averaged."""
+    x = as_numbers(x)
+    start, stop = _window(x, lo, hi)
+    if stop - start <= width or hi <= lo:
+        return np.arange(start, stop + 1)
+    starts, _ = _buckets(x[start:stop], lo, hi, width)
+    return start + np.append(starts, stop - start)
+
+
+def _mean(values, boundaries):
+    starts, counts = boundaries[:-1], np.diff(boundaries)
+    values = values[..., :boundaries[-1]]
+    if values.dtype.kind in 'mM':
+        means = np.add.reduceat(values.view(np.int64), starts, axis=-1) // counts
+        return means.astype(np.int64).view(values.dtype)
+    if values.dtype.kind in 'biuf':
+        return np.add.reduceat(values, starts, axis=-1) / counts
+    # e.g. strings, the first value of each bucket
+    return values[..., starts]
+
+
+def _first_extremes(values, indices, best, reverse):
+    # Keeps the smallest (largest when reverse) of the values at the given
+    # indices and the best ones so far, the first one on ties. NaN are never
+    # kept.
+    (best_values, best_indices), sign = best, -1 if reverse else 1
+    values = np.where(np.isnan(values), np.inf, sign * values)
+    better = (values < best_values) | ((values == best_values) & (indices < best_indices))
+    return np.where(better, values, best_values), np.where(better, indices, best_indices)
+
+
+class MinMaxPyramid(object):
+
+    """Index of the min and max points of a series, for zoomable downsampling.
+
+    The min and max points of blocks of `block_size` consecutive points are
+    indexed, then of pairs of blocks, and so on (as the levels of a mipmap).
+    The min and max points of any range of points are then found in
+    O(block_size + log n), and the M4 and minmax downsampling of any domain
+    at any width in O(width (block_size + log n)), rather than O(n).
+
+    The index takes 4 / block_size bytes per point (8 over 2^31 points),
+    it is built in a single pass over the data, which may be memory-mapped,
+    and may be saved to be loaded memory-mapped as well.
+
+    Unlike `m4_indices`, the gaps (NaN) within a pixel column are not kept,
+    when the domain has enough points for the index to be used.
+
+    Attributes
+    ----------
+    x: numpy.ndarray
+        1d sorted abscissas, numbers or dates.
+    y: numpy.ndarray
+        Ordinates, 1d or 2d with a series per row.
+    block_size: int
+        Number of points of the blocks of the first level, a power of two.
+    levels: numpy.ndarray
+        Indices of the min and max points of the blocks of all levels, of
+        shape (rows, 2, blocks).
+    """
+
+    def __init__(self, x, y, block_size=64, levels=None):
+        if block_size < 1 or block_size & (block_size - 1):
+            raise ValueError('block_size should be a power of two')
+        self.x, self.y = np.asarray(x), np.asarray(y)
+        self.block_size = block_size
+        self.offsets = self._level_offsets(self.y.shape[-1], block_size)
+        self.levels = self._build() if levels is None else levels
+
+    @staticmethod
+    def _level_offsets(n, block_size):
+        # start of each level in the concatenated levels, and their end
+        offsets, size = [0], -(-n // block_size)
+        while size > 0:
+            offsets.append(offsets[-1] + size)
+            size = size // 2 + size % 2 if size > 1 else 0
+        return offsets
+
+    def _build(self, chunk=1 << 16):
+        y = np.atleast_2d(as_numbers(self.y))
+        n, block = y.shape[-1], self.block_size
+        dtype = np.int32 if n < 2 ** 31 else np.int64
+        levels = np.empty((len(y), 2, self.offsets[-1]), dtype=dtype)
+        blocks = np.arange(self.offsets[1])
+        for row, values in enumerate(y):
+            # first level, a chunk of blocks at a time, for memory-mapped data
+            for start in range(0, self.offsets[1], chunk):
+                stop = min(start + chunk, self.offsets[1])
+                points = values[start * block:stop * block].astype(np.float64)
+                points = np.concatenate([points, np.full((stop - start) * block - len(points), np.nan)])
+                points = points.reshape(stop - start, block)
+                nan = np.isnan(points)
+                first = blocks[start:stop] * block
+                levels[row, 0, start:stop] = first + np.argmin(np.where(nan, np.inf, points), axis=1)
+                levels[row, 1, start:stop] = first + np.argmax(np.where(nan, -np.inf, points), axis=1)
+            # next levels, the extremes of pairs of blocks
+            for level in range(1, len(self.offsets) - 1):
+                previous = levels[row, :, self.offsets[level - 1]:self.offsets[level]]
+                current = levels[row, :, self.offsets[level]:self.offsets[level + 1]]
+                # a trailing block without a pair is kept as it is
+                left, right = previous[:, 0::2], previous[:, 1::2]
+                current[:] = left
+                pairs = right.shape[1]
+                for extreme in range(2):
+                    best = _first_extremes(values[left[extreme, :pairs]], left[extreme, :pairs],
+                                           (np.inf, np.iinfo(dtype).max), extreme == 1)
+                    _, indices = _first_extremes(values[right[extreme]], right[extreme],
+                                                 best, extreme == 1)
+                    current[extreme, :pairs] = indices
+        return levels
+
+    def save(self, path):
+        """Saves the index to a directory, see `load`."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'levels.npy'), self.levels)
+        with open(os.path.join(path, 'pyramid.json'), 'w') as f:
+            json.dump({'block_size': self.block_size, 'size': self.y.shape[-1]}, f)
+
+    @classmethod
+    def load(cls, path, x, y, mmap_mode='r'):
+        """Loads an index saved with `save`, memory-mapped by default.
+
+        Parameters
+        ----------
+        path: string
+            Directory of the index.
+        x, y: numpy.ndarray
+            The series the index was built from, which may be memory-mapped.
+        mmap_mode: {None, 'r', 'r+', 'c'} (default: 'r')
+            See `numpy.load`.
+        """
+        with open(os.path.join(path, 'pyramid.json')) as f:
+            meta = json.load(f)
+        if meta['size'] != np.shape(y)[-1]:
+            raise ValueError('The index was built from a series of %d points, not %d' %
+                             (meta['size'], np.shape(y)[-1]))
+        levels = np.load(os.path.join(path, 'levels.npy'), mmap_mode=mmap_mode)
+        return cls(x, y, meta['block_size'], levels)
+
+    def _range_extremes(self, row, starts, stops):
+        # Indices of the first min and max points of each range of points
+        values, levels = np.atleast_2d(as_numbers(self.y))[row], self.levels[row]
+        n, block = len(values), self.block_size
+        no_index = np.iinfo(np.int64).max
+        best = [(np.full(len(starts), np.inf), np.full(len(starts), no_index)) for _ in range(2)]
+
+        def keep(extreme, candidates, mask):
+            kept = _first_extremes(values[candidates], candidates, best[extreme], extreme == 1)
+            best[extreme] = tuple(np.where(mask, new, old) for new, old in zip(kept, best[extreme]))
+
+        # the points before the first whole block and after the last one
+        head_stops = np.minimum(stops, -(-starts // block) * block)
+        tail_starts = np.maximum(head_stops, stops // block * block)
+        for first, last in ((starts, head_stops), (tail_starts, stops)):
+            indices = first[:, None] + np.arange(block)
+            mask = indices < last[:, None]
+            indices = np.minimum(indices, n - 1)
+            points = values[indices].astype(np.float64)
+            mask &= ~np.isnan(points)
+            for extreme, sign in ((0, 1), (1, -1)):
+                position = np.argmin(np.where(mask, sign * points, np.inf), axis=1)
+                keep(extreme, indices[np.arange(len(indices)), position], mask.any(axis=1))
+
+        # the whole blocks, from the finest level to the coarsest
+        left, right = -(-starts // block), stops // block
+        for level in range(len(self.offsets) - 1):
+            blocks = levels[:, self.offsets[level]:self.offsets[level + 1]]
+            size = blocks.shape[1]
+            take_left = (left < right) & (left % 2 == 1)
+            take_right = (left + take_left < right) & (right % 2 == 1)
+            for extreme in range(2):
+                keep(extreme, blocks[extreme, np.minimum(left, size - 1)], take_left)
+                keep(extreme, blocks[extreme, np.clip(right - 1, 0, size - 1)], take_right)
+            left, right = (left + take_left) // 2, (right - take_right) // 2
+        # the ranges of NaN only get their first point
+        return [np.where(indices == no_index, starts, indices) for _, indices in best]
+
+    def indices(self, lo, hi, width, first_last=True):
+        """Indices of the points of the M4 (or minmax) downsampling.
+
+        See `m4_indices`.
+
+        Parameters
+        ----------
+        lo, hi: numbers
+            Domain of x, in the units of `as_numbers(x)`.
+        width: int
+            Number of buckets.
+        first_last: bool (default: True)
+            Whether to keep the first and last points of the buckets (M4),
+            or only the min and max ones.
+        """
+        x = as_numbers(self.x)
+        start, stop = _window(x, lo, hi)
+        if stop - start < 8 * self.block_size * width or hi <= lo:
+            # scanning the points is faster
+            reducer = m4_indices if first_last else minmax_indices
+            return reducer(x, self.y, lo, hi, width)
+        edges = _search_sorted(x, lo + (hi - lo) * np.arange(width + 1) / width)
+        bounds = np.unique(np.clip(np.concatenate([[start], edges, [stop]]), start, stop))
+        starts, stops = bounds[:-1], bounds[1:]
+        kept = [[start, stop - 1]]
+        if first_last:
+            kept += [starts, stops - 1]
+        for row in range(np.atleast_2d(self.y).shape[0]):
+            kept += self._range_extremes(row, starts, stops)
+        return np.unique(np.concatenate(kept))
+
+
+class TilePyramid(object):
+
+    """Tiles of a matrix at decreasing resolutions, for zoomable heat maps.
+
+    The level 0 is the matrix, each cell of a level is the mean of a block
+    of 2x2 cells of the previous level (ignoring NaN), down to a level of a
+    single tile. The levels are split in square tiles, computed on demand
+    from the tiles of the previous level, and kept in a LRU cache in the
+    kernel. The matrix, which may be memory-mapped, is read a tile at a
+    time.
+
+    Attributes
+    ----------
+    values: numpy.ndarray
+        The 2d matrix.
+    tile_size: int
+        Number of rows and columns of the tiles.
+    cache_size: int
+        Maximum number of tiles in the cache.
+    """
+
+    def __init__(self, values, tile_size=256, cache_size=256):
+        if tile_size < 1 or tile_size & (tile_size - 1):
+            raise ValueError('tile_size should be a power of two')
+        self.values = values
+        self.tile_size = tile_size
+        self.cache_size = cache_size
+        self.shapes = [tuple(np.shape(values))]
+        while max(self.shapes[-1]) > tile_size:
+            self.shapes.append(tuple(-(-size // 2) for size in self.shapes[-1]))
+        self._tiles = OrderedDict()
+
+    def tile(self, level, row, column):
+        """Tile of a level, as a float64 array of at most tile_size x
+        tile_size cells."""
+        key = (level, row, column)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+        size = self.tile_size
+        if level == 0:
+            tile = np.asarray(self.values[row * size:(row + 1) * size,
+                                          column * size:(column + 1) * size],
+                              dtype=np.float64)
+        else:
+            rows, columns = self.shapes[level]
+            height = min(size, rows - row * size)
+            width = min(size, columns - column * size)
+            # the (up to) four tiles of the previous level, padded with NaN
+            blocks = np.full((2 * size, 2 * size), np.nan)
+            below = self.shapes[level - 1]
+            for i in range(2):
+                for j in range(2):
+                    if (2 * row + i) * size < below[0] and (2 * column + j) * size < below[1]:
+                        child = self.tile(level - 1, 2 * row + i, 2 * column + j)
+                        blocks[i * size:i * size + child.shape[0],
+                               j * size:j * size + child.shape[1]] = child
+            blocks = blocks[:2 * height, :2 * width].reshape(height, 2, width, 2)
+            valid = ~np.isnan(blocks)
+            counts = valid.sum(axis=(1, 3))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                tile = np.where(valid, blocks, 0).sum(axis=(1, 3)) / counts
+        self._tiles[key] = tile
+        if len(self._tiles) > self.cache_size:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def region(self, level, rows, columns):
+        """Cells of a level in the given ranges of tiles.
+
+        Parameters
+        ----------
+        level: int
+            The level, 0 for the matrix.
+        rows, columns: tuples
+            Ranges (start, stop) of the rows and columns of tiles.
+        """
+        return np.block([[self.tile(level, row, column) for column in range(*columns)]
+                         for row in range(*rows)])
+
+
+def downsample(method, arrays, lo, hi, width, index=None, return_rows=False):
+    """Downsamples the points of a mark with a registered reducer.
+
+    Parameters
+    ----------
+    method: string
+        Name of the reducer.
+    arrays: dict
+        The data attributes of the mark, by name, with the points along the
+        last axis. 'x' is 1d and sorted, 'y' is used by the reducers to pick
+        the points.
+    lo, hi: numbers
+        Domain of x, in the units of `as_numbers(x)`.
+    width: int
+        Number of buckets.
+    index: MinMaxPyramid or None (default: None)
+        Index of x and y, used by the 'm4' and 'minmax' reducers.
+    return_rows: bool (default: False)
+        Whether to return the rows of the points kept as well, or the
+        boundaries of the buckets for the aggregating reducers.
+
+    Returns
+    -------
+    The downsampled arrays, by name, and the rows of the points kept (or the
+    boundaries of the buckets) when `return_rows` is True.
+    """
+    reducer, aggregate = reducers[method]
+    if index is not None and method in ('m4', 'minmax') and \
+            index.y.shape[-1] == arrays['y'].shape[-1]:
+        selection = index.indices(lo, hi, width, first_last=method == 'm4')
+    else:
+        selection = reducer(arrays['x'], arrays['y'], lo, hi, width)
+    if aggregate:
+        downsampled = {name: _mean(values, selection) for name, values in arrays.items()}
+    else:
+        downsampled = {name: values[..., selection] for name, values in arrays.items()}
+    if return_rows:
+        return downsampled, np.asarray(selection, dtype=np.int64)
+    return downsampled
+
+
+def density_grid(x, y, x_domain, y_domain, width, height, weights=None):
+    """Aggregates scattered points in a regular grid.
+
+    Parameters
+    ----------
+    x, y: numpy.ndarray
+        Coordinates of the points (1d, numbers or dates), in any order.
+    x_domain, y_domain: tuples
+        Domains of x and y covered by the grid, in the units of
+        `as_numbers`. The points outside of them are dropped.
+    width, height: int
+        Number of columns and rows of the grid.
+    weights: numpy.ndarray or None (default: None)
+        Weights of the points, which are summed instead of counted.
+
+    Returns
+    -------
+    The centers of the columns and rows, with the type of x and y, and the
+    grid of shape (height, width), with NaN in the empty cells.
+    """
+    n = min(len(x), len(y))
+    columns, rows = width, height
+    domains = [(lo - 0.5, hi + 0.5) if hi <= lo else (lo, hi)
+               for lo, hi in (x_domain, y_domain)]
+    grid = np.zeros(rows * columns)
+    counts = grid if weights is None else np.zeros(rows * columns, dtype=np.int64)
+    # a chunk of points at a time, for memory-mapped data
+    for start in range(0, n, _CHUNK_SIZE):
+        stop = min(start + _CHUNK_SIZE, n)
+        cells = np.zeros(stop - start, dtype=np.int64)
+        inside = np.ones(stop - start, dtype=bool)
+        for values, (lo, hi), size, stride in ((x, domains[0], columns, 1),
+                                                (y, domains[1], rows, columns)):
+            numbers = as_numbers(values[start:stop]).astype(np.float64)
+            position = (numbers - lo) * (size / (hi - lo))
+            # the upper bound is in the last cell, NaNs are outside
+            inside &= (position >= 0) & (position <= size)
+            position = np.minimum(position, size - 1, where=inside, out=position)
+            cells += stride * position.astype(np.int64, casting='unsafe')
+        cells = cells[inside]
+        if weights is None:
+            grid += np.bincount(cells, minlength=rows * columns)
+        else:
+            chunk_weights = np.asarray(weights[start:stop], dtype=np.float64)[inside]
+            grid += np.bincount(cells, chunk_weights, minlength=rows * columns)
+            counts += np.bincount(cells, minlength=rows * columns)
+    grid[counts == 0] = np.nan
+    centers = []
+    for values, (lo, hi), size in ((x, domains[0], columns), (y, domains[1], rows)):
+        center = lo + (hi - lo) * (np.arange(size) + 0.5) / size
+        if values.dtype.kind == 'M':
+            center = center.astype(np.int64).view(values.dtype)
+        centers.append(center)
+    return centers[0], centers[1], grid.reshape(rows, columns)
+
+
+# Periods of the candles of the resampling of dates, as (count, unit)
+DATE_PERIODS = [(1, 's'), (5, 's'), (15, 's'), (30, 's'),
+                (1, 'm'), (5, 'm'), (15, 'm'), (30, 'm'),
+                (1, 'h'), (4, 'h'), (1, 'D'), (1, 'W'),
+                (1, 'M'), (3, 'M'), (1, 'Y'), (2, 'Y'), (5, 'Y'), (10, 'Y'),
+                (20, 'Y'), (50, 'Y'), (100, 'Y')]
+
+# approximate length of the calendar units, in seconds
+_UNIT_SECONDS = {'W': 7 * 86400, 'M': 30.44 * 86400, 'Y': 365.25 * 86400}
+
+
+def _period_seconds(period):
+    count, unit = period
+    if unit in _UNIT_SECONDS:
+        return count * _UNIT_SECONDS[unit]
+    return count * (np.timedelta64(1, unit) / np.timedelta64(1, 's'))
+
+
+def ohlc_period(x, span, candles):
+    """Shortest period of candles such that at most `candles` of them span
+    `span`.
+
+    Parameters
+    ----------
+    x: numpy.ndarray
+        Abscissas of the candles (numbers or dates).
+    span: number
+        Width of the domain, in the units of `as_numbers(x)`.
+    candles: int
+        Maximum number of candles in the domain.
+
+    Returns
+    -------
+    A (count, unit) tuple of `DATE_PERIODS` for dates, a power of ten times
+    1, 2 or 5 for numbers.
+    """
+    candles = max(candles, 1)
+    if x.dtype.kind == 'M':
+        unit, _ = np.datetime_data(x.dtype)
+        seconds = span * (np.timedelta64(1, unit) / np.timedelta64(1, 's'))
+        for period in DATE_PERIODS:
+            if seconds / _period_seconds(period) <= candles:
+                return period
+        return DATE_PERIODS[-1]
+    step = span / candles
+    if step <= 0:
+        return 1.
+    magnitude = 10. ** np.floor(np.log10(step))
+    for factor in (1., 2., 5., 10.):
+        if factor * magnitude >= step:
+            return factor * magnitude
+
+
+def _period_starts(x, period):
+    # Start of the period of each abscissa, with the type of x
+    if x.dtype.kind != 'M':
+        return np.floor(as_numbers(x) / period) * period
+    count, unit = period
+    if unit == 'W':
+        # weeks start on Mondays, 1970-01-01 is a Thursday
+        days = x.astype('datetime64[D]').view(np.int64) + 3
+        starts = (days // (7 * count) * 7 * count - 3).view('datetime64[D]')
+    else:
+        values = x.astype('datetime64[%s]' % unit).view(np.int64)
+        starts = (values // count * count).view('datetime64[%s]' % unit)
+    return starts.astype(x.dtype)
+
+
+def resample_ohlc(x, y, period, format='ohlc'):
+    """Aggregates candles in candles of a longer period.
+
+    Parameters
+    ----------
+    x: numpy.ndarray
+        Sorted abscissas of the candles (numbers or dates).
+    y: numpy.ndarray
+        Values of the candles, with a row per candle and the columns given by
+        `format`.
+    period: tuple or number
+        Period of the new candles, as returned by `ohlc_period`. The dates
+        are aligned on the calendar (e.g. months start on the first day).
+    format: string (default: 'ohlc')
+        Columns of y, the opens are the first ones of the period, the highs
+        the maximum, the lows the minimum and the closes the last ones.
+
+    Returns
+    -------
+    The starts of the periods with candles, and their values.
+    """
+    if len(x) == 0:
+        return x[:0], y[:0]
+    starts = _period_starts(x, period)
+    first = np.flatnonzero(np.append(True, starts[1:] != starts[:-1]))
+    last = np.append(first[1:], len(x)) - 1
+    columns = []
+    for column, kind in enumerate(format):
+        values = y[:, column]
+        if kind == 'o':
+            columns.append(values[first])
+        elif kind == 'c':
+            columns.append(values[last])
+        elif kind == 'h':
+            columns.append(np.fmax.reduceat(values, first))
+        else:
+            columns.append(np.fmin.reduceat(values, first))
+    return starts[first], np.stack(columns, axis=1)
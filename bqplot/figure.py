@@ -24,11 +24,14 @@ Figure
    :toctree: _generate/
 
    Figure
+   UpdateScheduler
 """
 
+import asyncio
+
 from traitlets import (
     Bool, Unicode, Instance, List, Dict, Enum, Float, Int, TraitError, default,
-    validate
+    observe, validate
 )
 from ipywidgets import DOMWidget, register, widget_serialization
 
@@ -36,6 +39,7 @@ from bqscales import Scale, LinearScale
 from .interacts import Interaction
 from .marks import Mark
 from .axes import Axis
+from .traits import BufferRegistry
 from ._version import __frontend_version__
 
 
@@ -87,6 +91,13 @@ class Figure(DOMWidget):
         CSS style to be applied to the title of the figure
     animation_duration: nonnegative int (default: 0)
         Duration of transition on change of data attributes, in milliseconds.
+    share_buffers: bool (default: False)
+        When a data attribute of a mark is updated with an array that another
+        mark of the figure already holds (e.g. a common x array), only a
+        reference to that array is sent to the frontend, and the marks share
+        it. The marks share their arrays from when they are added to the
+        figure, their initial state is sent whole. This attribute is not
+        synced.
 
     Layout Attributes
     -----------------
@@ -155,8 +166,11 @@ class Figure(DOMWidget):
     animation_duration = Int().tag(sync=True,
                                    display_name='Animation duration')
     display_toolbar = Bool(default_value=True).tag(sync=True)
+    share_buffers = Bool(False)
 
     def __init__(self, **kwargs):
+        self._buffer_registry = BufferRegistry()
+        self._update_scheduler = None
         super(Figure, self).__init__(**kwargs)
 
         self._upload_png_callback = None
@@ -225,6 +239,19 @@ class Figure(DOMWidget):
         self._upload_svg_callback = callback
         self.send({'type': 'upload_svg'})
 
+    @observe('marks', 'share_buffers')
+    def _observe_share_buffers(self, change):
+        if change['name'] == 'marks':
+            for mark in change['old'] or []:
+                if mark not in change['new'] and \
+                        mark._buffer_registry is self._buffer_registry:
+                    self._buffer_registry.release_widget(mark)
+                    mark._buffer_registry = None
+        elif not self.share_buffers:
+            self._buffer_registry = BufferRegistry()
+        for mark in self.marks:
+            mark._buffer_registry = self._buffer_registry if self.share_buffers else None
+
     @validate('min_aspect_ratio', 'max_aspect_ratio')
     def _validate_aspect_ratio(self, proposal):
         value = proposal['value']
@@ -236,6 +263,39 @@ class Figure(DOMWidget):
             raise TraitError('setting max_aspect_ratio < min_aspect_ratio')
         return value
 
+    def batch_updates(self, max_rate=30):
+        """Coalesces the updates of the figure and of its marks, axes and
+        scales, which are then sent to the frontend at most `max_rate` times
+        per second.
+
+        Returns the `UpdateScheduler`, which can also be used as a context
+        manager, e.g.
+
+            with fig.batch_updates(max_rate=30):
+                ...
+
+        Parameters
+        ----------
+        max_rate: float (default: 30)
+            maximum number of updates per second.
+        """
+        if self._update_scheduler is not None and self._update_scheduler.running:
+            self._update_scheduler.max_rate = max_rate
+        else:
+            self._update_scheduler = UpdateScheduler(self, max_rate)
+            self._update_scheduler.start()
+        return self._update_scheduler
+
+    def _widgets(self):
+        """The figure and the widgets it displays."""
+        widgets = [self, self.scale_x, self.scale_y, self.interaction]
+        for mark in self.marks:
+            widgets.append(mark)
+            widgets.extend(mark.scales.values())
+        for axis in self.axes:
+            widgets.extend([axis, axis.scale])
+        return [widget for widget in widgets if widget is not None]
+
     def _handle_custom_msgs(self, _, content, buffers=None):
         if content.get('event') == 'upload_png':
             try:
@@ -254,3 +314,113 @@ class Figure(DOMWidget):
     _model_module = Unicode('bqplot').tag(sync=True)
     _view_module_version = Unicode(__frontend_version__).tag(sync=True)
     _model_module_version = Unicode(__frontend_version__).tag(sync=True)
+
+
+class UpdateScheduler(object):
+
+    """Coalesces the updates of the widgets of a figure.
+
+    While the scheduler is running, the changes of the synced attributes of
+    the figure, of its marks, axes, scales and interaction are not sent right
+    away: they are sent by `flush`, which is called by an asyncio task at most
+    `max_rate` times per second. Only the latest value of an attribute is sent,
+    whatever the number of changes in between.
+
+    Without a running asyncio event loop (e.g. outside of a kernel), the
+    updates are only sent by `flush` and `stop`. A widget which fails to send
+    its updates is no longer held, its changes are then sent right away.
+
+    Attributes
+    ----------
+    figure: Figure
+        the figure whose updates are coalesced
+    max_rate: float
+        maximum number of updates per second
+    flushes: int
+        number of flushes which sent updates
+    """
+
+    def __init__(self, figure, max_rate=30):
+        self.figure = figure
+        self.max_rate = max_rate
+        self.flushes = 0
+        self.running = False
+        # widget -> its entered `hold_sync` context, which sends the changes
+        # of the widget once exited (a no-op when the widget is already held)
+        self._holds = {}
+        # widget -> names of the synced attributes changed since the last flush
+        self._changed = {}
+        # widgets which failed to send their updates
+        self._failed = set()
+        self._task = None
+
+    def _hold(self):
+        # the widgets of the figure, including the ones added since the last
+        # flush
+        for widget in self.figure._widgets():
+            if widget not in self._holds and widget not in self._failed:
+                widget.observe(self._record_change, names=list(widget.keys))
+                hold = widget.hold_sync()
+                hold.__enter__()
+                self._holds[widget] = hold
+
+    def _record_change(self, change):
+        self._changed.setdefault(change['owner'], set()).add(change['name'])
+
+    def start(self):
+        self.running = True
+        self._hold()
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        except RuntimeError:
+            # no running event loop
+            self._task = None
+
+    async def _run(self):
+        while self.running:
+            await asyncio.sleep(1. / self.max_rate)
+            try:
+                self.flush()
+            except Exception:
+                # the updates keep on being sent
+                self.figure.log.exception('Error sending the updates of a figure')
+
+    def flush(self):
+        """Sends the pending updates.
+
+        The widgets are released, which sends their updates, and the widgets
+        of the figure held again: the widgets removed from the figure are no
+        longer held. The first error raised by a widget is raised once all
+        the widgets are released, that widget is no longer held.
+        """
+        error = None
+        holds, self._holds = self._holds, {}
+        changed, self._changed = self._changed, {}
+        for widget, hold in holds.items():
+            widget.unobserve(self._record_change, names=list(widget.keys))
+            try:
+                hold.__exit__(None, None, None)
+            except Exception as e:
+                # not held again, rather than failing at every flush
+                self._failed.add(widget)
+                error = error or e
+        if changed:
+            self.flushes += 1
+        if self.running:
+            self._hold()
+        if error is not None:
+            raise error
+
+    def stop(self):
+        """Sends the pending updates and stops coalescing them."""
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
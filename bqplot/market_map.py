@@ -18,7 +18,7 @@ from ipywidgets import (DOMWidget, CallbackDispatcher, Color,
                         widget_serialization)
 from ipywidgets.widgets.widget_layout import LayoutTraitType
 
-from .traits import (array_serialization, dataframe_serialization,
+from .traits import (array_serialization, dataframe_columns_serialization,
                      dataframe_warn_indexname)
 from .marks import CATEGORY10
 from ._version import __frontend_version__
@@ -163,7 +163,7 @@ class MarketMap(DOMWidget):
     display_text = Array(None, allow_none=True)\
         .tag(sync=True, **array_serialization)
     ref_data = DataFrame(None, allow_none=True)\
-        .tag(sync=True, **dataframe_serialization)\
+        .tag(sync=True, **dataframe_columns_serialization)\
         .valid(dataframe_warn_indexname)
     title = Unicode().tag(sync=True)
 
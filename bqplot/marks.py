@@ -14,20 +14,25 @@
 
 import os
 import json
+import time
+import asyncio
 
 from warnings import warn
 import ipywidgets as widgets
 from ipywidgets import (Widget, DOMWidget, CallbackDispatcher,
                         Color, widget_serialization)
 from traitlets import (Int, Unicode, List, Enum, Dict, Bool, Float,
-                       Instance, TraitError, validate)
-from traittypes import Array
+                       Instance, TraitError, observe, validate)
 
 from numpy import histogram
 import numpy as np
 
-from bqscales import Scale, OrdinalScale, LinearScale
-from .traits import (Date, array_serialization,
+from bqscales import Scale, OrdinalScale, LinearScale, ColorScale
+from .downsampling import (MinMaxPyramid, TilePyramid, as_numbers, density_grid,
+                           downsample, is_sorted, ohlc_period, reducers,
+                           resample_ohlc, _search_sorted)
+from .traits import (Array, Date, array_serialization, array_to_json, array_from_json,
+                     array_delta_to_json, is_memory_mapped, RingBuffer,
                      array_squeeze, array_dimension_bounds, array_supported_kinds)
 from ._version import __frontend_version__
 from .colorschemes import CATEGORY10
@@ -45,6 +50,25 @@ def register_mark(key=None):
     return wrap
 
 
+# Splits the binary values (e.g. array buffers) out of the content of a
+# custom message, as the widget protocol sends them: returns the content with
+# None in their place, their paths in the content and the buffers.
+def _split_buffers(content):
+    paths, buffers = [], []
+
+    def split(value, path):
+        if isinstance(value, (memoryview, bytes, bytearray)):
+            paths.append(path)
+            buffers.append(value)
+            return None
+        if isinstance(value, dict):
+            return {key: split(item, path + [key]) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return type(value)(split(item, path + [index]) for index, item in enumerate(value))
+        return value
+    return split(content, []), paths, buffers
+
+
 # Shape constraint for array-types
 def shape(*dimensions):
     def validator(trait, value):
@@ -138,6 +162,67 @@ class Mark(Widget):
         places the tooltip at the center of the figure. If tooltip is linked to
         a click event, 'mouse' places the tooltip at the location of the click
         that triggered the tooltip to be visible.
+    wire_dtype: {None, 'float32'} (default: None)
+        Precision used to send the floating point and date data attributes to
+        the frontend. 'float32' halves the size of the payloads, which is
+        enough for pixel precision. Dates are then sent as ms relative to the
+        earliest date of the array. The float arrays sent back by the frontend
+        (e.g. moved points) are converted back to float64. This attribute is
+        not synced.
+    compression: {None, 'zlib'} (default: None)
+        Compression of the data attributes sent to the frontend. Only the
+        arrays larger than 64kB are compressed, after byte shuffling. This
+        is worth it on slow connections. This attribute is not synced.
+    delta_sync: bool (default: False)
+        When updating a 1d data attribute, only send the elements that differ
+        from the previously sent array (e.g. the appended ones) to the frontend.
+        The kernel keeps a copy of the last sent arrays. This attribute is not
+        synced.
+    max_points: int or None (default: None)
+        When set, `extend` and `append` only keep the last `max_points` points
+        of the data attributes (e.g. a rolling window over a stream), in
+        buffers of fixed size, both in the kernel and in the frontend. The
+        older points are evicted. This attribute is not synced.
+    sync_policy: {None, 'latest', 'coalesce', 'block'} (default: None)
+        How updates are sent to a frontend which is slow to apply them (e.g. a
+        backgrounded tab). When set, the frontend acknowledges the updates it
+        applied, and when `max_pending` updates are not acknowledged:
+        - 'latest': the updates are held back, only the latest values of the
+        changed attributes are sent once the frontend caught up.
+        - 'coalesce': same as 'latest', except that the points given to
+        `extend` are accumulated and sent together rather than as whole
+        arrays.
+        - 'block': the updates are sent anyway, the producer of the data may
+        wait for the frontend with `await mark.wait_for_acks()`.
+        See `sync_metrics`. This attribute is not synced.
+    max_pending: int (default: 2)
+        Number of updates which may be waiting for an acknowledgement of the
+        frontend, when `sync_policy` is set. This attribute is not synced.
+    downsampling: {None, 'm4', 'minmax', 'lttb', 'every_nth', 'mean'} (default: None)
+        Name of a reducer of `bqplot.downsampling`. When set, the kernel keeps
+        the whole data attributes and only sends the points needed at the
+        resolution of the figure, over the domain of the x scale and one more
+        domain width on each side:
+        - 'm4': the first, last, min and max points of each pixel column,
+        which draws the same lines.
+        - 'minmax': the min and max points of each pixel column.
+        - 'lttb': a point per pixel column, preserving the shape of smooth
+        curves (Largest-Triangle-Three-Buckets).
+        - 'every_nth': about a point per pixel column.
+        - 'mean': the mean of the points of each pixel column.
+        The points are recomputed when the domain changes, e.g. on pan and
+        zoom with PanZoom. Only the marks with 1d and sorted x and a y
+        with a value per point (along its last axis), and the scaled
+        attributes with a value per point, are downsampled. The
+        changes made in the frontend (e.g. with HandDraw), the selections and
+        the indices of the events refer to the rows of the data; the means
+        stand for the rows of their pixel columns and cannot be changed in
+        the frontend. This attribute is not synced.
+    downsampling_index: MinMaxPyramid or None (default: None)
+        Index of the x and y data attributes, which speeds up the 'm4' and
+        'minmax' downsampling of large series on pan and zoom, e.g. loaded
+        memory-mapped with `MinMaxPyramid.load`. When None, it is built for
+        the series of more than 4M points. This attribute is not synced.
 
     Methods
     -------
@@ -176,6 +261,28 @@ class Mark(Widget):
     interactions = Dict({'hover': 'tooltip'}).tag(sync=True)
     tooltip_location = Enum(['mouse', 'center'], default_value='mouse')\
         .tag(sync=True)
+    wire_dtype = Enum(['float32'], default_value=None, allow_none=True)
+    compression = Enum(['zlib'], default_value=None, allow_none=True)
+    delta_sync = Bool(False)
+    max_points = Int(None, allow_none=True, min=1)
+    sync_policy = Enum(['latest', 'coalesce', 'block'], default_value=None, allow_none=True)
+    max_pending = Int(2, min=1)
+    downsampling = Unicode(None, allow_none=True)
+    downsampling_index = Instance(MinMaxPyramid, allow_none=True)
+    # whether the data sent depends on the size of the plot area, which the
+    # frontend only reports then
+    _needs_plot_size = Bool(False).tag(sync=True)
+
+    # axis along which `extend` appends to 2d data attributes
+    _extend_axis = -1
+    # seconds after which an update which is not acknowledged is considered
+    # lost (e.g. no frontend is displaying the mark)
+    _ack_timeout = 10.
+    # size of the series for which an index is built for the downsampling
+    _index_min_points = 1 << 22
+    # whether the indices of the element events (e.g. element_click) are the
+    # ones of the points, rather than of the lines
+    _point_events = False
 
     _model_name = Unicode('MarkModel').tag(sync=True)
     _model_module = Unicode('bqplot').tag(sync=True)
@@ -214,6 +321,614 @@ class Mark(Widget):
                 )
             ]
 
+    def _array_trait_names(self):
+        return [name for name, trait in self.traits(sync=True).items()
+                if trait.metadata.get('to_json') is array_to_json]
+
+    def _notify_trait(self, name, old_value, new_value):
+        # an array set again after an in place modification: the results
+        # computed from it are stale (hold_trait_notifications also sets the
+        # values again, under the cross validation lock)
+        if old_value is new_value and isinstance(new_value, np.ndarray) and \
+                not self._cross_validation_lock:
+            self._clear_array_caches()
+        super(Mark, self)._notify_trait(name, old_value, new_value)
+
+    def _clear_array_caches(self):
+        self._downsampled = None
+        self._sorted_x = (None, False)
+        self._index = None
+
+    @observe('wire_dtype', 'compression')
+    def _observe_wire_format(self, change):
+        # Resend the arrays with the new precision/compression
+        self._delta_baselines.clear()
+        if self.comm is not None:
+            self.send_state(self._array_trait_names())
+
+    @observe('delta_sync')
+    def _observe_delta_sync(self, change):
+        self._delta_baselines.clear()
+
+    @observe('sync_policy', 'max_pending')
+    def _observe_sync_policy(self, change):
+        if not self._lagging():
+            self._send_held_back()
+
+    @property
+    def sync_metrics(self):
+        """Counters of the updates sent to the frontend, when `sync_policy` is set.
+
+        - sent: updates sent to the frontend.
+        - acked: updates acknowledged by the frontend.
+        - pending: updates waiting for an acknowledgement.
+        - held_back: updates held back while the frontend was lagging, and
+          superseded by a later one.
+        - timeouts: updates never acknowledged, see `_ack_timeout`.
+        - latency: seconds between the last acknowledged update and its
+          acknowledgement.
+        """
+        return dict(self._sync_metrics, pending=len(self._pending_syncs))
+
+    def send_state(self, key=None):
+        if key is not None and self._reduces([key] if isinstance(key, str) else key):
+            # the downsampled attributes are sent together, with the indices
+            # which refer to the points sent
+            key = set([key] if isinstance(key, str) else key) | \
+                set(self._downsampled_names()) | \
+                {name for name in ('selected', 'hovered_point')
+                 if name in self.keys and getattr(self, name) is not None}
+        if key is None:
+            # The full state is requested (e.g. by a new frontend), arrays
+            # are sent as a whole.
+            self._delta_baselines.clear()
+            self._held_back_keys = set()
+            self._coalesced = {}
+        else:
+            keys = {key} if isinstance(key, str) else set(key)
+            if self._lagging():
+                # sent once the frontend caught up
+                if keys:
+                    self._held_back_keys |= keys
+                    self._sync_metrics['held_back'] += 1
+                return
+            self._send_held_back(keys)
+            return
+        self._send_state(key)
+
+    def _send_state(self, key):
+        self._sending_state = 'full' if key is None else 'partial'
+        try:
+            super(Mark, self).send_state(key=key)
+        finally:
+            self._sending_state = False
+
+    def get_state(self, key=None, drop_defaults=False):
+        if key is None:
+            keys = self.keys
+        elif isinstance(key, str):
+            keys = [key]
+        else:
+            keys = list(key)
+        reduced = self._reduced_arrays(keys)
+        rows = self._sent_rows()
+        if rows is not None and 'selected' in keys and self.selected is not None:
+            reduced['selected'] = self._sent_positions(self.selected.astype(np.int64), rows)\
+                .astype(self.selected.dtype)
+        registry = self._buffer_registry if self._sending_state else None
+        if reduced or (self._sending_state and (self.delta_sync or registry is not None)):
+            state = self._get_array_state(keys, drop_defaults, registry, reduced)
+        else:
+            state = super(Mark, self).get_state(key=key, drop_defaults=drop_defaults)
+        if rows is not None and state.get('hovered_point') is not None:
+            position = self._sent_positions(np.array([state['hovered_point']]), rows)
+            state['hovered_point'] = int(position[0]) if len(position) else None
+        if self._sending_state and state and self.sync_policy is not None:
+            # acknowledged by the frontend once applied
+            state['_sync_id'] = self._new_sync_id()
+        return state
+
+    def _get_array_state(self, keys, drop_defaults, registry, reduced):
+        array_keys = [k for k in keys if k in self._array_trait_names()]
+        state = super(Mark, self).get_state(
+            key=[k for k in keys if k not in array_keys],
+            drop_defaults=drop_defaults
+        )
+        for k in array_keys:
+            value = reduced[k] if k in reduced else getattr(self, k)
+            delta = None
+            if self.delta_sync and self._sending_state and is_memory_mapped(value):
+                # not copied in memory as a baseline, sent as a whole
+                self._delta_baselines.pop(k, None)
+            elif self.delta_sync and self._sending_state:
+                delta = array_delta_to_json(self._delta_baselines.get(k), value, self)
+                self._delta_baselines[k] = None if value is None else value.copy()
+            state[k] = array_to_json(value, self) if delta is None else delta
+            if registry is not None:
+                # arrays already held by another mark of the figure are sent
+                # as a reference
+                state[k] = registry.share((self, k), state[k],
+                                          full=self._sending_state == 'full')
+        return state
+
+    @validate('downsampling')
+    def _validate_downsampling(self, proposal):
+        if proposal.value is not None and proposal.value not in reducers:
+            raise TraitError('Unknown reducer %s, expected one of %s' %
+                             (proposal.value, ', '.join(reducers)))
+        return proposal.value
+
+    @observe('downsampling', 'downsampling_index')
+    def _observe_downsampling(self, change):
+        self._downsampled = None
+        self._observe_scale_domains()
+        if self.comm is not None:
+            self.send_state(self._downsampled_names())
+
+    @observe('scales')
+    def _observe_downsampling_scales(self, change):
+        self._observe_scale_domains()
+        self._update_downsampling()
+
+    def _reduces_with_scales(self):
+        # Whether the data sent depends on the domains of the x and y scales
+        return self.downsampling is not None
+
+    def _observe_scale_domains(self):
+        # The domains are only observed while the data sent depends on them,
+        # so that the scales do not hold the marks which do not need them.
+        scales = {}
+        self._needs_plot_size = bool(self._reduces_with_scales())
+        if self._needs_plot_size:
+            scales = {name: self.scales[name] for name in ('x', 'y')
+                      if self.scales.get(name) is not None}
+        for name, scale in self._observed_scales.items():
+            if scales.get(name) is not scale:
+                scale.unobserve(self._update_downsampling, ['min', 'max'])
+        for name, scale in scales.items():
+            if self._observed_scales.get(name) is not scale:
+                scale.observe(self._update_downsampling, ['min', 'max'])
+        self._observed_scales = scales
+
+    def _update_downsampling(self, change=None):
+        if self.comm is None or self.downsampling is None:
+            return
+        if self._downsampled is not None and self._downsampled_covers(
+                self._downsampled, self._scale_domain('x', getattr(self, 'x', None))):
+            return
+        self.send_state(self._downsampled_names())
+
+    def _downsampled_names(self):
+        # the scaled attributes with a value per point, e.g. not the colors
+        # of the lines
+        x = getattr(self, 'x', None)
+        size = x.shape[-1] if isinstance(x, np.ndarray) and x.ndim > 0 else None
+        names = [name for name in ('x', 'y') if self.has_trait(name)]
+        for name in self._array_trait_names():
+            value = getattr(self, name)
+            if name not in names and self.traits()[name].metadata.get('scaled') and \
+                    value is not None and value.ndim > 0 and value.shape[-1] == size:
+                names.append(name)
+        return names
+
+    def _reduces(self, keys):
+        # Whether some of the given data attributes are not sent as they are
+        # held by the mark (i.e. downsampled)
+        return self.downsampling is not None and \
+            bool(set(keys) & set(self._downsampled_names()))
+
+    def _reduced_arrays(self, keys):
+        # Data attributes sent in place of the ones held by the mark, by
+        # name, among the given ones
+        if not self._reduces(keys):
+            return {}
+        x, y = getattr(self, 'x', None), getattr(self, 'y', None)
+        if not self._can_downsample(x, y):
+            # the points are sent as they are
+            self._downsampled = None
+            return {}
+        domain = self._scale_domain('x', x)
+        downsampled = self._downsampled
+        if downsampled is None or \
+                any(getattr(self, name) is not value for name, value in downsampled[0].items()) or \
+                not self._downsampled_covers(downsampled, domain):
+            downsampled = self._downsampled = self._downsample(x, y, domain)
+        return {name: value for name, value in downsampled[-1].items() if name in keys}
+
+    def _can_downsample(self, x, y):
+        # the points are along the last axis, x is 1d and sorted, y has a
+        # value per point (e.g. not the samples of the boxes of a Boxplot)
+        if self._extend_axis != -1 or not isinstance(x, np.ndarray) or \
+                not isinstance(y, np.ndarray) or x.ndim != 1 or len(x) == 0 or \
+                y.ndim == 0 or y.shape[-1] != len(x) or \
+                x.dtype.kind not in 'iufM' or y.dtype.kind not in 'iufM':
+            return False
+        return self._is_sorted_x(x)
+
+    def _is_sorted_x(self, x):
+        # checked once per array
+        if self._sorted_x[0] is not x:
+            self._sorted_x = (x, is_sorted(x))
+        return self._sorted_x[1]
+
+    def _scale_domain(self, name, values):
+        # Domain of the scale of a data attribute, in the units of
+        # `as_numbers(values)`, None when it is the range of the data.
+        scale = self.scales.get(name)
+        lo, hi = getattr(scale, 'min', None), getattr(scale, 'max', None)
+        if lo is None or hi is None or values is None:
+            return None
+        dtype = values.dtype if values.dtype.kind == 'M' else np.float64
+        lo, hi = as_numbers(np.array([lo, hi], dtype=dtype)).tolist()
+        return lo, hi
+
+    def _downsample(self, x, y, domain):
+        arrays = {name: getattr(self, name) for name in self._downsampled_names()}
+        width = self._plot_width
+        if domain is None:
+            numbers = as_numbers(x)
+            lo, hi = numbers[0], numbers[-1]
+        else:
+            # the points around the domain are sent too, for panning
+            span = domain[1] - domain[0]
+            lo, hi = domain[0] - span, domain[1] + span
+            width *= 3
+        downsampled, rows = downsample(self.downsampling, arrays, lo, hi, width,
+                                       self._downsampling_index(x, y), return_rows=True)
+        return arrays, domain, self._plot_width, rows, downsampled
+
+    def _downsampling_index(self, x, y):
+        if self.downsampling_index is not None:
+            return self.downsampling_index
+        if self.downsampling not in ('m4', 'minmax') or len(x) < self._index_min_points or \
+                y.shape[-1] != len(x):
+            return None
+        # built once per series
+        if self._index is None or self._index.x is not x or self._index.y is not y:
+            self._index = MinMaxPyramid(x, y)
+        return self._index
+
+    def _downsampled_covers(self, downsampled, domain):
+        # Whether the downsampled points draw the mark in the domain, at the
+        # current resolution: after a pan of less than a domain width, with
+        # no zoom in, nor too much of a zoom out.
+        _, sent, width, _, _ = downsampled
+        if width < self._plot_width or width > 2 * self._plot_width:
+            return False
+        if sent is None or domain is None:
+            return sent is domain
+        span, sent_span = domain[1] - domain[0], sent[1] - sent[0]
+        return sent[0] - sent_span <= domain[0] and domain[1] <= sent[1] + sent_span \
+            and 0.9 * sent_span <= span <= 2 * sent_span
+
+    def _sent_rows(self):
+        # Rows of the data of the points sent to the frontend (the boundaries
+        # of their buckets when they aggregate the points), None when all the
+        # points are sent as they are
+        if self.downsampling is None or self._downsampled is None:
+            return None
+        return self._downsampled[3]
+
+    def _aggregates(self):
+        # Whether the points sent are aggregates of buckets of points
+        return self.downsampling is not None and reducers[self.downsampling][1]
+
+    def _sent_positions(self, indices, rows):
+        # Positions in the points sent of rows of the data, the rows which
+        # are not sent are dropped
+        if self._aggregates():
+            indices = indices[(indices >= rows[0]) & (indices < rows[-1])]
+            return np.unique(np.searchsorted(rows, indices, side='right') - 1)
+        return np.searchsorted(rows, indices[np.isin(indices, rows)])
+
+    def _data_rows(self, positions, rows):
+        # Rows of the data of positions in the points sent, all the rows of
+        # the buckets when they are aggregated
+        if self._aggregates():
+            positions = positions[(positions >= 0) & (positions < len(rows) - 1)]
+            return np.concatenate([np.arange(rows[p], rows[p + 1]) for p in positions] +
+                                  [np.zeros(0, dtype=np.int64)])
+        return rows[positions[(positions >= 0) & (positions < len(rows))]]
+
+    def _data_state(self, sync_data, rows):
+        # The frontend refers to the points it holds, they are mapped to the
+        # rows of the data. Returns the state and the names of the data
+        # attributes which cannot be mapped (e.g. averaged points).
+        sync_data, rejected = dict(sync_data), []
+        if sync_data.get('selected') is not None:
+            selected = array_from_json(sync_data['selected'], self).astype(np.int64)
+            sync_data['selected'] = array_to_json(self._data_rows(selected, rows), self)
+        if sync_data.get('hovered_point') is not None:
+            hovered = self._data_rows(np.array([sync_data['hovered_point']]), rows)
+            sync_data['hovered_point'] = int(hovered[0]) if len(hovered) else None
+        for name in self._downsampled_names():
+            if name in sync_data:
+                # e.g. moved points, or lines drawn with HandDraw
+                value = array_from_json(sync_data[name], self)
+                full = getattr(self, name)
+                axis = None if full is None else self._extend_axis % full.ndim
+                if value is None or full is None or self._aggregates() or \
+                        value.shape != full.shape[:axis] + rows.shape + full.shape[axis + 1:]:
+                    rejected.append(name)
+                    del sync_data[name]
+                    continue
+                full = np.array(full)
+                full[(slice(None),) * axis + (rows,)] = value
+                sync_data[name] = array_to_json(full, self)
+        return sync_data, rejected
+
+    def set_state(self, sync_data):
+        # The frontend holds the arrays it sends, deltas are computed
+        # against them from now on.
+        for name in self._delta_baselines:
+            if name in sync_data:
+                value = array_from_json(sync_data[name], self)
+                self._delta_baselines[name] = None if value is None else value.copy()
+        if self._buffer_registry is not None:
+            for name in sync_data:
+                self._buffer_registry.release((self, name))
+        rows, rejected = self._sent_rows(), []
+        if rows is not None:
+            sync_data, rejected = self._data_state(sync_data, rows)
+        super(Mark, self).set_state(sync_data)
+        if rejected:
+            warn('The changes of %s made in the frontend cannot be mapped to the '
+                 'data of the mark, they are discarded' % ', '.join(rejected))
+            # the frontend draws the data of the kernel again
+            self.send_state(rejected)
+
+    def close(self):
+        if self._buffer_registry is not None:
+            self._buffer_registry.release_widget(self)
+        for scale in self._observed_scales.values():
+            scale.unobserve(self._update_downsampling, ['min', 'max'])
+        self._observed_scales = {}
+        super(Mark, self).close()
+
+    def _should_send_property(self, key, value):
+        if key in self._extending:
+            return False
+        return super(Mark, self)._should_send_property(key, value)
+
+    def extend(self, **columns):
+        """Appends data points to data attributes of the mark.
+
+        Only the new points are sent to the frontend, which grows its arrays
+        in place, rather than the whole arrays. The data attributes which are
+        not given are left unchanged.
+
+        For 2d attributes, the points are appended along the last axis
+        (e.g. a point for each line of a Lines mark), except for the y
+        attribute of OHLC, which gets new rows.
+
+        Parameters
+        ----------
+        columns: arrays
+            The points to append, by data attribute name,
+            e.g. `lines.extend(x=new_x, y=new_y)`.
+        """
+        names = self._array_trait_names()
+        new_values, sent = {}, {}
+        held_back = False
+        for name, values in columns.items():
+            if name not in names:
+                raise TraitError('%s is not a data attribute of %s' %
+                                 (name, self.__class__.__name__))
+            current = getattr(self, name)
+            values = np.asarray(values)
+            if current is None or current.ndim == 0 or current.ndim > 2:
+                new_values[name] = values
+                continue
+            if current.size == 0:
+                # e.g. the [[]] default of OHLC.y, whose shape says nothing
+                # of the orientation of the points
+                values = np.atleast_1d(values)
+                if self.max_points is not None:
+                    axis = self._extend_axis if values.ndim == 2 else 0
+                    values = values[(slice(None),) * (axis % 2) +
+                                    (slice(-self.max_points, None),)]
+                new_values[name] = values
+                continue
+            axis = self._extend_axis if current.ndim == 2 else 0
+            if current.ndim == 2:
+                shape = (-1, current.shape[1]) if axis == 0 else (current.shape[0], -1)
+                values = values.reshape(shape)
+            else:
+                values = np.atleast_1d(values)
+            if values.shape[axis] == 0:
+                continue
+            if self.max_points is None:
+                new_values[name] = np.concatenate([current, values], axis=axis)
+            else:
+                new_values[name] = self._extend_ring(name, current, values, axis)
+                # the points evicted by the ring are not sent
+                values = values[(slice(None),) * (axis % 2) + (slice(-self.max_points, None),)]
+            dtype = new_values[name].dtype
+            evicted = current.shape[axis] + values.shape[axis] - new_values[name].shape[axis]
+            # the frontend arrays can only grow if the type is the same
+            if dtype.kind in 'US' and dtype.kind == current.dtype.kind:
+                sent[name] = (values, axis, evicted)
+            elif dtype == current.dtype:
+                sent[name] = (values.astype(dtype, copy=False), axis, evicted)
+
+        if self.comm is None or self._reduces(sent):
+            sent = {}
+        elif sent and self._lagging():
+            if self.sync_policy == 'coalesce':
+                self._sync_metrics['held_back'] += 1
+                self._coalesce(sent)
+                held_back = True
+            else:
+                # the whole arrays are sent once the frontend caught up
+                sent = {}
+        elif sent:
+            # after the updates held back so far
+            self._send_held_back()
+        self._extending = set(sent)
+        try:
+            with self.hold_sync():
+                for name, value in new_values.items():
+                    if name in sent:
+                        self._set_extended(name, value)
+                    else:
+                        setattr(self, name, value)
+        finally:
+            self._extending = set()
+
+        for name in sent:
+            # the next assignment is sent as a whole
+            self._delta_baselines.pop(name, None)
+            if self._buffer_registry is not None:
+                self._buffer_registry.release((self, name))
+        if sent and not held_back:
+            self._send_extend(sent)
+
+    def _send_extend(self, sent):
+        state, buffer_paths, buffers = _split_buffers({
+            name: array_to_json(values, self) for name, (values, _, _) in sent.items()
+        })
+        content = {
+            'type': 'extend',
+            'data': state,
+            'buffer_paths': buffer_paths,
+            'axis': {name: axis % 2 for name, (_, axis, _) in sent.items()},
+            'evict': {name: evicted for name, (_, _, evicted) in sent.items()},
+        }
+        if self.sync_policy is not None:
+            content['sync_id'] = self._new_sync_id()
+        self.send(content, buffers)
+
+    def _coalesce(self, sent):
+        # Accumulates the points extended while the frontend is lagging, the
+        # points evicted in between are not kept.
+        for name, (values, axis, evicted) in sent.items():
+            if name in self._coalesced:
+                previous, _, previous_evicted = self._coalesced[name]
+                values = np.concatenate([previous, values], axis=axis)
+                evicted += previous_evicted
+            if self.max_points is not None:
+                dropped = max(values.shape[axis] - self.max_points, 0)
+                values = values[(slice(None),) * (axis % 2) + (slice(dropped, None),)]
+                evicted -= dropped
+            self._coalesced[name] = (values, axis, evicted)
+
+    def _new_sync_id(self):
+        self._sync_id += 1
+        self._pending_syncs[self._sync_id] = time.perf_counter()
+        self._sync_metrics['sent'] += 1
+        return self._sync_id
+
+    def _expire_pending_syncs(self):
+        deadline = time.perf_counter() - self._ack_timeout
+        for sync_id, sent_at in list(self._pending_syncs.items()):
+            if sent_at > deadline:
+                break
+            del self._pending_syncs[sync_id]
+            self._sync_metrics['timeouts'] += 1
+
+    def _lagging(self):
+        if self.sync_policy not in ('latest', 'coalesce'):
+            return False
+        self._expire_pending_syncs()
+        return len(self._pending_syncs) >= self.max_pending
+
+    def _handle_ack(self, sync_id):
+        # the frontend applies the updates in order
+        acked = [i for i in self._pending_syncs if i <= sync_id]
+        if not acked:
+            return
+        self._sync_metrics['latency'] = time.perf_counter() - self._pending_syncs[acked[-1]]
+        self._sync_metrics['acked'] += len(acked)
+        for i in acked:
+            del self._pending_syncs[i]
+        waiters, self._ack_waiters = self._ack_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        if not self._lagging():
+            self._send_held_back()
+
+    def _send_held_back(self, keys=()):
+        keys = set(keys) | self._held_back_keys
+        self._held_back_keys = set()
+        # the attributes which are sent as a whole supersede their points
+        coalesced = {name: value for name, value in self._coalesced.items()
+                     if name not in keys}
+        self._coalesced = {}
+        if coalesced:
+            self._send_extend(coalesced)
+        if keys:
+            self._send_state(keys)
+
+    async def wait_for_acks(self, timeout=None):
+        """Waits for the frontend to acknowledge the updates sent to it.
+
+        Returns once less than `max_pending` updates are waiting for an
+        acknowledgement, when `sync_policy` is set. The acknowledgements are
+        received by the kernel between cell executions, this is meant to be
+        awaited by a producer running in the background, e.g.
+
+            async def stream():
+                async for t, price in prices():
+                    lines.append(x=t, y=price)
+                    await lines.wait_for_acks()
+
+            asyncio.ensure_future(stream())
+
+        Parameters
+        ----------
+        timeout: float or None (default: None)
+            Maximum number of seconds to wait.
+
+        Returns
+        -------
+        True once the frontend caught up, False on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            self._expire_pending_syncs()
+            if len(self._pending_syncs) < self.max_pending:
+                return True
+            waiter = loop.create_future()
+            self._ack_waiters.append(waiter)
+            # wake up for the expiry of the oldest update as well
+            delay = next(iter(self._pending_syncs.values())) + self._ack_timeout - \
+                time.perf_counter()
+            if deadline is not None:
+                if deadline <= loop.time():
+                    return False
+                delay = min(delay, deadline - loop.time())
+            try:
+                await asyncio.wait_for(waiter, max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def _extend_ring(self, name, current, values, axis):
+        ring = self._rings.get(name)
+        dtype = np.result_type(current, values)
+        if ring is None or not ring.holds(current) or \
+                ring.capacity != self.max_points or dtype != current.dtype:
+            ring = self._rings[name] = RingBuffer(current.astype(dtype), self.max_points, axis)
+        ring.extend(values)
+        return ring.value
+
+    def _set_extended(self, name, value):
+        # The value is known to have changed, this spares the comparison of
+        # the whole arrays by the trait.
+        old_value = getattr(self, name)
+        new_value = self.traits()[name]._validate(self, value)
+        self._trait_values[name] = new_value
+        self._notify_trait(name, old_value, new_value)
+
+    def append(self, **point):
+        """Appends a single data point to data attributes of the mark.
+
+        See `extend`, e.g. `lines.append(x=t, y=price)`.
+        """
+        self.extend(**{name: np.expand_dims(value, self._extend_axis)
+                       for name, value in point.items()})
+
     @validate('scales')
     def _validate_scales(self, proposal):
         """
@@ -240,6 +955,35 @@ class Mark(Widget):
         return scales
 
     def __init__(self, **kwargs):
+        # Last arrays sent to the frontend, when delta_sync is enabled
+        self._delta_baselines = {}
+        self._sending_state = False
+        # Set by the figure holding the mark, when share_buffers is enabled
+        self._buffer_registry = None
+        # Attributes being extended, which are not synced as a whole
+        self._extending = set()
+        # Buffers of the data attributes extended when max_points is set
+        self._rings = {}
+        # Updates sent to the frontend and not acknowledged, by sync id, and
+        # the updates held back while it is lagging (see sync_policy)
+        self._sync_id = 0
+        self._pending_syncs = {}
+        self._held_back_keys = set()
+        self._coalesced = {}
+        self._ack_waiters = []
+        self._sync_metrics = dict(sent=0, acked=0, held_back=0, timeouts=0, latency=None)
+        # Size of the plot area, in pixels, reported by the frontend
+        self._plot_width = 1000
+        self._plot_height = 600
+        # x and y scales whose domains are observed, by name
+        self._observed_scales = {}
+        # Last downsampling: (arrays, domain, plot width, rows of the data,
+        # downsampled arrays)
+        self._downsampled = None
+        # Whether x is sorted: (x, sorted)
+        self._sorted_x = (None, False)
+        # Index built for the downsampling of x and y
+        self._index = None
         super(Mark, self).__init__(**kwargs)
         self._hover_handlers = CallbackDispatcher()
         self._click_handlers = CallbackDispatcher()
@@ -278,11 +1022,28 @@ class Mark(Widget):
         self._bg_click_handlers.register_callback(callback, remove=remove)
 
     def _handle_custom_msgs(self, _, content, buffers=None):
+        if content.get('event') == 'ack':
+            self._handle_ack(content['sync_id'])
+            return
+        if content.get('event') == 'plot_size':
+            self._plot_width = max(int(content['width']), 1)
+            self._plot_height = max(int(content['height']), 1)
+            self._update_downsampling()
+            return
         try:
             handler = self._name_to_handler[content['event']]
         except KeyError:
             return
 
+        rows = self._sent_rows() if self._point_events else None
+        if rows is not None:
+            # the indices of the points sent, mapped to rows of the data
+            content = dict(content)
+            if isinstance(content.get('index'), int):
+                content['index'] = int(rows[content['index']])
+            if isinstance(content.get('data'), dict) and \
+                    isinstance(content['data'].get('index'), int):
+                content['data'] = dict(content['data'], index=int(rows[content['data']['index']]))
         handler(self, content)
 
 
@@ -556,10 +1317,19 @@ class _ScatterBase(Mark):
     restrict_y = Bool().tag(sync=True)
     update_on_move = Bool().tag(sync=True)
 
+    cull_to_viewport = Bool(False)
+    cull_margin = Float(1., min=0)
+
+    # data attributes with a value per point which are not scaled
+    _point_names = ()
+    _point_events = True
+
     def __init__(self, **kwargs):
         self._drag_start_handlers = CallbackDispatcher()
         self._drag_handlers = CallbackDispatcher()
         self._drag_end_handlers = CallbackDispatcher()
+        # x, sorted, and the order of the points
+        self._cull_index = None
         super(_ScatterBase, self).__init__(**kwargs)
 
         self._name_to_handler.update({
@@ -577,6 +1347,106 @@ class _ScatterBase(Mark):
     def on_drag_end(self, callback, remove=False):
         self._drag_end_handlers.register_callback(callback, remove=remove)
 
+    def _clear_array_caches(self):
+        super(_ScatterBase, self)._clear_array_caches()
+        self._cull_index = None
+
+    @observe('cull_to_viewport', 'cull_margin')
+    def _observe_cull_to_viewport(self, change):
+        self._downsampled = None
+        self._observe_scale_domains()
+        if self.comm is not None:
+            self.send_state(self._downsampled_names())
+
+    def _reduces_with_scales(self):
+        return self.cull_to_viewport or super(_ScatterBase, self)._reduces_with_scales()
+
+    def _update_downsampling(self, change=None):
+        if not self.cull_to_viewport:
+            return super(_ScatterBase, self)._update_downsampling(change)
+        if self.comm is None or (self._downsampled is not None and
+                                 self._culled_covers(self._downsampled)):
+            return
+        self.send_state(self._downsampled_names())
+
+    def _downsampled_names(self):
+        names = super(_ScatterBase, self)._downsampled_names()
+        size = len(self.x) if self.x is not None else None
+        return names + [name for name in self._point_names
+                        if getattr(self, name) is not None and
+                        getattr(self, name).shape[-1:] == (size,)]
+
+    def _reduces(self, keys):
+        if self.cull_to_viewport:
+            return self.x is not None and self.y is not None and \
+                bool(set(keys) & set(self._downsampled_names()))
+        return super(_ScatterBase, self)._reduces(keys)
+
+    def _reduced_arrays(self, keys):
+        if not self.cull_to_viewport:
+            return super(_ScatterBase, self)._reduced_arrays(keys)
+        reduced = {}
+        if self._reduces(keys):
+            culled = self._downsampled
+            if culled is None or \
+                    any(getattr(self, name) is not value for name, value in culled[0].items()) or \
+                    not self._culled_covers(culled):
+                culled = self._downsampled = self._cull()
+            reduced = {name: value for name, value in culled[-1].items() if name in keys}
+        return reduced
+
+    def _sent_rows(self):
+        if not self.cull_to_viewport:
+            return super(_ScatterBase, self)._sent_rows()
+        return None if self._downsampled is None else self._downsampled[2]
+
+    def _aggregates(self):
+        return not self.cull_to_viewport and super(_ScatterBase, self)._aggregates()
+
+    def _cull(self):
+        # The points in the domains of the x and y scales, and a margin
+        # around them
+        arrays = {name: getattr(self, name) for name in self._downsampled_names()}
+        x, y = as_numbers(self.x), as_numbers(self.y)
+        n = min(len(x), len(y))
+        windows = []
+        for name in ('x', 'y'):
+            domain = self._scale_domain(name, getattr(self, name))
+            if domain is not None:
+                span = (domain[1] - domain[0]) * self.cull_margin
+                domain = (domain[0] - span, domain[1] + span)
+            windows.append(domain)
+        if windows[0] is None:
+            rows = np.arange(n)
+        else:
+            if self._cull_index is None or self._cull_index[0] is not self.x:
+                order = np.argsort(x[:n], kind='stable')
+                self._cull_index = (self.x, x[order], order)
+            _, sorted_x, order = self._cull_index
+            start = np.searchsorted(sorted_x, windows[0][0], side='left')
+            stop = np.searchsorted(sorted_x, windows[0][1], side='right')
+            rows = np.sort(order[start:stop])
+        if windows[1] is not None:
+            ys = y[rows]
+            rows = rows[(ys >= windows[1][0]) & (ys <= windows[1][1])]
+        culled = {name: value[..., rows] for name, value in arrays.items()}
+        return arrays, windows, rows, culled
+
+    def _culled_covers(self, culled):
+        # Whether the points sent draw the mark in the domains: after a pan
+        # within the margin, with no zoom out, nor too much of a zoom in.
+        for name, window in zip(('x', 'y'), culled[1]):
+            domain = self._scale_domain(name, getattr(self, name))
+            if window is None or domain is None:
+                if window is not domain:
+                    return False
+                continue
+            span = (window[1] - window[0]) / (1 + 2 * self.cull_margin)
+            if domain[0] < window[0] or domain[1] > window[1] or \
+                    domain[1] - domain[0] < span / 4:
+                return False
+        return True
+
 
 @register_mark('bqplot.Scatter')
 class Scatter(_ScatterBase):
@@ -672,6 +1542,14 @@ class Scatter(_ScatterBase):
         Restricts movement of the point to only along the y axis. This is valid
         only when enable_move is set to True. If both restrict_x and restrict_y
         are set to True, the point cannot be moved.
+    cull_to_viewport: bool (default: False)
+        Sends only the points in the domains of the x and y scales, and in
+        a margin around them, which are sent again as the domains change
+        (e.g. with a PanZoom interaction). The mark keeps all the points,
+        `selected` and the indices of the events are rows of the data.
+    cull_margin: float (default: 1.)
+        Width of the margin of `cull_to_viewport` on each side of the
+        domains, as a fraction of their width.
 
     !!! Note
         - The fields which can be passed to the default tooltip are:
@@ -687,6 +1565,7 @@ class Scatter(_ScatterBase):
     # Mark decoration
     icon = 'fa-cloud'
     name = 'Scatter'
+    _point_names = ('names',)
 
     # Scaled attributes
     skew = Array(None, allow_none=True).tag(sync=True, scaled=True,
@@ -808,10 +1687,17 @@ class Label(_ScatterBase):
         Restricts movement of the label to only along the y axis. This is valid
         only when enable_move is set to True. If both restrict_x and restrict_y
         are set to True, the label cannot be moved.
+    cull_to_viewport: bool (default: False)
+        Sends only the labels in the domains of the x and y scales, and in
+        a margin around them, see `Scatter.cull_to_viewport`.
+    cull_margin: float (default: 1.)
+        Width of the margin of `cull_to_viewport` on each side of the
+        domains, as a fraction of their width.
     """
     # Mark decoration
     icon = 'fa-font'
     name = 'Labels'
+    _point_names = ('text',)
 
     # Other attributes
     x_offset = Int(0).tag(sync=True)
@@ -1152,6 +2038,7 @@ class Bars(Mark):
 
     _view_name = Unicode('Bars').tag(sync=True)
     _model_name = Unicode('BarsModel').tag(sync=True)
+    _point_events = True
 
 
 @register_mark('bqplot.Bins')
@@ -1295,6 +2182,17 @@ class OHLC(Mark):
     format: string (default: 'ohlc')
         description of y data being passed
         supports all permutations of the strings 'ohlc', 'oc', and 'hl'
+    resample: bool (default: False)
+        Aggregates the candles in candles of a longer period (e.g. minutes in
+        days, aligned on the calendar for dates) so that they are at least
+        `resample_min_width` pixels wide in the domain of the x scale. The
+        mark keeps all the candles, the ones in the domain and in a domain
+        width on each side of it are sent again as the domain changes (e.g.
+        with a PanZoom interaction). The selections and the indices of the
+        events refer to the candles of the data, a resampled candle stands
+        for all the candles of its period.
+    resample_min_width: float (default: 4.)
+        Minimum width of the resampled candles, in pixels.
 
     !!! Note
         - The fields which can be passed to the default tooltip are:
@@ -1336,9 +2234,136 @@ class OHLC(Mark):
     opacities = List(trait=Float(1.0, min=0, max=1, allow_none=True))\
         .tag(sync=True, display_name='Opacities')
     format = Unicode('ohlc').tag(sync=True, display_name='Format')
+    resample = Bool(False)
+    resample_min_width = Float(4., min=1)
+
+    # the rows of y are the points
+    _extend_axis = 0
 
     _view_name = Unicode('OHLC').tag(sync=True)
     _model_name = Unicode('OHLCModel').tag(sync=True)
+    _point_events = True
+
+    def __init__(self, **kwargs):
+        # the candles of x and y resampled by period, computed once
+        self._resampled = (None, None, None, {})
+        super(OHLC, self).__init__(**kwargs)
+
+    def _clear_array_caches(self):
+        super(OHLC, self)._clear_array_caches()
+        self._resampled = (None, None, None, {})
+
+    @observe('resample', 'resample_min_width', 'format')
+    def _observe_resample(self, change):
+        self._downsampled = None
+        self._observe_scale_domains()
+        if self.comm is not None:
+            self.send_state(self._downsampled_names())
+
+    def _reduces_with_scales(self):
+        return self.resample or super(OHLC, self)._reduces_with_scales()
+
+    def _sent_rows(self):
+        if not self.resample:
+            return super(OHLC, self)._sent_rows()
+        return None if self._downsampled is None else self._downsampled[3]
+
+    def _aggregates(self):
+        if not self.resample:
+            return super(OHLC, self)._aggregates()
+        # unless the candles are sent as they are
+        return self._downsampled is not None and self._downsampled[1] is not None
+
+    def _update_downsampling(self, change=None):
+        if not self.resample:
+            return super(OHLC, self)._update_downsampling(change)
+        if self.comm is None or not self._can_resample():
+            return
+        if self._downsampled is None or not self._resampled_covers(self._downsampled):
+            self.send_state(self._downsampled_names())
+
+    def _reduces(self, keys):
+        if self.resample:
+            return bool(set(keys) & set(self._downsampled_names()))
+        return super(OHLC, self)._reduces(keys)
+
+    def _reduced_arrays(self, keys):
+        if not self.resample:
+            return super(OHLC, self)._reduced_arrays(keys)
+        if not self._reduces(keys) or not self._can_resample():
+            if self._reduces(keys):
+                # the candles are sent as they are
+                self._downsampled = None
+            return {}
+        resampled = self._downsampled
+        if resampled is None or resampled[0][0] is not self.x or \
+                resampled[0][1] is not self.y or not self._resampled_covers(resampled):
+            resampled = self._downsampled = self._resample()
+        return {name: value for name, value in resampled[-1].items() if name in keys}
+
+    def _can_resample(self):
+        # sorted candles with a column per letter of the format
+        x, y = self.x, self.y
+        if x.ndim != 1 or y.ndim != 2 or len(x) == 0 or y.shape != (len(x), len(self.format)) or \
+                x.dtype.kind not in 'iufM' or y.dtype.kind not in 'iuf' or \
+                set(self.format) - set('ohlc'):
+            return False
+        return self._is_sorted_x(x)
+
+    def _resample_domain(self):
+        # The domain of the x scale, the range of the data by default
+        domain = self._scale_domain('x', self.x)
+        if domain is None:
+            numbers = as_numbers(self.x)
+            domain = (numbers[0].item(), numbers[-1].item())
+        return domain
+
+    def _resample_period(self, domain):
+        # None when the candles are wide enough as they are
+        x = as_numbers(self.x)
+        candles = int(self._plot_width / self.resample_min_width)
+        count = _search_sorted(x, domain[1], side='right') - \
+            _search_sorted(x, domain[0], side='left')
+        if count <= candles:
+            return None
+        return ohlc_period(self.x, domain[1] - domain[0], candles)
+
+    def _resample(self):
+        domain = self._resample_domain()
+        period = self._resample_period(domain)
+        x, y = self.x, self.y
+        if period is not None:
+            cached_x, cached_y, cached_format, _ = self._resampled
+            if cached_x is not x or cached_y is not y or cached_format != self.format:
+                self._resampled = (x, y, self.format, {})
+            levels = self._resampled[-1]
+            if period not in levels:
+                levels[period] = resample_ohlc(x, y, period, self.format)
+            x, y = levels[period]
+        # the candles around the domain are sent too, for panning
+        span = domain[1] - domain[0]
+        window = (domain[0] - span, domain[1] + span)
+        numbers = as_numbers(x)
+        start = max(_search_sorted(numbers, window[0], side='left') - 1, 0)
+        stop = min(_search_sorted(numbers, window[1], side='right') + 1, len(x))
+        if period is None:
+            rows = np.arange(start, stop)
+        else:
+            # the boundaries of the periods in the candles of the data, the
+            # first candle of a period is the first one after its start
+            rows = np.searchsorted(as_numbers(self.x), numbers[start:stop], side='left')
+            end = len(self.x) if stop == len(x) else \
+                np.searchsorted(as_numbers(self.x), numbers[stop], side='left')
+            rows = np.append(rows, end)
+        return (self.x, self.y), period, window, rows, dict(x=x[start:stop], y=y[start:stop])
+
+    def _resampled_covers(self, resampled):
+        # Whether the candles sent draw the mark in the domain: after a pan
+        # of less than a domain width, at the same period.
+        _, period, window, _, _ = resampled
+        domain = self._resample_domain()
+        return window[0] <= domain[0] and domain[1] <= window[1] and \
+            self._resample_period(domain) == period
 
 
 @register_mark('bqplot.Pie')
@@ -1686,6 +2711,22 @@ class HeatMap(Mark):
         labels for the rows of the `color` array passed. The length of this has
         to be the number of rows in `color`.
         This is a scaled attribute.
+
+    Other Attributes
+    ----------------
+
+    Attributes
+    ----------
+    tiled: bool (default: False)
+        Keeps the `color` matrix, which may be memory-mapped, in the kernel
+        and sends only its tiles in the domains of the x and y scales, at
+        the resolution of the plot area: a cell is then the mean of a block
+        of cells of the matrix (see `bqplot.downsampling.TilePyramid`). The
+        tiles are only cached in the kernel: the frontend draws the region
+        sent as a regular heat map, and the whole visible region is sent
+        again when the domains leave it or need another resolution (e.g.
+        with a PanZoom interaction). x and y should be sorted numbers or
+        dates.
     """
     # Scaled attributes
     x = Array(None, allow_none=True).tag(sync=True, scaled=True,
@@ -1712,6 +2753,11 @@ class HeatMap(Mark):
     }).tag(sync=True)
 
     null_color = Color('black', allow_none=True).tag(sync=True)
+    tiled = Bool(False)
+
+    # rows and columns of the tiles, and maximum number of tiles kept
+    _tile_size = 256
+    _tile_cache_size = 256
 
     def __init__(self, **kwargs):
         data = kwargs['color']
@@ -1729,11 +2775,264 @@ class HeatMap(Mark):
             y_scale = LinearScale()
             scales['y'] = y_scale
         kwargs['scales'] = scales
+        self._pyramid = None
         super(HeatMap, self).__init__(**kwargs)
 
     _view_name = Unicode('HeatMap').tag(sync=True)
     _model_name = Unicode('HeatMapModel').tag(sync=True)
 
+    def _clear_array_caches(self):
+        super(HeatMap, self)._clear_array_caches()
+        self._pyramid = None
+
+    @observe('tiled')
+    def _observe_tiled(self, change):
+        self._downsampled = None
+        self._observe_scale_domains()
+        if self.comm is not None:
+            self.send_state(self._downsampled_names())
+
+    def _reduces_with_scales(self):
+        return self.tiled or super(HeatMap, self)._reduces_with_scales()
+
+    def _sent_rows(self):
+        # the tiles are not points of the data
+        return None if self.tiled else super(HeatMap, self)._sent_rows()
+
+    def _update_downsampling(self, change=None):
+        if not self.tiled:
+            return super(HeatMap, self)._update_downsampling(change)
+        if self.comm is None or not self._can_tile():
+            return
+        if self._downsampled is None or not self._tiles_cover(self._downsampled):
+            self.send_state(self._downsampled_names())
+
+    def _reduces(self, keys):
+        if self.tiled:
+            return bool(set(keys) & set(self._downsampled_names()))
+        return super(HeatMap, self)._reduces(keys)
+
+    def _reduced_arrays(self, keys):
+        if not self.tiled:
+            return super(HeatMap, self)._reduced_arrays(keys)
+        if not self._reduces(keys) or not self._can_tile():
+            return {}
+        tiles = self._downsampled
+        if tiles is None or any(getattr(self, name) is not value for name, value in tiles[0].items()) or \
+                not self._tiles_cover(tiles):
+            tiles = self._downsampled = self._tile()
+        return {name: value for name, value in tiles[-1].items() if name in keys}
+
+    def _can_tile(self):
+        # sorted labels of the rows and columns
+        x, y, color = self.x, self.y, self.color
+        if x is None or y is None or color is None or color.shape != (len(y), len(x)) or \
+                x.dtype.kind not in 'iufM' or y.dtype.kind not in 'iufM':
+            return False
+        return self._is_sorted_x(x) and is_sorted(y)
+
+    def _visible_tiles(self):
+        # The level of the pyramid at the resolution of the plot area, and
+        # the ranges of tiles in the domains of the scales
+        ranges = []
+        for name, pixels in (('y', self._plot_height), ('x', self._plot_width)):
+            values = getattr(self, name)
+            domain = self._scale_domain(name, values)
+            if domain is None:
+                ranges.append((0, len(values)))
+            else:
+                numbers = as_numbers(values)
+                ranges.append((max(_search_sorted(numbers, domain[0], side='left') - 1, 0),
+                               min(_search_sorted(numbers, domain[1], side='right') + 1,
+                                   len(values))))
+        (rows, columns), size = ranges, self._tile_size
+        level = 0
+        while level < len(self._pyramid.shapes) - 1 and \
+                ((columns[1] - columns[0]) >> level > self._plot_width or
+                 (rows[1] - rows[0]) >> level > self._plot_height):
+            level += 1
+        starts = tuple((start >> level) // size for start, _ in ranges)
+        # the cells of the level are partial at the end
+        stops = tuple(-(-stop // (size << level)) for _, stop in ranges)
+        return level, starts, stops
+
+    def _tile(self):
+        if self._pyramid is None or self._pyramid.values is not self.color:
+            self._pyramid = TilePyramid(self.color, self._tile_size, self._tile_cache_size)
+        level, starts, stops = self._visible_tiles()
+        size = self._tile_size << level
+        color = self._pyramid.region(level, (starts[0], stops[0]), (starts[1], stops[1]))
+        labels = {}
+        for name, start, stop in (('y', starts[0], stops[0]), ('x', starts[1], stops[1])):
+            # the labels of the cells are the means of the labels of the blocks
+            values = getattr(self, name)[start * size:stop * size]
+            numbers = as_numbers(values).astype(np.float64)
+            blocks = np.arange(0, len(values), 1 << level)
+            means = np.add.reduceat(numbers, blocks) / np.diff(np.append(blocks, len(values)))
+            labels[name] = means.astype(np.int64).view(values.dtype) \
+                if values.dtype.kind == 'M' else means
+        arrays = {name: getattr(self, name) for name in ('x', 'y', 'color')}
+        return arrays, (level, starts, stops), dict(labels, color=color)
+
+    def _tiles_cover(self, tiles):
+        # Whether the tiles sent are the visible ones, or more of them
+        level, starts, stops = tiles[1]
+        if self._pyramid is None:
+            return False
+        visible_level, visible_starts, visible_stops = self._visible_tiles()
+        return level == visible_level and \
+            all(a <= b for a, b in zip(starts, visible_starts)) and \
+            all(a >= b for a, b in zip(stops, visible_stops))
+
+
+@register_mark('bqplot.DensityScatter')
+class DensityScatter(Mark):
+
+    """Density scatter mark.
+
+    Aggregates a large number of points in a grid of the resolution of the
+    plot area, drawn as a heat map of the number of points per cell. The
+    points stay in the kernel, only the grid is sent to the frontend, and it
+    is computed again when the domains of the x and y scales change, e.g.
+    with a PanZoom interaction.
+
+    Attributes
+    ----------
+    icon: string (class-level attribute)
+        Font-awesome icon for the respective mark
+    name: string (class-level attribute)
+        User-friendly name of the mark
+    bin_size: int (default: 2)
+        Size of the cells of the grid, in pixels.
+    null_color: Color or None (default: None)
+        Color of the cells without points, transparent if None.
+
+    Data Attributes
+    ---------------
+
+    Attributes
+    ----------
+    x: numpy.ndarray (default: [])
+        abscissas of the data points (1d array)
+    y: numpy.ndarray (default: [])
+        ordinates of the data points (1d array)
+    weights: numpy.ndarray or None (default: None)
+        weights of the data points, summed instead of counted in the cells
+        (1d array)
+    color: numpy.ndarray or None (default: None)
+        the grid sent to the frontend in place of the points, computed by
+        the mark.
+    """
+    icon = 'fa-th'
+    name = 'Density Scatter'
+
+    # Scaled attributes
+    x = Array([]).tag(sync=True, scaled=True, rtype='Number',
+                      atype='bqplot.Axis', **array_serialization)\
+        .valid(array_squeeze, array_dimension_bounds(1, 1))
+    y = Array([]).tag(sync=True, scaled=True, rtype='Number',
+                      atype='bqplot.Axis', **array_serialization)\
+        .valid(array_squeeze, array_dimension_bounds(1, 1))
+    color = Array(None, allow_none=True).tag(sync=True, scaled=True,
+                                             rtype='Color',
+                                             atype='bqplot.ColorAxis',
+                                             **array_serialization)\
+        .valid(array_squeeze, array_dimension_bounds(2, 2))
+
+    # Other attributes
+    weights = Array(None, allow_none=True)\
+        .valid(array_squeeze, array_dimension_bounds(1, 1))
+    bin_size = Int(2, min=1)
+    scales_metadata = Dict({
+        'x': {'orientation': 'horizontal', 'dimension': 'x'},
+        'y': {'orientation': 'vertical', 'dimension': 'y'},
+        'color': {'dimension': 'color'}
+    }).tag(sync=True)
+
+    null_color = Color(None, allow_none=True).tag(sync=True)
+
+    def __init__(self, **kwargs):
+        scales = kwargs.pop('scales', {})
+        # Adding scales in case they are not passed.
+        if scales.get('x', None) is None:
+            scales['x'] = LinearScale()
+        if scales.get('y', None) is None:
+            scales['y'] = LinearScale()
+        if scales.get('color', None) is None:
+            scales['color'] = ColorScale(scheme='viridis')
+        kwargs['scales'] = scales
+        # data range of x and y, by array
+        self._data_ranges = {}
+        super(DensityScatter, self).__init__(**kwargs)
+
+    def _clear_array_caches(self):
+        super(DensityScatter, self)._clear_array_caches()
+        self._data_ranges = {}
+
+    @observe('weights', 'bin_size')
+    def _observe_density(self, change):
+        self._update_downsampling()
+
+    def _reduces_with_scales(self):
+        return True
+
+    def _sent_rows(self):
+        # the cells of the grid are not points of the data
+        return None
+
+    def _update_downsampling(self, change=None):
+        if self.comm is None:
+            return
+        if self._downsampled is None or not self._same_density(self._downsampled[0]):
+            self.send_state(self._downsampled_names())
+
+    def _downsampled_names(self):
+        return ['x', 'y', 'color']
+
+    def _reduces(self, keys):
+        return bool(set(keys) & set(self._downsampled_names()))
+
+    def _reduced_arrays(self, keys):
+        if not self._reduces(keys):
+            return {}
+        if self._downsampled is None or not self._same_density(self._downsampled[0]):
+            key = self._density_key()
+            x, y, weights, (x_domain, y_domain), (width, height) = key
+            x, y, color = density_grid(x, y, x_domain, y_domain, width, height,
+                                       weights)
+            self._downsampled = (key, dict(x=x, y=y, color=color))
+        return {name: value for name, value in self._downsampled[-1].items()
+                if name in keys}
+
+    def _density_key(self):
+        # The data, domains and size of the grid it is aggregated in
+        domains = tuple(self._scale_domain(name, getattr(self, name)) or
+                        self._data_range(name, getattr(self, name))
+                        for name in ('x', 'y'))
+        shape = (-(-self._plot_width // self.bin_size),
+                 -(-self._plot_height // self.bin_size))
+        return self.x, self.y, self.weights, domains, shape
+
+    def _same_density(self, key):
+        current = self._density_key()
+        return all(a is b for a, b in zip(key[:3], current[:3])) and \
+            key[3:] == current[3:]
+
+    def _data_range(self, name, values):
+        if self._data_ranges.get(name, (None,))[0] is not values:
+            numbers = as_numbers(values)
+            # without temporary arrays, for memory-mapped data
+            lo = np.fmin.reduce(numbers) if len(numbers) else np.nan
+            if np.isnan(lo):
+                data_range = (0., 1.)
+            else:
+                data_range = (lo.item(), np.fmax.reduce(numbers).item())
+            self._data_ranges[name] = (values, data_range)
+        return self._data_ranges[name][1]
+
+    _view_name = Unicode('HeatMap').tag(sync=True)
+    _model_name = Unicode('HeatMapModel').tag(sync=True)
+
 
 @register_mark('bqplot.Graph')
 class Graph(Mark):
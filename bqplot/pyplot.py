@@ -21,7 +21,8 @@ from .figure import Figure
 from bqscales import Scale, LinearScale, Mercator
 from .axes import Axis
 from .marks import (Lines, Scatter, Hist, Bars, OHLC, Pie, Map, Image,
-                    Label, HeatMap, GridHeatMap, topo_load, Boxplot, Bins)
+                    Label, HeatMap, GridHeatMap, DensityScatter, topo_load,
+                    Boxplot, Bins)
 from .interacts import (BrushIntervalSelector, FastIntervalSelector,
                         BrushSelector, IndexSelector, MultiSelector,
                         LassoSelector)
@@ -1022,6 +1023,29 @@ def heatmap(color, **kwargs):
     return _draw_mark(HeatMap, **kwargs)
 
 
+def density_scatter(x, y, **kwargs):
+    """Draw the density of scattered points in the current context figure.
+
+    Parameters
+    ----------
+    x: numpy.ndarray, 1d
+        The x-coordinates of the data points.
+    y: numpy.ndarray, 1d
+        The y-coordinates of the data points.
+    options: dict (default: {})
+        Options for the scales to be created. If a scale labeled 'x' is
+        required for that mark, options['x'] contains optional keyword
+        arguments for the constructor of the corresponding scale type.
+    axes_options: dict (default: {})
+        Options for the axes to be created. If an axis labeled 'x' is required
+        for that mark, axes_options['x'] contains optional keyword arguments
+        for the constructor of the corresponding axis type.
+    """
+    kwargs['x'] = x
+    kwargs['y'] = y
+    return _draw_mark(DensityScatter, **kwargs)
+
+
 def gridheatmap(color, **kwargs):
     """Draw a GridHeatMap in the current context figure.
 
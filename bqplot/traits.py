@@ -24,31 +24,52 @@ Traits Types
    :toctree: _generate/
 
    Date
+   Array
 """
 
 from traitlets import TraitError, TraitType
+import traittypes
 
 import numpy as np
 import pandas as pd
 import warnings
+import zlib
+import mmap
+import os
+import math
+import hashlib
 import datetime as dt
 
 
 # Date
 
 
+EPOCH = dt.datetime(1970, 1, 1)
+EPOCH_UTC = EPOCH.replace(tzinfo=dt.timezone.utc)
+MILLISECOND = dt.timedelta(milliseconds=1)
+
+
 def date_to_json(value, obj):
     if value is None:
         return value
     else:
-        # Dropping microseconds and only keeping milliseconds to conform
-        # with JavaScript's Data.toJSON's behavior - and prevent bouncing
-        # back updates from the front-end.
-        return value.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        # Dates are sent as a number of milliseconds since the epoch, which
+        # JavaScript's Date accepts directly. The fractional part keeps the
+        # microseconds (exactly for dates within a couple of centuries of
+        # 1970), and the value bounces back unchanged from the front-end.
+        # Naive dates are taken as UTC.
+        epoch = EPOCH if value.tzinfo is None else EPOCH_UTC
+        return (value - epoch) / MILLISECOND
 
 
 def date_from_json(value, obj):
-    if value:
+    if isinstance(value, (int, float)):
+        # dt.timedelta(milliseconds=value) is not exact for large values
+        ms = math.floor(value)
+        return EPOCH + dt.timedelta(milliseconds=ms, microseconds=round((value - ms) * 1000))
+    elif value:
+        # ISO string, as sent by older front-ends and by JavaScript's
+        # Date.toJSON
         return dt.datetime.strptime(value.rstrip('Z'), '%Y-%m-%dT%H:%M:%S.%f')
     else:
         return value
@@ -62,8 +83,8 @@ class Date(TraitType):
     """
     A datetime trait type.
 
-    Converts the passed date into a string format that can be used to
-    construct a JavaScript datetime.
+    Converts the passed date into a number of milliseconds since the epoch
+    that can be used to construct a JavaScript datetime.
     """
 
     def validate(self, obj, value):
@@ -73,11 +94,10 @@ class Date(TraitType):
             if isinstance(value, dt.date):
                 return dt.datetime(value.year, value.month, value.day)
             if np.issubdtype(np.dtype(value), np.datetime64):
-                # TODO: Fix this. Right now, we have to limit the precision
-                # of time to microseconds because np.datetime64.astype(datetime)
-                # returns date values only for precision <= 'us'
-                value_truncated = np.datetime64(value, 'us')
-                return value_truncated.astype(dt.datetime)
+                # pd.Timestamp is a datetime which keeps the nanoseconds,
+                # unlike np.datetime64.astype(datetime)
+                value = pd.Timestamp(value)
+                return None if value is pd.NaT else value
         except Exception:
             self.error(obj, value)
         self.error(obj, value)
@@ -87,6 +107,102 @@ class Date(TraitType):
         self.tag(**date_serialization)
 
 
+# Array
+
+
+def _is_arrow(value):
+    return type(value).__module__.split('.')[0] == 'pyarrow'
+
+
+def array_from_arrow(value):
+    """Converts a pyarrow Array or ChunkedArray to a numpy array.
+
+    Primitive arrays without nulls (and ChunkedArrays made of one such
+    chunk) are not copied, the numpy array is a view on the Arrow buffer.
+    Nulls are mapped to NaN (NaT for temporal types), which implies a
+    conversion to float64 for integers. Dictionary arrays are decoded.
+    """
+    if type(value).__name__ == 'ChunkedArray':
+        value = value.chunk(0) if value.num_chunks == 1 else value.combine_chunks()
+    if hasattr(value, 'dictionary_decode'):
+        value = value.dictionary_decode()
+    return value.to_numpy(zero_copy_only=False)
+
+
+class Array(traittypes.Array):
+
+    """
+    A numpy array trait type.
+
+    pyarrow Arrays and ChunkedArrays are accepted as well, and converted
+    without copy when possible. Assigning an array of the same shape, dtype
+    and content as the current value does not notify observers, unless it is
+    the current (writeable) array itself, which may have been modified in
+    place: `mark.y[0] = 1; mark.y = mark.y` sends y again.
+
+    Memory-mapped arrays (`numpy.memmap`) and the paths (`os.PathLike`) of
+    .npy files, which are memory-mapped, are kept on disk: they are read when
+    they are sent, and only the slices that are needed when the mark reduces
+    them (e.g. with `downsampling`, which reads the points a chunk at a
+    time). The arrays sent as a whole are read at once, and copied in memory
+    when they are converted (`wire_dtype`) or compressed (`compression`).
+    """
+
+    def validate(self, obj, value):
+        if _is_arrow(value):
+            value = array_from_arrow(value)
+        elif isinstance(value, os.PathLike):
+            value = np.load(value, mmap_mode='r', allow_pickle=False)
+        if isinstance(value, np.memmap):
+            # a plain view, which the base class does not copy
+            value = value.view(np.ndarray)
+        return super(Array, self).validate(obj, value)
+
+    def set(self, obj, value):
+        new_value = self._validate(obj, value)
+        old_value = obj._trait_values.get(self.name, self.default_value)
+        obj._trait_values[self.name] = new_value
+        # assigning an unchanged array does not trigger a sync
+        if not _array_equal(old_value, new_value):
+            obj._notify_trait(self.name, old_value, new_value)
+
+
+def _is_nested(array):
+    if isinstance(array, np.ndarray) and array.ndim == 2:
+        return True
+    return len(array) > 0 and all(isinstance(row, (list, np.ndarray)) for row in array)
+
+
+def _convert_rows_to_date(rows):
+    """Converts the rows of a 2d (or ragged) array to dates, with a single
+    call to pd.to_datetime on the flattened rows. Rows whose first element
+    cannot be converted are returned as is."""
+    elems = list(rows)
+    rows = [np.asarray(elem) for elem in elems]
+    try:
+        flat = np.concatenate(rows)
+    except (TypeError, ValueError):
+        # no common dtype, e.g. rows of strings and of datetime64
+        flat = np.array([value for row in rows for value in row], dtype=object)
+    try:
+        dates = pd.to_datetime(flat, errors='coerce')
+    except (TypeError, ValueError):
+        # e.g. mixed timezones across rows
+        dates = None
+    return_value = []
+    start = 0
+    for elem, row in zip(elems, rows):
+        stop = start + len(row)
+        temp_val = dates[start:stop] if dates is not None else None
+        if temp_val is None or (len(row) and isinstance(temp_val[0], type(pd.NaT)) and
+                                not pd.isnull(row[0])):
+            # the format inferred for the whole array may not fit this row
+            temp_val = pd.to_datetime(row, errors='coerce')
+        return_value.append(elem if len(row) and isinstance(temp_val[0], type(pd.NaT)) else temp_val)
+        start = stop
+    return return_value
+
+
 def convert_to_date(array, fmt='%m-%d-%Y'):
     # If array is a np.ndarray with type == np.datetime64, the array can be
     # returned as such. If it is an np.ndarray of dtype 'object' then conversion
@@ -96,33 +212,49 @@ def convert_to_date(array, fmt='%m-%d-%Y'):
         # no need to perform any conversion in this case
         return array
     elif isinstance(array, list) or (isinstance(array, np.ndarray) and array.dtype == 'object'):
-        return_value = []
         # Pandas to_datetime handles all the cases where the passed in
         # data could be any of the combinations of
         #            [list, nparray] X [python_datetime, np.datetime]
         # Because of the coerce=True flag, any non-compatible datetime type
         # will be converted to pd.NaT. By this comparison, we can figure
-        # out if it is date castable or not.
-        if len(np.shape(array)) == 2:
-            for elem in array:
-                temp_val = pd.to_datetime(
-                    elem, errors='coerce')
-                temp_val = elem if isinstance(temp_val[0], type(pd.NaT)) else temp_val
-                return_value.append(temp_val)
-        elif isinstance(array, list):
-            temp_val = pd.to_datetime(
-                array, errors='coerce')
-            return_value = array if isinstance(temp_val[0], type(pd.NaT)) else temp_val
-        else:
-            temp_val = pd.to_datetime(
-                array, errors='coerce')
-            return_value = array if isinstance(temp_val[0], type(pd.NaT)) else temp_val
-        return return_value
+        # out if it is date castable or not. Repeated values (e.g. the same
+        # dates for all the curves of a Lines mark) are only parsed once.
+        if _is_nested(array):
+            return _convert_rows_to_date(array)
+        temp_val = pd.to_datetime(array, errors='coerce')
+        return array if len(temp_val) and isinstance(temp_val[0], type(pd.NaT)) else temp_val
     elif isinstance(array, np.ndarray):
         warnings.warn("Array could not be converted into a date")
         return array
 
 
+# datetime64 units which are sent as is, the other ones are converted to ms
+DATE_WIRE_UNITS = ('s', 'ms', 'us', 'ns')
+
+# arrays smaller than this (in bytes) are never compressed
+COMPRESSION_MIN_SIZE = 1 << 16
+# favor speed, most of the gain comes from the byte shuffling
+COMPRESSION_LEVEL = 1
+
+
+def _shuffle_compress(ar):
+    """Byte-shuffles and zlib compresses an array.
+
+    Shuffling groups the i-th bytes of all the elements together, which
+    makes numerical data (where e.g. exponents vary slowly) much more
+    compressible.
+    """
+    shuffled = np.ascontiguousarray(ar).view(np.uint8).reshape(-1, ar.itemsize).T
+    return zlib.compress(shuffled.tobytes(), COMPRESSION_LEVEL)
+
+
+def _decompress_unshuffle(buffer, dtype, shuffle):
+    data = np.frombuffer(zlib.decompress(buffer), dtype=np.uint8)
+    if shuffle > 1:
+        data = np.ascontiguousarray(data.reshape(shuffle, -1).T)
+    return data.view(dtype)
+
+
 def array_from_json(value, obj=None):
     if value is not None:
         # this will accept regular json data, like an array of values, which can be useful it you want
@@ -140,56 +272,215 @@ def array_from_json(value, obj=None):
                 return np.array(value, dtype=object)
             else:
                 return np.array(value)
+        elif value.get('type') == 'ragged':
+            return _ragged_from_json(value)
+        elif value.get('type') == 'categories':
+            return np.asarray(value['categories'])[array_from_json(value['codes'])]
         elif 'value' in value:
             try:
-                ar = np.frombuffer(value['value'], dtype=value['dtype']).reshape(value['shape'])
+                if value.get('compression') == 'zlib':
+                    ar = _decompress_unshuffle(value['value'], value['dtype'], value['shuffle'])\
+                        .reshape(value['shape'])
+                else:
+                    ar = np.frombuffer(value['value'], dtype=value['dtype']).reshape(value['shape'])
             except AttributeError:
                 # in some python27/numpy versions it does not like the memoryview
                 # we go the .tobytes() route, but since i'm not 100% sure memory copying
                 # is happening or not, we one take this path if the above fails.
                 ar = np.frombuffer(value['value'].tobytes(), dtype=value['dtype']).reshape(value['shape'])
             if value.get('type') == 'date':
-                assert value['dtype'] == 'float64'
-                ar = ar.astype('datetime64[ms]')
+                if value['dtype'] in ('float32', 'float64'):
+                    # dates coming from the frontend are in ms, float32 dates
+                    # are relative to an offset
+                    if 'offset' in value:
+                        ar = ar.astype(np.float64) + value['offset']
+                    ar = ar.astype('datetime64[ms]')
+                else:
+                    assert value['dtype'] == 'int64'
+                    ar = ar.view('datetime64[%s]' % value.get('unit', 'ms'))
+            elif value['dtype'] == 'float32' and getattr(obj, 'wire_dtype', None) == 'float32':
+                # float32 is only the precision of the transfer, the kernel
+                # keeps the data in float64
+                ar = ar.astype(np.float64)
             return ar
 
 
-def array_to_json(ar, obj=None, force_contiguous=True):
+# string arrays of at least this size are dictionary encoded when they have
+# less unique values than half their size
+CATEGORIES_MIN_SIZE = 256
+
+
+def _codes_dtype(n_categories):
+    for dtype in (np.int8, np.int16):
+        if n_categories <= np.iinfo(dtype).max:
+            return dtype
+    return np.int32
+
+
+def _categories_to_json(codes, categories, obj):
+    # -1 codes stand for missing values
+    return {
+        'type': 'categories',
+        'categories': categories,
+        'codes': array_to_json(codes.astype(_codes_dtype(len(categories))), obj),
+    }
+
+
+def _strings_to_json(ar, obj):
+    """Serializes an array of strings as a list, or as unique values and codes.
+
+    The cardinality is first estimated on the beginning of the array, so that
+    high cardinality arrays (e.g. labels) are not factorized for nothing.
+    """
+    if ar.size >= CATEGORIES_MIN_SIZE:
+        sample = ar.ravel()[:CATEGORIES_MIN_SIZE]
+        if len(set(sample.tolist())) * 2 <= len(sample):
+            codes, categories = pd.factorize(ar.ravel())
+            if len(categories) * 2 <= ar.size:
+                return _categories_to_json(codes.reshape(ar.shape), categories.tolist(), obj)
+    return ar.tolist()
+
+
+def _ragged_to_json(ar, obj, force_contiguous):
+    """Serializes an object array of 1d numerical arrays (e.g. the curves of
+    a Lines mark) as a single buffer of values plus the offsets of the rows.
+
+    Other arrays of arrays (e.g. of strings) are serialized row by row.
+    """
+    rows = [np.asarray(row) for row in ar]
+    kinds = set(row.dtype.kind for row in rows)
+    if rows and ar.ndim == 1 and all(row.ndim == 1 for row in rows) and \
+            (kinds <= set('iuf') or kinds == {'M'}):
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=offsets[1:])
+        if offsets[-1] <= np.iinfo(np.int32).max:
+            offsets = offsets.astype(np.int32)
+        return {
+            'type': 'ragged',
+            'values': array_to_json(np.concatenate(rows), obj),
+            'offsets': array_to_json(offsets, obj),
+        }
+    return [array_to_json(row, obj, force_contiguous) for row in rows]
+
+
+def _ragged_from_json(value):
+    values = array_from_json(value['values'])
+    offsets = array_from_json(value['offsets'])
+    rows = np.split(values, offsets[1:-1])
+    if len(set(len(row) for row in rows)) > 1:
+        # if a 'ragged' array, we should explicitly pass dtype=object
+        ar = np.empty(len(rows), dtype=object)
+        for i, row in enumerate(rows):
+            ar[i] = row
+        return ar
+    return np.array(rows)
+
+
+def _infer_object_type(ar):
+    """Returns the pandas inferred type of the elements of an object array.
+
+    Missing values are not skipped, so that e.g. an array of strings
+    containing None is reported as 'mixed'.
+    """
+    return pd.api.types.infer_dtype(ar.ravel(), skipna=False)
+
+
+def _object_to_datetime64(ar):
+    """Converts an object array of datetimes to a datetime64 array.
+
+    pd.to_datetime is vectorized, unlike ndarray.astype which converts the
+    objects one by one. Timezone aware dates are converted to UTC.
+    """
+    try:
+        dates = pd.to_datetime(ar.ravel())
+    except (TypeError, ValueError):
+        # e.g. mixed timezones
+        return ar.astype('datetime64[ms]')
+    if dates.tz is not None:
+        dates = dates.tz_convert(None)
+    return dates.to_numpy().reshape(ar.shape)
+
+
+def _dates_to_float32(ar):
+    """Encodes a datetime64 array as float32 ms relative to its earliest date.
+
+    Returns the encoded array and the offset (in ms). Sending the dates
+    relative to an offset keeps ms precision over spans of a few hours, and
+    a relative precision of 1e-7 of the span beyond. NaT is encoded as NaN.
+    """
+    ms = ar.astype('datetime64[ms]').view(np.int64)
+    nat = np.isnat(ar)
+    valid = ms[~nat]
+    offset = int(valid.min()) if valid.size else 0
+    values = (ms - offset).astype(np.float32)
+    values[nat] = np.nan
+    return values, offset
+
+
+def array_to_json(ar, obj=None, force_contiguous=True, wire_dtype=None, compression=None):
+    """Serializes a numpy array to the binary format understood by the frontend.
+
+    `wire_dtype` can be set to 'float32' to send floating point and date
+    arrays in single precision. `compression` can be set to 'zlib' to
+    compress the buffers of at least COMPRESSION_MIN_SIZE bytes. When not
+    given, the `wire_dtype` and `compression` attributes of `obj` (e.g. a
+    Mark) are used if they exist.
+    """
     if ar is None:
         return None
 
+    if wire_dtype is None:
+        wire_dtype = getattr(obj, 'wire_dtype', None)
+    if compression is None:
+        compression = getattr(obj, 'compression', None)
+
     array_type = None
 
     if ar.dtype.kind == 'O':
-        # Try to serialize the array of objects
-        is_string = np.vectorize(lambda x: isinstance(x, str))
-        is_timestamp = np.vectorize(lambda x: isinstance(x, pd.Timestamp))
-        is_array_like = np.vectorize(lambda x: isinstance(x, (list, np.ndarray)))
-
-        if np.all(is_timestamp(ar)):
-            ar = ar.astype('datetime64[ms]').astype(np.float64)
-            array_type = 'date'
-        elif np.all(is_string(ar)):
-            ar = ar.astype('U')
-        elif np.all(is_array_like(ar)):
-            return [array_to_json(np.array(row), obj, force_contiguous) for row in ar]
+        # Try to serialize the array of objects. infer_dtype classifies all
+        # the elements in a single (compiled) pass, we only fall back to a
+        # python loop for the nested arrays case.
+        inferred_type = _infer_object_type(ar)
+
+        if inferred_type in ('datetime', 'datetime64', 'empty'):
+            ar = _object_to_datetime64(ar)
+        elif inferred_type == 'string':
+            # elements are already python strings, no need for a 'U' copy
+            return _strings_to_json(ar, obj)
+        elif inferred_type == 'mixed' and \
+                all(isinstance(x, (list, np.ndarray)) for x in ar.flat):
+            return _ragged_to_json(ar, obj, force_contiguous)
         else:
             raise ValueError("Unsupported dtype object")
 
-    if ar.dtype.kind in ['S', 'U']:  # strings to as plain json
+    if ar.dtype.kind == 'U':
+        return _strings_to_json(ar, obj)
+
+    if ar.dtype.kind == 'S':  # strings to as plain json
         return ar.tolist()
 
+    date_unit = None
+    date_offset = None
     if ar.dtype.kind == 'M':
-        # since there is no support for int64, we'll use float64 but as ms
-        # resolution, since that is the resolution the js Date object understands
-        ar = ar.astype('datetime64[ms]').astype(np.float64)
+        if wire_dtype == 'float32':
+            ar, date_offset = _dates_to_float32(ar)
+            date_unit = 'ms'
+        else:
+            # dates are sent as their int64 representation, along with their unit,
+            # the frontend converts them to ms (the resolution of the js Date object)
+            date_unit, _ = np.datetime_data(ar.dtype)
+            if date_unit not in DATE_WIRE_UNITS:
+                # e.g. 'D' or 'M', which are not a fixed number of ms
+                ar = ar.astype('datetime64[ms]')
+                date_unit = 'ms'
+            ar = ar.view(np.int64)
         array_type = 'date'
 
     if ar.dtype.kind not in ['u', 'i', 'f']:  # ints and floats, and datetime
         raise ValueError("Unsupported dtype: %s" % (ar.dtype))
 
-    if ar.dtype == np.int64:  # JS does not support int64
-        ar = ar.astype(np.int32)
+    if wire_dtype == 'float32' and ar.dtype == np.float64:
+        ar = ar.astype(np.float32)
 
     if force_contiguous and not ar.flags["C_CONTIGUOUS"]:  # make sure it's contiguous
         ar = np.ascontiguousarray(ar)
@@ -198,12 +489,180 @@ def array_to_json(ar, obj=None, force_contiguous=True):
         dtype = ar.dtype.newbyteorder()
         ar = ar.astype(dtype)
 
-    return {'value': memoryview(ar), 'dtype': str(ar.dtype), 'shape': ar.shape, 'type': array_type}
+    wire = {'value': memoryview(ar), 'dtype': str(ar.dtype), 'shape': ar.shape, 'type': array_type}
+    if compression == 'zlib' and ar.nbytes >= COMPRESSION_MIN_SIZE:
+        compressed = _shuffle_compress(ar)
+        if len(compressed) < ar.nbytes:
+            wire.update(value=memoryview(compressed), compression='zlib', shuffle=ar.itemsize)
+    if date_unit is not None:
+        wire['unit'] = date_unit
+    if date_offset is not None:
+        wire['offset'] = date_offset
+    return wire
 
 
 array_serialization = dict(to_json=array_to_json, from_json=array_from_json)
 
 
+def array_delta(previous, ar):
+    """Computes a patch turning the `previous` 1d array into `ar`.
+
+    Returns a `(start, indices)` tuple, meaning that the values of `ar` at
+    `indices` and from `start` onwards differ from `previous` (which is
+    truncated or extended to the length of `ar`), or None when a patch would
+    not be smaller than `ar` itself. Small sparse changes are sent as indices
+    and values, otherwise everything is resent from the first change.
+    """
+    if previous is None or ar is None or previous.dtype != ar.dtype or \
+            previous.ndim != 1 or ar.ndim != 1 or ar.dtype.kind not in 'iufM':
+        return None
+    common = min(len(previous), len(ar))
+    a, b = previous[:common], ar[:common]
+    if ar.dtype.kind == 'M':
+        a, b = a.view(np.int64), b.view(np.int64)
+    if ar.dtype.kind == 'f':
+        changed = ~((a == b) | (np.isnan(a) & np.isnan(b)))
+    else:
+        changed = a != b
+    indices = np.flatnonzero(changed).astype(np.int32)
+    start = common
+    if len(indices) > 0 and \
+            (common - indices[0]) * ar.itemsize <= len(indices) * (ar.itemsize + 4):
+        # resending everything from the first change is cheaper
+        start, indices = int(indices[0]), indices[:0]
+    patch_size = (len(ar) - start) * ar.itemsize + len(indices) * (ar.itemsize + 4)
+    if patch_size >= len(ar) * ar.itemsize:
+        return None
+    return start, indices
+
+
+def array_delta_to_json(previous, ar, obj=None):
+    """Serializes `ar` as a patch to `previous`, see `array_delta`.
+
+    Returns None if `ar` should be sent as a whole.
+    """
+    delta = array_delta(previous, ar)
+    if delta is None:
+        return None
+    start, indices = delta
+    return {
+        'type': 'delta',
+        'length': len(ar),
+        'start': start,
+        'tail': array_to_json(ar[start:], obj),
+        'indices': array_to_json(indices, obj) if len(indices) else None,
+        'values': array_to_json(ar[indices], obj) if len(indices) else None,
+    }
+
+
+def buffer_fingerprint(serialized):
+    """Returns an id for the content of a serialized array (as returned by
+    `array_to_json`), including the way it is encoded."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(sorted((k, v) for k, v in serialized.items() if k != 'value')).encode())
+    digest.update(serialized['value'])
+    return digest.hexdigest()
+
+
+class BufferRegistry(object):
+
+    """
+    Keeps track of the arrays held by the frontend models, so that an array
+    already held by one of them (e.g. an x array shared by several marks of a
+    figure) is sent as a reference to that array instead of its content.
+
+    The holders are (widget, trait name) pairs. An array is sent with its id
+    (see `buffer_fingerprint`) so that the frontend can share it, and released
+    when its holder sends another value. The frontend counts the references
+    to the shared arrays the same way.
+    """
+
+    def __init__(self):
+        # array id -> set of holders
+        self._holders = {}
+        # holder -> id of the array it holds
+        self._held = {}
+
+    def share(self, holder, serialized, full=False):
+        """Returns what to send for the serialized array of a holder.
+
+        The array is sent as a reference if another holder has it, unless
+        `full` is True (e.g. when the whole state is sent to a new frontend).
+        Values which are not arrays (e.g. deltas) are returned as is.
+        """
+        self.release(holder)
+        if not isinstance(serialized, dict) or 'value' not in serialized:
+            return serialized
+        buffer_id = buffer_fingerprint(serialized)
+        holders = self._holders.setdefault(buffer_id, set())
+        shared = len(holders) > 0 and not full
+        holders.add(holder)
+        self._held[holder] = buffer_id
+        if shared:
+            return {'type': 'shared', 'id': buffer_id}
+        return dict(serialized, id=buffer_id)
+
+    def release(self, holder):
+        buffer_id = self._held.pop(holder, None)
+        if buffer_id is not None:
+            holders = self._holders[buffer_id]
+            holders.discard(holder)
+            if not holders:
+                del self._holders[buffer_id]
+
+    def release_widget(self, widget):
+        for holder in [h for h in self._held if h[0] is widget]:
+            self.release(holder)
+
+
+class RingBuffer(object):
+
+    """
+    Keeps the last `capacity` points of an array, along an axis.
+
+    The points are stored in a buffer of twice the capacity, and `value` is a
+    view on the points currently kept, so that appending is O(1) amortized and
+    the memory is bounded, while `value` is a regular array in order. Points
+    are only written after the current ones, previous values are left
+    unchanged.
+    """
+
+    def __init__(self, value, capacity, axis=0):
+        self.capacity = capacity
+        self.axis = axis % value.ndim
+        shape = list(value.shape)
+        shape[self.axis] = 2 * capacity
+        self._buffer = np.empty(shape, dtype=value.dtype)
+        self._start = self._end = 0
+        self.value = self._buffer[self._slice(0, 0)]
+        self.extend(value)
+
+    def _slice(self, start, end):
+        return (slice(None),) * self.axis + (slice(start, end),)
+
+    def holds(self, value):
+        """Whether `value` is the current value, or an identical view of it."""
+        interface, current = value.__array_interface__, self.value.__array_interface__
+        return all(interface[k] == current[k] for k in ('data', 'shape', 'strides', 'typestr'))
+
+    def extend(self, values):
+        count = values.shape[self.axis]
+        if count >= self.capacity:
+            values = values[self._slice(count - self.capacity, count)]
+            count = self.capacity
+        if self._end + count > self._buffer.shape[self.axis]:
+            # copy the points which are kept to the beginning of a new buffer
+            keep = min(self._end - self._start, self.capacity - count)
+            buffer = np.empty_like(self._buffer)
+            buffer[self._slice(0, keep)] = self._buffer[self._slice(self._end - keep, self._end)]
+            self._buffer = buffer
+            self._start, self._end = 0, keep
+        self._buffer[self._slice(self._end, self._end + count)] = values
+        self._end += count
+        self._start = max(self._start, self._end - self.capacity)
+        self.value = self._buffer[self._slice(self._start, self._end)]
+
+
 def array_squeeze(trait, value):
     if len(value.shape) > 1:
         return np.squeeze(value)
@@ -252,6 +711,76 @@ def dataframe_to_json(df, obj):
 
 dataframe_serialization = dict(to_json=dataframe_to_json, from_json=dataframe_from_json)
 
+
+def _column_to_json(column, obj):
+    # Numeric, boolean and date columns are sent as binary buffers, along with
+    # a bitmap of the missing values. Other columns are dictionary encoded.
+    dtype = column.dtype
+    column_type = None
+    if pd.api.types.is_bool_dtype(dtype):
+        values = column.to_numpy(dtype=np.uint8, na_value=0)
+        column_type = 'bool'
+    elif pd.api.types.is_numeric_dtype(dtype):
+        numpy_dtype = getattr(dtype, 'numpy_dtype', dtype)
+        values = column.to_numpy(dtype=numpy_dtype, na_value=0)
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        if getattr(dtype, 'tz', None) is not None:
+            column = column.dt.tz_convert(None)
+        values = column.to_numpy()
+    else:
+        codes, categories = pd.factorize(column)
+        return _categories_to_json(codes, categories.tolist(), obj)
+
+    mask = column.isna().to_numpy()
+    return {
+        'type': column_type,
+        'values': array_to_json(values, obj),
+        'mask': array_to_json(np.packbits(mask, bitorder='little'), obj) if mask.any() else None,
+    }
+
+
+def _column_from_json(value, length):
+    if value['type'] == 'categories':
+        categories = np.array(value['categories'] + [None], dtype=object)
+        # missing values have the code -1, which picks the last category
+        return categories[array_from_json(value['codes'])]
+    values = array_from_json(value['values'])
+    if value['type'] == 'bool':
+        values = values.astype(bool)
+    if value['mask'] is not None:
+        mask = np.unpackbits(array_from_json(value['mask']), count=length,
+                             bitorder='little').astype(bool)
+        values = pd.Series(values).mask(mask).to_numpy()
+    return values
+
+
+def dataframe_columns_from_json(value, obj):
+    if isinstance(value, dict) and value.get('type') == 'columns':
+        return pd.DataFrame({
+            name: _column_from_json(column, value['length'])
+            for name, column in value['columns'].items()
+        })
+    return dataframe_from_json(value, obj)
+
+
+def dataframe_columns_to_json(df, obj):
+    """Serializes a DataFrame column by column, using binary buffers.
+
+    This is much cheaper than a list of records for large DataFrames, the
+    frontend rebuilds (lazily) the list of records.
+    """
+    if df is None:
+        return None
+    return {
+        'type': 'columns',
+        'length': len(df),
+        'columns': {name: _column_to_json(df[name], obj) for name in df.columns},
+    }
+
+
+dataframe_columns_serialization = dict(to_json=dataframe_columns_to_json,
+                                       from_json=dataframe_columns_from_json)
+
 # dataframe validators
 
 
@@ -275,8 +804,44 @@ def series_to_json(value, obj):
 series_serialization = dict(to_json=series_to_json, from_json=series_from_json)
 
 
+def _raw_view(ar):
+    """Returns a flat view of the content of an array as unsigned integers of
+    the same size, so that it can be compared bit for bit."""
+    ar = np.ascontiguousarray(ar).reshape(-1)
+    itemsize = ar.dtype.itemsize
+    return ar.view('u%d' % itemsize if itemsize in (1, 2, 4, 8) else np.uint8)
+
+
+def is_memory_mapped(ar):
+    """Whether the data of an array is memory-mapped, e.g. a view of a
+    numpy.memmap."""
+    while isinstance(ar, np.ndarray):
+        if isinstance(ar, np.memmap):
+            return True
+        ar = ar.base
+    return isinstance(ar, mmap.mmap)
+
+
 def _array_equal(a, b):
     """Really tests if arrays are equal, where nan == nan == True"""
+    if a is b:
+        # a writeable array may have been modified in place since it was set
+        return not (isinstance(a, np.ndarray) and a.flags.writeable)
+    if is_memory_mapped(a) or is_memory_mapped(b):
+        # not read for a comparison
+        return False
+    if isinstance(a, np.ndarray) and isinstance(b, np.ndarray):
+        if a.shape != b.shape or a.dtype != b.dtype:
+            return False
+        if a.dtype.kind == 'O':
+            try:
+                return bool(np.array_equal(a, b))
+            except (TypeError, ValueError):
+                return False
+        # comparing the raw content is a lot cheaper than a float comparison,
+        # and also gives nan == nan (a nan with a different payload, or -0.
+        # vs 0., only costs an unneeded sync)
+        return bool(np.array_equal(_raw_view(a), _raw_view(b)))
     try:
         return np.allclose(a, b, 0, 0, equal_nan=True)
     except (TypeError, ValueError):
@@ -128,7 +128,12 @@ export class HeatMap extends Mark {
       row.forEach((d: number, j: number) => {
         const width = plottingData.widths[j];
         const x = plottingData.xOrigin + plottingData.xStartPoints[j];
-        ctx.fillStyle = this.getElementFill(d);
+        const fill = this.getElementFill(d);
+        // cells without a color are left transparent
+        if (fill === null) {
+          return;
+        }
+        ctx.fillStyle = fill;
         ctx.fillRect(x, y, this.expandRect(width), this.expandRect(height));
       });
     });
@@ -234,7 +239,7 @@ export class HeatMap extends Mark {
   }
 
   private getElementFill(color: number | null) {
-    if (color === null) {
+    if (color === null || Number.isNaN(color)) {
       return this.model.get('null_color');
     }
 
@@ -111,12 +111,35 @@ export abstract class Mark extends widgets.WidgetView {
       },
     };
 
+    // The kernel downsamples the data to this resolution, for the marks
+    // whose data sent depends on it (e.g. with `downsampling` set)
+    this.listenTo(this.parent, 'margin_updated', this.send_plot_size);
+    this.listenTo(this.model, 'change:_needs_plot_size', this.send_plot_size);
+    this.displayed.then(() => this.send_plot_size());
+
     return scale_creation_promise;
   }
 
   abstract draw(animate?);
   abstract set_ranges();
 
+  send_plot_size(): void {
+    if (!this.model.get('_needs_plot_size')) {
+      return;
+    }
+    const width = Math.round(this.parent.plotareaWidth);
+    const height = Math.round(this.parent.plotareaHeight);
+    if (
+      width > 0 &&
+      height > 0 &&
+      (width !== this.plot_width || height !== this.plot_height)
+    ) {
+      this.plot_width = width;
+      this.plot_height = height;
+      this.send({ event: 'plot_size', width: width, height: height });
+    }
+  }
+
   set_scale_views() {
     // first, if this.scales was already defined, unregister from the
     // old ones.
@@ -602,6 +625,8 @@ export abstract class Mark extends widgets.WidgetView {
   };
   event_metadata: { [key: string]: { [key: string]: any } };
   parent: Figure;
+  plot_height: number;
+  plot_width: number;
   scales: MarkScales;
   selected_indices: (number | [number, number])[];
   selected_style: { [key: string]: string };
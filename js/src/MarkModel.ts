@@ -13,7 +13,13 @@
  * limitations under the License.
  */
 
-import { Dict, WidgetModel, unpack_models } from '@jupyter-widgets/base';
+import {
+  Dict,
+  WidgetModel,
+  put_buffers,
+  resolvePromisesDict,
+  unpack_models,
+} from '@jupyter-widgets/base';
 
 import { ScaleModel } from 'bqscales';
 
@@ -45,6 +51,7 @@ export class MarkModel extends WidgetModel {
       tooltip_style: { opacity: 0.9 },
       interactions: { hover: 'tooltip' },
       tooltip_location: 'mouse',
+      _needs_plot_size: false,
     };
   }
 
@@ -54,6 +61,8 @@ export class MarkModel extends WidgetModel {
     super.initialize(attributes, options);
     this.on('change:scales', this.update_scales, this);
     this.once('destroy', this.handle_destroy, this);
+    this.shared_ids = {};
+    this.on('msg:custom', this.handle_custom_messages, this);
     // `this.dirty` is set to `true` before starting computations that
     // might lead the state of the model to be temporarily inconsistent.
     // certain functions of views on that model might check the value
@@ -62,6 +71,67 @@ export class MarkModel extends WidgetModel {
     this.update_scales();
   }
 
+  set_state(state) {
+    // Updates of marks with a `sync_policy` are acknowledged once applied
+    const sync_id = state._sync_id;
+    delete state._sync_id;
+    // Arrays of marks with `delta_sync` may be sent as patches to the
+    // current value
+    for (const key in state) {
+      if (serialize.is_array_delta(state[key])) {
+        state[key] = serialize.apply_array_delta(this.get(key), state[key]);
+      }
+    }
+    // Arrays of figures with `share_buffers` may be shared with other marks
+    for (const key in state) {
+      const id = state[key] != null ? state[key].shared_id : undefined;
+      if (id !== undefined) {
+        serialize.acquire_shared_array(id);
+      }
+      if (this.shared_ids[key] !== undefined) {
+        serialize.release_shared_array(this.shared_ids[key]);
+      }
+      this.shared_ids[key] = id;
+    }
+    super.set_state(state);
+    if (sync_id !== undefined) {
+      this.send({ event: 'ack', sync_id: sync_id }, {});
+    }
+  }
+
+  handle_custom_messages(msg, buffers) {
+    if (msg.type === 'extend') {
+      // New points appended to data attributes by `Mark.extend`, and the
+      // number of points evicted when `max_points` is set
+      put_buffers(msg.data, msg.buffer_paths, buffers);
+      const values = {};
+      for (const key in msg.data) {
+        values[key] = serialize.array_or_json_serializer.deserialize(
+          msg.data[key],
+          this.widget_manager
+        );
+      }
+      // applied after the state updates received before
+      this.state_change = this.state_change
+        .then(() => resolvePromisesDict(values))
+        .then((values) => {
+          const state = {};
+          for (const key in values) {
+            state[key] = serialize.extend_array(
+              this.get(key),
+              values[key],
+              msg.axis[key],
+              msg.evict[key]
+            );
+          }
+          if (msg.sync_id !== undefined) {
+            state['_sync_id'] = msg.sync_id;
+          }
+          this.set_state(state);
+        });
+    }
+  }
+
   update_data() {
     // Update_data is typically overloaded in each mark
     // it triggers the "data_updated" event
@@ -92,6 +162,12 @@ export class MarkModel extends WidgetModel {
 
   handle_destroy() {
     this.unregister_all_scales(this.getScales());
+    for (const key in this.shared_ids) {
+      if (this.shared_ids[key] !== undefined) {
+        serialize.release_shared_array(this.shared_ids[key]);
+      }
+    }
+    this.shared_ids = {};
   }
 
   get_key_for_dimension(dimension) {
@@ -132,4 +208,5 @@ export class MarkModel extends WidgetModel {
 
   dirty: boolean;
   mark_data: any;
+  shared_ids: { [key: string]: string };
 }
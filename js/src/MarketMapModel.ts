@@ -89,5 +89,6 @@ export class MarketMapModel extends WidgetModel {
     groups: serialize.array_or_json_serializer,
     display_text: serialize.array_or_json_serializer,
     color: serialize.array_or_json_serializer,
+    ref_data: serialize.dataframe_serializer,
   };
 }
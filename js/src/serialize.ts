@@ -23,14 +23,98 @@ const arrayToTypes = {
   Float64Array: 'float64',
 };
 
-function deserialize_typed_array(data) {
-  const type = typesToArray[data.dtype];
+// number of ms in one unit of the int64 dates sent by the kernel, as a
+// [numerator, denominator] pair to avoid inexact factors like 1e-6
+const dateUnitsToMs = {
+  s: [1e3, 1],
+  ms: [1, 1],
+  us: [1, 1e3],
+  ns: [1, 1e6],
+};
+
+// Converts a buffer of (little endian) 64 bits integers into a Float64Array,
+// reading each value as a pair of 32 bits words. This is exact up to 2^53.
+// NaT (the smallest int64) is mapped to NaN when `nat_to_nan` is set.
+function int64_to_float64(
+  buffer: ArrayBuffer,
+  signed: boolean,
+  [num, den] = [1, 1],
+  nat_to_nan = false
+) {
+  const words = new Uint32Array(buffer);
+  const ar = new Float64Array(words.length / 2);
+  for (let i = 0; i < ar.length; i++) {
+    const lo = words[2 * i];
+    const hi = words[2 * i + 1];
+    if (nat_to_nan && hi === 0x80000000 && lo === 0) {
+      ar[i] = NaN;
+    } else {
+      ar[i] = (((signed ? hi | 0 : hi) * 4294967296 + lo) * num) / den;
+    }
+  }
+  return ar;
+}
+
+function is_promise(value) {
+  return value != null && typeof value.then === 'function';
+}
+
+// Reverts the byte shuffling done by the kernel before compression, which
+// groups the i-th bytes of all the elements together
+function unshuffle(bytes: Uint8Array, itemsize: number) {
+  const n = bytes.length / itemsize;
+  const out = new Uint8Array(bytes.length);
+  for (let b = 0; b < itemsize; b++) {
+    for (let i = 0; i < n; i++) {
+      out[i * itemsize + b] = bytes[b * n + i];
+    }
+  }
+  return out.buffer;
+}
 
+async function decompress(data) {
+  const stream = new Blob([data.value])
+    .stream()
+    .pipeThrough(new DecompressionStream('deflate'));
+  const bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+  return data.shuffle > 1 ? unshuffle(bytes, data.shuffle) : bytes.buffer;
+}
+
+function deserialize_typed_array(data) {
   if (data == null || !data.value || !data.value.buffer) {
     throw new Error('Failed to deserialize data');
   }
 
-  const ar = new type(data.value.buffer);
+  if (data.compression === 'zlib') {
+    // large arrays may be compressed, this returns a promise
+    return decompress(data).then((buffer) =>
+      deserialize_typed_array({
+        ...data,
+        compression: null,
+        value: new DataView(buffer),
+      })
+    );
+  }
+
+  let ar;
+  if (data.dtype === 'int64' || data.dtype === 'uint64') {
+    // int64 is not supported by the rest of the code base, and datetime64 values
+    // are sent as int64 with their unit, we convert them to float64 (in ms for dates)
+    const is_date = data.type === 'date';
+    ar = int64_to_float64(
+      data.value.buffer,
+      data.dtype === 'int64',
+      is_date ? dateUnitsToMs[data.unit || 'ms'] : [1, 1],
+      is_date
+    );
+  } else {
+    const type = typesToArray[data.dtype];
+    ar = new type(data.value.buffer);
+    if (data.type === 'date' && data.offset != null) {
+      // reduced precision dates are sent in ms relative to an offset
+      ar = Float64Array.from(ar, (v: number) => v + data.offset);
+    }
+  }
   ar.type = data.type;
   if (data.shape && data.shape.length >= 2) {
     if (data.shape.length > 2) {
@@ -48,6 +132,40 @@ function deserialize_typed_array(data) {
   }
 }
 
+// Dictionary encoded string arrays are decoded into regular arrays of strings
+function deserialize_categories(data) {
+  const decode_row = (codes) =>
+    Array.from(codes, (code: number) =>
+      code < 0 ? null : data.categories[code]
+    );
+  const decode = (codes) =>
+    isTypedArray(codes) ? decode_row(codes) : _.map(codes, decode_row);
+  const codes = deserialize_typed_array(data.codes);
+  return is_promise(codes) ? codes.then(decode) : decode(codes);
+}
+
+// Ragged arrays (e.g. the curves of a multi-line mark) are sent as a single
+// buffer of values plus the offsets of the rows, they are decoded into a
+// regular array of views on that buffer
+function deserialize_ragged(data) {
+  const split = ([values, offsets]) => {
+    const rows = [];
+    for (let i = 0; i < offsets.length - 1; i++) {
+      const row = values.subarray(offsets[i], offsets[i + 1]);
+      row.type = values.type;
+      rows.push(row);
+    }
+    return rows;
+  };
+  const parts = [
+    deserialize_typed_array(data.values),
+    deserialize_typed_array(data.offsets),
+  ];
+  return _.some(parts, is_promise)
+    ? Promise.all(parts).then(split)
+    : split(parts);
+}
+
 function serialize_typed_array(ar) {
   if (ar == null) {
     console.log('data is null');
@@ -57,33 +175,190 @@ function serialize_typed_array(ar) {
   }
   const dtype = arrayToTypes[ar.constructor.name];
   const type = ar.type || null;
+  // ar may be a view on a larger buffer (e.g. the rows of a ragged array),
+  // the whole buffer would be sent, so we copy it
+  const data = ar.byteLength === ar.buffer.byteLength ? ar : ar.slice();
   const wire = {
     dtype: dtype,
-    value: new DataView(ar.buffer),
+    value: new DataView(data.buffer),
     shape: [ar.length],
     type: type,
   };
   return wire;
 }
 
+// Arrays shared by several marks (see `BufferRegistry` on the Python side),
+// by id. `refs` counts the model attributes holding the array, an entry
+// without value is waiting for the array to be received.
+const shared_arrays = new Map<string, any>();
+
+function shared_array_entry(id: string) {
+  let entry = shared_arrays.get(id);
+  if (!entry) {
+    entry = { refs: 0, value: null };
+    entry.promise = new Promise((resolve) => (entry.resolve = resolve));
+    shared_arrays.set(id, entry);
+  }
+  return entry;
+}
+
+function register_shared_array(id: string, value) {
+  const entry = shared_array_entry(id);
+  if (entry.value !== null) {
+    // already received, e.g. with the whole state of another mark
+    return entry.value;
+  }
+  const set_value = (ar) => {
+    ar.shared_id = id;
+    entry.value = ar;
+    entry.resolve(ar);
+    return ar;
+  };
+  return is_promise(value) ? value.then(set_value) : set_value(value);
+}
+
+function lookup_shared_array(id: string) {
+  // the array may be sent by a model whose messages are not processed yet
+  const entry = shared_array_entry(id);
+  return entry.value !== null ? entry.value : entry.promise;
+}
+
+export function acquire_shared_array(id: string) {
+  shared_array_entry(id).refs++;
+}
+
+export function release_shared_array(id: string) {
+  const entry = shared_arrays.get(id);
+  if (entry && --entry.refs <= 0 && entry.value !== null) {
+    shared_arrays.delete(id);
+  }
+}
+
 function deserialize_array_or_json(data, manager) {
   if (!_.isArray(data) && !_.isObject(data)) {
     return data;
   }
 
+  if (data.id) {
+    if (data.type === 'shared') {
+      return lookup_shared_array(data.id);
+    }
+    const { id, ...array } = data;
+    return register_shared_array(id, deserialize_array_or_json(array, manager));
+  }
+
   if (_.isArray(data)) {
-    return _.map(data, (subdata) => {
+    const arrays = _.map(data, (subdata) => {
       return deserialize_array_or_json(subdata, manager);
     });
+    return _.some(arrays, is_promise) ? Promise.all(arrays) : arrays;
   }
 
   if (data.value && data.dtype) {
     return deserialize_typed_array(data);
   }
 
+  if (data.type === 'ragged') {
+    return deserialize_ragged(data);
+  }
+
+  if (data.type === 'categories') {
+    return deserialize_categories(data);
+  }
+
+  if (data.type === 'delta') {
+    // patch to the current value, applied by the model (see apply_array_delta)
+    const parts = _.map([data.tail, data.indices, data.values], (part) => {
+      return part ? deserialize_typed_array(part) : null;
+    });
+    const make_delta = ([tail, indices, values]) => {
+      return {
+        type: 'delta',
+        length: data.length,
+        start: data.start,
+        tail: tail,
+        indices: indices,
+        values: values,
+      };
+    };
+    return _.some(parts, is_promise)
+      ? Promise.all(parts).then(make_delta)
+      : make_delta(parts);
+  }
+
   throw new Error('Failed to deserialize data');
 }
 
+export function is_array_delta(data) {
+  return data != null && !isTypedArray(data) && data.type === 'delta';
+}
+
+// Applies a patch sent by the kernel for a 1d array (see `array_delta` on the
+// Python side). A new typed array is returned so that the change is detected
+// by the model.
+export function apply_array_delta(current, delta) {
+  const ar = new current.constructor(delta.length);
+  ar.set(
+    delta.length < current.length ? current.subarray(0, delta.length) : current
+  );
+  if (delta.indices) {
+    for (let i = 0; i < delta.indices.length; i++) {
+      ar[delta.indices[i]] = delta.values[i];
+    }
+  }
+  ar.set(delta.tail, delta.start);
+  ar.type = current.type;
+  return ar;
+}
+
+// Buffers allocated by extend_array, which has room to grow them in place
+const growable_buffers = new WeakSet<ArrayBuffer>();
+
+// Appends values (sent by `Mark.extend` on the Python side) to an array, and
+// drops the `evict` first points (for marks with `max_points`). A new array
+// is returned so that the change is detected by the model, but typed arrays
+// are views on a buffer twice as large as needed, so that appending is O(1)
+// amortized. For 2d arrays, axis 0 appends rows and axis 1 appends to each
+// row.
+export function extend_array(current, values, axis = 0, evict = 0) {
+  if (current == null) {
+    return values;
+  }
+  if (axis === 1) {
+    return current.map((row, i) => extend_array(row, values[i], 0, evict));
+  }
+  if (!isTypedArray(current)) {
+    return current
+      .concat(isTypedArray(values) ? Array.from(values) : values)
+      .slice(evict);
+  }
+  const length = current.length + values.length;
+  const offset = current.byteOffset / current.BYTES_PER_ELEMENT;
+  const capacity = current.buffer.byteLength / current.BYTES_PER_ELEMENT;
+  let ar;
+  if (growable_buffers.has(current.buffer) && offset + length <= capacity) {
+    // the elements after the current ones are not used by any other array
+    ar = new current.constructor(current.buffer, current.byteOffset, length);
+    ar.set(values, current.length);
+  } else {
+    // the evicted points are not copied to the new buffer
+    const kept = current.subarray(Math.min(evict, current.length));
+    evict -= current.length - kept.length;
+    const buffer = new current.constructor(
+      Math.max(2 * (kept.length + values.length), 16)
+    ).buffer;
+    growable_buffers.add(buffer);
+    ar = new current.constructor(buffer, 0, kept.length + values.length);
+    ar.set(kept);
+    ar.set(values, kept.length);
+  }
+  if (evict > 0) {
+    ar = ar.subarray(evict);
+  }
+  ar.type = current.type;
+  return ar;
+}
+
 function serialize_array_or_json(data, manager) {
   if (!_.isArray(data) && !_.isObject(data)) {
     return data;
@@ -104,3 +379,54 @@ export const array_or_json_serializer = {
   deserialize: deserialize_array_or_json,
   serialize: serialize_array_or_json,
 };
+
+// Returns a function giving the value of a DataFrame column (serialized by
+// `dataframe_columns_to_json` on the Python side) at a given row
+function column_getter(column) {
+  if (column.type === 'categories') {
+    const codes = deserialize_typed_array(column.codes);
+    return (i) => (codes[i] < 0 ? null : column.categories[codes[i]]);
+  }
+  const values = deserialize_typed_array(column.values);
+  const mask = column.mask ? deserialize_typed_array(column.mask) : null;
+  const value = (i) => {
+    if (column.type === 'bool') {
+      return values[i] !== 0;
+    }
+    return values.type === 'date' ? new Date(values[i]) : values[i];
+  };
+  return (i) => (mask && (mask[i >> 3] >> (i & 7)) & 1 ? null : value(i));
+}
+
+// The list of records of a DataFrame sent column by column, the records are
+// only built when they are accessed
+function deserialize_dataframe(data, manager) {
+  if (data == null || data.type !== 'columns') {
+    return data;
+  }
+  const names = Object.keys(data.columns);
+  const getters = names.map((name) => column_getter(data.columns[name]));
+  const records = new Array(data.length).fill(undefined);
+  const record = (i) => {
+    if (records[i] === undefined) {
+      const r = {};
+      names.forEach((name, j) => {
+        r[name] = getters[j](i);
+      });
+      records[i] = r;
+    }
+    return records[i];
+  };
+  return new Proxy(records, {
+    get: (target, prop, receiver) => {
+      if (typeof prop === 'string' && /^\d+$/.test(prop)) {
+        return Number(prop) < target.length ? record(Number(prop)) : undefined;
+      }
+      return Reflect.get(target, prop, receiver);
+    },
+  });
+}
+
+export const dataframe_serializer = {
+  deserialize: deserialize_dataframe,
+};
@@ -1,4 +1,11 @@
-import { array_or_json_serializer } from '../serialize';
+import {
+  array_or_json_serializer,
+  apply_array_delta,
+  dataframe_serializer,
+  acquire_shared_array,
+  release_shared_array,
+  extend_array,
+} from '../serialize';
 import { expect } from 'chai';
 
 describe('binary serialization >', () => {
@@ -44,6 +51,123 @@ describe('binary serialization >', () => {
     expect(serialized_x).to.deep.equal(x);
   });
 
+  it('deserialize int64 arrays', async () => {
+    // -1 and 2^40 + 1 as little endian pairs of 32 bits words
+    const x = {
+      dtype: 'int64',
+      value: new DataView(
+        new Uint32Array([0xffffffff, 0xffffffff, 1, 256]).buffer
+      ),
+      shape: [2],
+      type: null,
+    };
+    const deserialized_x = array_or_json_serializer.deserialize(x, null);
+    expect([...deserialized_x]).to.deep.equal([-1, 1099511627777]);
+  });
+
+  it('deserialize int64 date arrays', async () => {
+    // 2005-02-25 in us, and NaT
+    const x = {
+      dtype: 'int64',
+      value: new DataView(
+        new Uint32Array([0x9c8fa000, 0x3f0e4, 0, 0x80000000]).buffer
+      ),
+      shape: [2],
+      type: 'date',
+      unit: 'us',
+    };
+    const deserialized_x = array_or_json_serializer.deserialize(x, null);
+    expect(deserialized_x.type).to.equal('date');
+    expect(deserialized_x[0]).to.equal(1109289600000);
+    expect(isNaN(deserialized_x[1])).to.equal(true);
+  });
+
+  it('deserialize float32 date arrays', async () => {
+    // 2005-02-25 and 1 day after, relative to 2005-02-25
+    const x = {
+      dtype: 'float32',
+      value: new DataView(new Float32Array([0, 86400000]).buffer),
+      shape: [2],
+      type: 'date',
+      unit: 'ms',
+      offset: 1109289600000,
+    };
+    const deserialized_x = array_or_json_serializer.deserialize(x, null);
+    expect(deserialized_x.type).to.equal('date');
+    expect([...deserialized_x]).to.deep.equal([1109289600000, 1109376000000]);
+  });
+
+  it('deserialize and apply array deltas', async () => {
+    const current = new Float64Array([0, 1, 2, 3]);
+    const delta = {
+      type: 'delta',
+      length: 5,
+      start: 4,
+      tail: {
+        dtype: 'float64',
+        value: new DataView(new Float64Array([4]).buffer),
+        shape: [1],
+        type: null,
+      },
+      indices: {
+        dtype: 'int32',
+        value: new DataView(new Int32Array([1]).buffer),
+        shape: [1],
+        type: null,
+      },
+      values: {
+        dtype: 'float64',
+        value: new DataView(new Float64Array([10]).buffer),
+        shape: [1],
+        type: null,
+      },
+    };
+    const deserialized_delta = array_or_json_serializer.deserialize(
+      delta,
+      null
+    );
+    const patched = apply_array_delta(current, deserialized_delta);
+    expect(patched).to.be.instanceOf(Float64Array);
+    expect([...patched]).to.deep.equal([0, 10, 2, 3, 4]);
+    expect([...current]).to.deep.equal([0, 1, 2, 3]);
+  });
+
+  it('deserialize compressed arrays', async () => {
+    // zlib.compress of the byte shuffled float32 array [0, 0.5, 1]
+    const compressed = new Uint8Array([
+      120, 1, 99, 96, 128, 128, 6, 6, 123, 123, 0, 2, 201, 0, 255,
+    ]);
+    const x = {
+      dtype: 'float32',
+      value: new DataView(compressed.buffer),
+      shape: [3],
+      type: null,
+      compression: 'zlib',
+      shuffle: 4,
+    };
+    const deserialized_x = await array_or_json_serializer.deserialize(x, null);
+    expect(deserialized_x).to.be.instanceOf(Float32Array);
+    expect([...deserialized_x]).to.deep.equal([0, 0.5, 1.0]);
+  });
+
+  it('deserialize dictionary encoded string arrays', async () => {
+    const x = {
+      type: 'categories',
+      categories: ['Tech', 'Energy'],
+      codes: {
+        dtype: 'int8',
+        value: new DataView(new Int8Array([0, 1, 1, 0]).buffer),
+        shape: [2, 2],
+        type: null,
+      },
+    };
+    const deserialized_x = array_or_json_serializer.deserialize(x, null);
+    expect(deserialized_x).to.deep.equal([
+      ['Tech', 'Energy'],
+      ['Energy', 'Tech'],
+    ]);
+  });
+
   it('deserialize/serialize string arrays', async () => {
     // String arrays are not sent using binary buffers from the Python side
     const strlist = ['H', 'E', 'L', 'L', 'O'];
@@ -93,4 +217,172 @@ describe('binary serialization >', () => {
     );
     expect(serialized_x).to.deep.equal(x);
   });
+
+  it('deserialize/serialize ragged arrays', async () => {
+    const x = {
+      type: 'ragged',
+      values: {
+        dtype: 'float32',
+        value: new DataView(new Float32Array([0, 0.5, 1, 0, 0.5]).buffer),
+        shape: [5],
+        type: null,
+      },
+      offsets: {
+        dtype: 'int32',
+        value: new DataView(new Int32Array([0, 3, 3, 5]).buffer),
+        shape: [4],
+        type: null,
+      },
+    };
+    const deserialized_x = array_or_json_serializer.deserialize(x, null);
+    expect(deserialized_x.length).to.equal(3);
+    expect([...deserialized_x[0]]).to.deep.equal([0, 0.5, 1.0]);
+    expect([...deserialized_x[1]]).to.deep.equal([]);
+    expect([...deserialized_x[2]]).to.deep.equal([0, 0.5]);
+
+    // the rows are views on the values, only the row itself is sent back
+    const serialized_x = array_or_json_serializer.serialize(
+      deserialized_x,
+      null
+    );
+    expect(serialized_x[2].shape).to.deep.equal([2]);
+    expect([...new Float32Array(serialized_x[2].value.buffer)]).to.deep.equal([
+      0, 0.5,
+    ]);
+  });
+
+  it('deserialize shared arrays', async () => {
+    const x = {
+      id: 'abc',
+      dtype: 'float32',
+      value: new DataView(new Float32Array([0, 0.5, 1]).buffer),
+      shape: [3],
+      type: null,
+    };
+    const reference = { type: 'shared', id: 'abc' };
+
+    // the reference may be received before the array itself
+    const pending = array_or_json_serializer.deserialize(reference, null);
+    const deserialized_x = array_or_json_serializer.deserialize(x, null);
+    expect([...deserialized_x]).to.deep.equal([0, 0.5, 1.0]);
+    expect(deserialized_x.shared_id).to.equal('abc');
+    expect(await pending).to.equal(deserialized_x);
+    acquire_shared_array('abc');
+    acquire_shared_array('abc');
+
+    expect(array_or_json_serializer.deserialize(reference, null)).to.equal(
+      deserialized_x
+    );
+
+    // the array is dropped once no model holds it anymore
+    release_shared_array('abc');
+    expect(array_or_json_serializer.deserialize(reference, null)).to.equal(
+      deserialized_x
+    );
+    release_shared_array('abc');
+    const other = array_or_json_serializer.deserialize(
+      { ...x, value: new DataView(new Float32Array([2]).buffer), shape: [1] },
+      null
+    );
+    expect([...other]).to.deep.equal([2]);
+  });
+
+  it('extend arrays', async () => {
+    const x = new Float64Array([0, 1, 2]);
+    const x1 = extend_array(x, new Float64Array([3]));
+    expect([...x]).to.deep.equal([0, 1, 2]);
+    expect([...x1]).to.deep.equal([0, 1, 2, 3]);
+    // there is room to grow in place
+    const x2 = extend_array(x1, new Float64Array([4, 5]));
+    expect([...x2]).to.deep.equal([0, 1, 2, 3, 4, 5]);
+    expect(x2.buffer).to.equal(x1.buffer);
+    expect([...x1]).to.deep.equal([0, 1, 2, 3]);
+
+    // a point for each line
+    const y = [new Float32Array([0]), new Float32Array([1])];
+    const y1 = extend_array(
+      y,
+      [new Float32Array([2]), new Float32Array([3])],
+      1
+    );
+    expect(y1.map((row) => [...row])).to.deep.equal([
+      [0, 2],
+      [1, 3],
+    ]);
+
+    // new rows
+    const ohlc = [new Float64Array([0, 1, 2, 3])];
+    const ohlc1 = extend_array(ohlc, [new Float64Array([4, 5, 6, 7])], 0);
+    expect(ohlc1.length).to.equal(2);
+    expect([...ohlc1[1]]).to.deep.equal([4, 5, 6, 7]);
+
+    expect(extend_array(['a'], ['b', 'c'])).to.deep.equal(['a', 'b', 'c']);
+  });
+
+  it('extend arrays with eviction', async () => {
+    let x = new Float64Array([0, 1, 2]);
+    const x0 = x;
+    for (let i = 3; i < 100; i++) {
+      x = extend_array(x, new Float64Array([i]), 0, x.length < 4 ? 0 : 1);
+    }
+    expect([...x]).to.deep.equal([96, 97, 98, 99]);
+    expect([...x0]).to.deep.equal([0, 1, 2]);
+    // the buffers do not grow with the number of points
+    expect(x.buffer.byteLength).to.be.at.most(16 * 8);
+
+    // more points evicted than the current ones
+    x = extend_array(x, new Float64Array([6, 7, 8, 9]), 0, 4);
+    expect([...x]).to.deep.equal([6, 7, 8, 9]);
+
+    const y = [new Float32Array([0, 1]), new Float32Array([2, 3])];
+    const y1 = extend_array(
+      y,
+      [new Float32Array([4]), new Float32Array([5])],
+      1,
+      1
+    );
+    expect(y1.map((row) => [...row])).to.deep.equal([
+      [1, 4],
+      [3, 5],
+    ]);
+  });
+
+  it('deserialize column-wise dataframes', async () => {
+    const df = {
+      type: 'columns',
+      length: 3,
+      columns: {
+        name: {
+          type: 'categories',
+          categories: ['A', 'B'],
+          codes: {
+            dtype: 'int32',
+            value: new DataView(new Int32Array([0, -1, 1]).buffer),
+            shape: [3],
+            type: null,
+          },
+        },
+        value: {
+          type: null,
+          values: {
+            dtype: 'float64',
+            value: new DataView(new Float64Array([0.5, NaN, 2]).buffer),
+            shape: [3],
+            type: null,
+          },
+          mask: {
+            dtype: 'uint8',
+            value: new DataView(new Uint8Array([0b010]).buffer),
+            shape: [1],
+            type: null,
+          },
+        },
+      },
+    };
+    const records = dataframe_serializer.deserialize(df, null);
+    expect(records.length).to.equal(3);
+    expect(records[0]).to.deep.equal({ name: 'A', value: 0.5 });
+    expect(records[1]).to.deep.equal({ name: null, value: null });
+    expect(records.map((r) => r.value)).to.deep.equal([0.5, null, 2]);
+  });
 });
@@ -0,0 +1,172 @@
+"""Serialization throughput benchmarks.
+
+These are not collected by pytest, run them with:
+
+    python -m tests.benchmark_serialization [name ...]
+
+or, for the wire size and encode/decode time of the compression:
+
+    python -m tests.benchmark_serialization compression
+
+or, for the time of the reducers of `Mark.downsampling` and of the
+`MinMaxPyramid` index (up to 100M points, which takes a few GB of memory):
+
+    python -m tests.benchmark_serialization downsampling [reducer ...]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from bqplot.downsampling import MinMaxPyramid, downsample, reducers
+from bqplot.traits import array_to_json, array_from_json, convert_to_date
+
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+# name -> function taking a size and returning the callable to be timed
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def wrap(func):
+        BENCHMARKS[name] = func
+        return func
+    return wrap
+
+
+@benchmark('object_strings')
+def bench_object_strings(n):
+    ar = np.array(['sector_%d' % (i % 11) for i in range(n)], dtype=object)
+    return lambda: array_to_json(ar)
+
+
+@benchmark('object_timestamps')
+def bench_object_timestamps(n):
+    ar = pd.Series(pd.date_range('2000-01-01', periods=n, freq='min'))\
+        .to_numpy(dtype=object)
+    return lambda: array_to_json(ar)
+
+
+@benchmark('convert_to_date_rows')
+def bench_convert_to_date_rows(n):
+    # n / 250 curves of 250 dates, to show the scaling with the number of rows
+    dates = pd.date_range('2000-01-01', periods=250).strftime('%Y-%m-%d').tolist()
+    rows = np.array([dates] * max(n // 250, 1), dtype=object)
+    return lambda: convert_to_date(rows)
+
+
+def _arrow_data(n):
+    x = np.cumsum(np.random.default_rng(0).normal(size=n))
+    return x, [x[i:i + n // 4] for i in range(0, n, n // 4)]
+
+
+@benchmark('numpy_scatter_x')
+def bench_numpy_scatter_x(n):
+    from bqplot import Scatter
+    x, _ = _arrow_data(n)
+    scatter = Scatter()
+
+    def assign_and_serialize():
+        scatter.x = x
+        return scatter.get_state('x')
+    return assign_and_serialize
+
+
+@benchmark('arrow_scatter_x')
+def bench_arrow_scatter_x(n):
+    import pyarrow as pa
+    from bqplot import Scatter
+    x, _ = _arrow_data(n)
+    scatter = Scatter()
+
+    def assign_and_serialize():
+        scatter.x = pa.array(x)
+        return scatter.get_state('x')
+    return assign_and_serialize
+
+
+@benchmark('arrow_chunked_scatter_x')
+def bench_arrow_chunked_scatter_x(n):
+    import pyarrow as pa
+    from bqplot import Scatter
+    _, chunks = _arrow_data(n)
+    scatter = Scatter()
+
+    def assign_and_serialize():
+        scatter.x = pa.chunked_array(chunks)
+        return scatter.get_state('x')
+    return assign_and_serialize
+
+
+def compression_arrays(n):
+    rng = np.random.default_rng(0)
+    walk = np.cumsum(rng.normal(size=n))
+    return {
+        'float64': walk,
+        'float32': walk.astype(np.float32),
+        'int64': np.arange(n, dtype=np.int64) * 7,
+        'int32': rng.integers(0, 100, size=n, dtype=np.int32),
+        'datetime64[ns]': pd.date_range('2000-01-01', periods=n, freq='min').to_numpy(),
+    }
+
+
+def run_compression(sizes=SIZES, repeat=3):
+    print('%-16s %10s %12s %12s %12s %12s' % (
+        'dtype', 'size', 'raw (kB)', 'wire (kB)', 'encode (ms)', 'decode (ms)'))
+    for n in sizes:
+        for dtype, ar in compression_arrays(n).items():
+            serialized = array_to_json(ar, compression='zlib')
+            wire = memoryview(serialized['value']).nbytes
+            encode = min(timeit.repeat(lambda: array_to_json(ar, compression='zlib'),
+                                       number=1, repeat=repeat))
+            decode = min(timeit.repeat(lambda: array_from_json(serialized),
+                                       number=1, repeat=repeat))
+            print('%-16s %10d %12.1f %12.1f %12.2f %12.2f' % (
+                dtype, n, ar.nbytes / 1e3, wire / 1e3,
+                encode * 1e3, decode * 1e3))
+
+
+DOWNSAMPLING_SIZES = (1_000_000, 10_000_000, 100_000_000)
+
+
+def run_downsampling(names=None, sizes=DOWNSAMPLING_SIZES, width=1000, repeat=3):
+    names = names or list(reducers)
+    print('%-16s %12s %10s %12s %16s' % ('reducer', 'size', 'points', 'best (ms)', 'elements/s'))
+    for n in sizes:
+        x = np.arange(n, dtype=np.float64)
+        y = np.cumsum(np.random.default_rng(0).normal(size=n))
+        for name in names:
+            points = len(downsample(name, {'x': x, 'y': y}, 0, n - 1, width)['x'])
+            best = min(timeit.repeat(lambda: downsample(name, {'x': x, 'y': y}, 0, n - 1, width),
+                                     number=1, repeat=repeat))
+            print('%-16s %12d %10d %12.2f %16.0f' % (name, n, points, best * 1e3, n / best))
+        # the index is built once, then used on each pan and zoom
+        build = min(timeit.repeat(lambda: MinMaxPyramid(x, y), number=1, repeat=repeat))
+        index = MinMaxPyramid(x, y)
+        points = len(downsample('m4', {'x': x, 'y': y}, 0, n - 1, width, index)['x'])
+        best = min(timeit.repeat(lambda: downsample('m4', {'x': x, 'y': y}, 0, n - 1, width, index),
+                                 number=1, repeat=repeat))
+        print('%-16s %12d %10s %12.2f %16.0f' % ('index build', n, '', build * 1e3, n / build))
+        print('%-16s %12d %10d %12.2f %16.0f' % ('m4 (index)', n, points, best * 1e3, n / best))
+        del x, y, index
+
+
+def run(names=None, sizes=SIZES, repeat=3):
+    names = names or list(BENCHMARKS)
+    print('%-24s %10s %12s %16s' % ('benchmark', 'size', 'best (ms)', 'elements/s'))
+    for name in names:
+        for n in sizes:
+            func = BENCHMARKS[name](n)
+            best = min(timeit.repeat(func, number=1, repeat=repeat))
+            print('%-24s %10d %12.2f %16.0f' % (name, n, best * 1e3, n / best))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['compression']:
+        run_compression()
+    elif sys.argv[1:2] == ['downsampling']:
+        run_downsampling(sys.argv[2:])
+    else:
+        run(sys.argv[1:])
@@ -1,8 +1,12 @@
 import bqplot
 import numpy as np
 import pandas as pd
-from bqplot.traits import array_to_json, array_from_json
+from bqplot.traits import (array_to_json, array_from_json, array_delta_to_json,
+                          dataframe_columns_to_json, dataframe_columns_from_json, _array_equal,
+                          convert_to_date, date_to_json, date_from_json)
 import pytest
+import datetime as dt
+from bqplot.market_map import MarketMap
 
 
 def test_binary_serialize_1d(figure):
@@ -39,15 +43,18 @@ def test_binary_serialize_datetime():
     scatter = bqplot.Scatter(x=x)
 
     state = scatter.get_state()
-    assert state['x']['dtype'] == 'float64'
-    assert np.array(state['x']['value'], dtype=np.float64).astype(np.int64).tolist() == x_ms.tolist()
+    # days are not a supported wire unit, they are converted to ms
+    assert state['x']['dtype'] == 'int64'
+    assert state['x']['unit'] == 'ms'
+    assert np.array(state['x']['value'], dtype=np.int64).tolist() == x_ms.tolist()
 
     x = np.array([pd.Timestamp('2005-02-25'), pd.Timestamp('2005-02-26'), pd.Timestamp('2005-02-27'), pd.Timestamp('2005-02-28')])
     scatter = bqplot.Scatter(x=x)
 
     state = scatter.get_state()
-    assert state['x']['dtype'] == 'float64'
-    assert np.array(state['x']['value'], dtype=np.float64).astype(np.int64).tolist() == x_ms.tolist()
+    assert state['x']['dtype'] == 'int64'
+    assert state['x']['unit'] in ('s', 'ms', 'us', 'ns')
+    assert array_from_json(state['x']).astype('datetime64[ms]').astype(np.int64).tolist() == x_ms.tolist()
 
 
     # currently a roundtrip does not converse the datetime64 type
@@ -55,7 +62,31 @@ def test_binary_serialize_datetime():
     scatter2.set_state(state)
 
     assert scatter2.x.dtype.kind == 'M'
-    assert scatter2.x.astype(np.int64).tolist() == x_ms.tolist()
+    assert scatter2.x.astype('datetime64[ms]').astype(np.int64).tolist() == x_ms.tolist()
+
+    # dates coming from the frontend are float64 ms
+    x_ms_float = x_ms.astype(np.float64)
+    x = array_from_json({'value': memoryview(x_ms_float), 'dtype': 'float64', 'shape': (4,), 'type': 'date'})
+    assert x.dtype == np.dtype('datetime64[ms]')
+    assert x.astype(np.int64).tolist() == x_ms.tolist()
+
+
+def test_binary_serialize_int64():
+    # int64 is sent as is, without truncation to int32
+    x = np.array([0, 2**40, -2**40], dtype=np.int64)
+    serialized = array_to_json(x)
+    assert serialized['dtype'] == 'int64'
+    assert serialized['value'] == memoryview(x)
+    assert array_from_json(serialized).tolist() == x.tolist()
+
+    x = np.array(['2005-02-25T00:00:00.000000001', 'NaT'], dtype='datetime64[ns]')
+    serialized = array_to_json(x)
+    assert serialized['type'] == 'date'
+    assert serialized['unit'] == 'ns'
+    assert serialized['value'] == memoryview(x.view(np.int64))
+    deserialized = array_from_json(serialized)
+    assert deserialized.dtype == x.dtype
+    assert np.array_equal(deserialized, x, equal_nan=True)
 
 
 def test_binary_serialize_text():
@@ -96,46 +127,53 @@ def test_serialize_nested_list():
 
     serialized_data = array_to_json(data)
 
-    assert len(serialized_data) == 3
-
-    assert serialized_data[0]['dtype'] == 'int32'
-    assert serialized_data[0]['value'] == memoryview(np.array(data[0]))
-
-    assert serialized_data[1]['dtype'] == 'int32'
-    assert serialized_data[1]['value'] == memoryview(np.array(data[1]))
-
-    assert serialized_data[2]['dtype'] == 'int32'
-    assert serialized_data[2]['value'] == memoryview(np.array(data[2]))
+    # the rows are sent as a single buffer of values plus the row offsets
+    assert serialized_data['type'] == 'ragged'
+    assert serialized_data['values']['dtype'] == 'int64'
+    assert serialized_data['values']['value'] == memoryview(np.concatenate(data.tolist()))
+    assert serialized_data['offsets']['dtype'] == 'int32'
+    assert serialized_data['offsets']['value'] == memoryview(np.array([0, 7, 12, 20], dtype=np.int32))
 
     deserialized_data = array_from_json(serialized_data)
 
+    assert deserialized_data.dtype == object
     for el, deserialized_el in zip(data, deserialized_data):
         assert np.all(el == deserialized_el)
 
     data = np.array([
         [0, 1, 2, 3, 4, 5, 6],
-        np.array([0, 1, 2, 2, 3]),
+        np.array([0.5, 1, 2, 2, 3]),
         [0, 1, 2, 3]
     ], dtype=object)
 
     serialized_data = array_to_json(data)
 
-    assert len(serialized_data) == 3
+    assert serialized_data['values']['dtype'] == 'float64'
+    assert serialized_data['offsets']['value'] == memoryview(np.array([0, 7, 12, 16], dtype=np.int32))
 
-    assert serialized_data[0]['dtype'] == 'int32'
-    assert serialized_data[0]['value'] == memoryview(np.array(data[0]))
+    deserialized_data = array_from_json(serialized_data)
+
+    for el, deserialized_el in zip(data, deserialized_data):
+        assert np.all(el == deserialized_el)
 
-    assert serialized_data[1]['dtype'] == 'int32'
-    assert serialized_data[1]['value'] == memoryview(np.array(data[1]))
+    # rows of dates
+    data = np.array([
+        np.arange('2005-02-25', '2005-02-28', dtype='datetime64[D]'),
+        np.array(['2005-03-01T12:00'], dtype='datetime64[m]'),
+    ], dtype=object)
 
-    assert serialized_data[2]['dtype'] == 'int32'
-    assert serialized_data[2]['value'] == memoryview(np.array(data[2]))
+    serialized_data = array_to_json(data)
 
+    assert serialized_data['values']['type'] == 'date'
     deserialized_data = array_from_json(serialized_data)
-
     for el, deserialized_el in zip(data, deserialized_data):
         assert np.all(el == deserialized_el)
 
+    # the previous row by row encoding is still understood
+    serialized_data = [array_to_json(np.array(row)) for row in data]
+    for el, deserialized_el in zip(data, array_from_json(serialized_data)):
+        assert np.all(el == deserialized_el)
+
     data = np.array([
         ['Hello', 'Hallo'],
         ['Coucou', 'Hi', 'Ciao']
@@ -151,3 +189,415 @@ def test_serialize_nested_list():
     deserialized_data = array_from_json(serialized_data)
 
     assert np.all(data == deserialized_data)
+
+
+def test_serialize_object_classification():
+    # datetime.datetime objects are handled like pandas Timestamps
+    x = np.array([dt.datetime(2005, 2, 25), pd.Timestamp('2005-02-26')], dtype=object)
+    serialized = array_to_json(x)
+    assert serialized['type'] == 'date'
+    assert array_from_json(serialized).astype('datetime64[ms]').astype(np.int64).tolist() == \
+        [1109289600000, 1109376000000]
+
+    # 2d arrays of strings are sent as nested lists
+    text = np.array([['a', 'b'], ['c', 'd']], dtype=object)
+    assert array_to_json(text) == [['a', 'b'], ['c', 'd']]
+
+    # mixing arrays and scalars is not supported
+    with pytest.raises(ValueError, match='.*Unsupported dtype object*'):
+        array_to_json(np.array([[0, 1], 2, 'a'], dtype=object))
+
+
+def test_serialize_float32_wire_dtype():
+    x = np.linspace(-1e3, 1e3, 1001)
+    serialized = array_to_json(x, wire_dtype='float32')
+    assert serialized['dtype'] == 'float32'
+    deserialized = array_from_json(serialized)
+    assert np.all(np.abs(deserialized - x) <= np.abs(x) * np.finfo(np.float32).eps)
+
+    # integers are left untouched
+    assert array_to_json(np.arange(3), wire_dtype='float32')['dtype'] == 'int64'
+
+    # dates are sent relative to the earliest one, keeping ms precision
+    # over a few hours
+    x = np.datetime64('2005-02-25T12:00:00.000') + np.arange(0, 10**7, 997).astype('timedelta64[ms]')
+    x[3] = np.datetime64('NaT')
+    serialized = array_to_json(x, wire_dtype='float32')
+    assert serialized['dtype'] == 'float32'
+    assert serialized['type'] == 'date'
+    assert serialized['offset'] == x[0].astype('datetime64[ms]').astype(np.int64)
+    deserialized = array_from_json(serialized)
+    assert np.array_equal(deserialized, x, equal_nan=True)
+
+    # over a year, the error is bounded by the float32 precision of the span
+    x = np.datetime64('2005-01-01') + np.arange(0, 365 * 86400, 3607).astype('timedelta64[s]')
+    deserialized = array_from_json(array_to_json(x, wire_dtype='float32'))
+    error = np.abs((deserialized - x).astype('timedelta64[ms]').astype(np.int64))
+    assert error.max() <= 365 * 86400 * 1000 * np.finfo(np.float32).eps
+
+
+def test_mark_wire_dtype(scales):
+    x = np.linspace(0, 1, 10)
+    scatter = bqplot.Scatter(x=x, y=x, scales=scales, wire_dtype='float32')
+    state = scatter.get_state()
+    assert state['x']['dtype'] == 'float32'
+    assert state['y']['dtype'] == 'float32'
+    assert state['opacities']['dtype'] == 'float32'
+
+    scatter.wire_dtype = None
+    assert scatter.get_state()['x']['dtype'] == 'float64'
+
+
+def test_mark_wire_dtype_from_frontend(scales):
+    x = np.linspace(0, 1, 10)
+    scatter = bqplot.Scatter(x=x, y=x, scales=scales, wire_dtype='float32')
+    # e.g. points moved in the frontend come back in float32
+    moved = x.astype(np.float32)
+    moved[0] = 0.5
+    scatter.set_state({'x': {'value': memoryview(moved), 'dtype': 'float32', 'shape': (10,)}})
+    assert scatter.x.dtype == np.float64
+    assert scatter.x[0] == 0.5
+
+    scatter.wire_dtype = None
+    scatter.set_state({'x': {'value': memoryview(moved), 'dtype': 'float32', 'shape': (10,)}})
+    assert scatter.x.dtype == np.float32
+
+
+def _apply_delta(previous, delta):
+    ar = np.resize(previous, delta['length'])
+    if delta['indices'] is not None:
+        ar[array_from_json(delta['indices'])] = array_from_json(delta['values'])
+    ar[delta['start']:] = array_from_json(delta['tail'])
+    return ar
+
+
+def test_array_delta():
+    previous = np.arange(1000, dtype=np.float64)
+
+    # append
+    ar = np.arange(1010, dtype=np.float64)
+    delta = array_delta_to_json(previous, ar)
+    assert delta['start'] == 1000
+    assert delta['indices'] is None
+    assert np.array_equal(_apply_delta(previous, delta), ar)
+
+    # sparse changes
+    ar = previous.copy()
+    ar[[10, 500]] = np.nan
+    delta = array_delta_to_json(previous, ar)
+    assert delta['start'] == 1000
+    assert array_from_json(delta['indices']).tolist() == [10, 500]
+    assert np.array_equal(_apply_delta(previous, delta), ar, equal_nan=True)
+
+    # tail replacement and truncation
+    ar = previous[:990].copy()
+    ar[-5:] = -1
+    delta = array_delta_to_json(previous, ar)
+    assert delta['start'] == 985
+    assert delta['indices'] is None
+    assert np.array_equal(_apply_delta(previous, delta), ar)
+
+    # dates
+    dates = np.datetime64('2005-02-25') + np.arange(1000).astype('timedelta64[s]')
+    ar = np.append(dates, np.datetime64('NaT'))
+    delta = array_delta_to_json(dates, ar)
+    assert delta['start'] == 1000
+
+    # nothing to gain
+    assert array_delta_to_json(previous, previous + 1) is None
+    assert array_delta_to_json(previous, previous.astype(np.float32)) is None
+    assert array_delta_to_json(None, previous) is None
+
+
+def test_mark_delta_sync(scales):
+    x = np.arange(100, dtype=np.float64)
+    lines = bqplot.Lines(x=x, y=x, scales=scales, delta_sync=True)
+    sent = []
+    lines._send = lambda msg, buffers=None: sent.append(msg['state'])
+
+    # the first update is sent as a whole
+    lines.y = x + 1
+    assert 'dtype' in sent[-1]['y']
+
+    lines.y = np.append(x + 1, 100)
+    assert sent[-1]['y']['type'] == 'delta'
+    assert sent[-1]['y']['start'] == 100
+
+    with lines.hold_sync():
+        lines.x = np.arange(101, dtype=np.float64)
+        y = lines.y.copy()
+        y[3] = -1
+        lines.y = y
+    assert 'dtype' in sent[-1]['x']
+    assert sent[-1]['y']['type'] == 'delta'
+    assert sent[-1]['y']['start'] == 101
+
+    # a full state is sent as a whole
+    lines.send_state()
+    assert 'dtype' in sent[-1]['y']
+
+    lines.delta_sync = False
+    lines.y = np.append(lines.y, 101)
+    assert 'dtype' in sent[-1]['y']
+
+
+def test_figure_share_buffers(scales):
+    x = np.arange(100, dtype=np.float64)
+    lines = [bqplot.Lines(x=x, y=x, scales=scales) for i in range(3)]
+    figure = bqplot.Figure(marks=lines[:2], share_buffers=True)
+    sent = []
+    for mark in lines:
+        mark._send = lambda msg, buffers=None, mark=mark: sent.append((mark, msg['state']))
+
+    t = np.linspace(0, 1, 100)
+    lines[0].x = t
+    assert 'dtype' in sent[-1][1]['x']
+    shared_id = sent[-1][1]['x']['id']
+
+    # the other mark of the figure only sends a reference
+    lines[1].x = t.copy()
+    assert sent[-1] == (lines[1], {'x': {'type': 'shared', 'id': shared_id}})
+    # but not a mark of another figure
+    lines[2].x = t.copy()
+    assert 'dtype' in sent[-1][1]['x']
+
+    # the whole state is always sent with the arrays
+    lines[1].send_state()
+    assert sent[-1][1]['x']['id'] == shared_id
+    assert 'dtype' in sent[-1][1]['x']
+
+    # once no mark holds the array anymore, it is sent again
+    lines[0].x = x
+    lines[1].x = x + 1
+    lines[0].x = t
+    assert sent[-1][1]['x']['id'] == shared_id
+    assert 'dtype' in sent[-1][1]['x']
+
+    # a different encoding is a different array
+    lines[1].wire_dtype = 'float32'
+    lines[1].x = t
+    assert 'dtype' in sent[-1][1]['x']
+
+    figure.marks = [lines[0]]
+    assert lines[1]._buffer_registry is None
+    figure.share_buffers = False
+    assert lines[0]._buffer_registry is None
+    lines[1].x = x
+    assert 'id' not in sent[-1][1]['x']
+
+
+def test_figure_share_buffers_per_figure(scales):
+    x = np.arange(100, dtype=np.float64)
+    figures = [bqplot.Figure(share_buffers=True) for i in range(2)]
+    # the registry of a figure is given to the marks added to it only
+    figures[0].marks = [bqplot.Lines(x=x, y=x, scales=scales)]
+    figures[1].marks = [bqplot.Lines(x=x, y=x, scales=scales)]
+    lines = bqplot.Lines(x=x, y=x, scales=scales)
+    assert lines._buffer_registry is None
+    for figure in figures:
+        assert figure.marks[0]._buffer_registry is figure._buffer_registry
+    assert figures[0]._buffer_registry is not figures[1]._buffer_registry
+    figures[0].marks = figures[0].marks + [lines]
+    assert lines._buffer_registry is figures[0]._buffer_registry
+
+
+def test_serialize_compression():
+    x = np.linspace(0, 1, 100000)
+    serialized = array_to_json(x, compression='zlib')
+    assert serialized['compression'] == 'zlib'
+    assert serialized['shuffle'] == 8
+    assert len(serialized['value']) < x.nbytes / 2
+    assert np.array_equal(array_from_json(serialized), x)
+
+    x = np.arange('2005-02-25', '2005-03', dtype='datetime64[s]').reshape(-1, 100)
+    serialized = array_to_json(x, compression='zlib')
+    assert serialized['compression'] == 'zlib'
+    assert np.array_equal(array_from_json(serialized), x)
+
+    # small and incompressible arrays are sent as is
+    assert 'compression' not in array_to_json(np.arange(10.), compression='zlib')
+    noise = np.random.default_rng(0).bytes(1 << 17)
+    assert 'compression' not in array_to_json(np.frombuffer(noise, dtype=np.uint8), compression='zlib')
+
+
+def test_mark_compression(scales):
+    x = np.linspace(0, 1, 100000)
+    scatter = bqplot.Scatter(x=x, y=x, scales=scales, compression='zlib')
+    state = scatter.get_state()
+    assert state['x']['compression'] == 'zlib'
+
+    scatter2 = bqplot.Scatter(scales=scales)
+    scatter2.set_state(state)
+    assert np.array_equal(scatter2.x, x)
+
+
+def test_serialize_dataframe_columns():
+    df = pd.DataFrame({
+        'ticker': ['AAPL', 'MSFT', None, 'AAPL'],
+        'sector': pd.Categorical(['Tech', 'Tech', 'Energy', 'Tech']),
+        'price': [1.5, np.nan, 3., 4.],
+        'volume': np.arange(4, dtype=np.int64),
+        'listed': [True, False, True, True],
+        'date': pd.to_datetime(['2005-02-25', None, '2005-02-27', '2005-02-28']),
+    })
+    serialized = dataframe_columns_to_json(df, None)
+    assert serialized['type'] == 'columns'
+    assert serialized['length'] == 4
+    columns = serialized['columns']
+    assert columns['ticker']['type'] == 'categories'
+    assert columns['ticker']['categories'] == ['AAPL', 'MSFT']
+    assert array_from_json(columns['ticker']['codes']).tolist() == [0, 1, -1, 0]
+    assert columns['sector']['categories'] == ['Tech', 'Energy']
+    assert columns['price']['values']['dtype'] == 'float64'
+    assert array_from_json(columns['price']['mask']).tolist() == [0b10]
+    assert columns['volume']['mask'] is None
+    assert columns['listed']['type'] == 'bool'
+    assert columns['date']['values']['type'] == 'date'
+
+    deserialized = dataframe_columns_from_json(serialized, None)
+    assert deserialized.columns.tolist() == df.columns.tolist()
+    assert deserialized['ticker'].isna().tolist() == [False, False, True, False]
+    assert deserialized['ticker'][3] == 'AAPL'
+    assert deserialized['sector'].tolist() == ['Tech', 'Tech', 'Energy', 'Tech']
+    assert _array_equal(deserialized['price'], df['price'])
+    assert deserialized['volume'].tolist() == [0, 1, 2, 3]
+    assert deserialized['listed'].tolist() == [True, False, True, True]
+    assert deserialized['date'].isna().tolist() == [False, True, False, False]
+    assert deserialized['date'][3] == pd.Timestamp('2005-02-28')
+
+    # records are still accepted
+    assert dataframe_columns_from_json([{'a': 1}, {'a': 2}], None)['a'].tolist() == [1, 2]
+
+
+def test_market_map_ref_data():
+    df = pd.DataFrame({'name': ['A', 'B'], 'value': [1., np.nan]})
+    market_map = MarketMap(names=['A', 'B'], ref_data=df)
+    state = market_map.get_state()
+    assert state['ref_data']['type'] == 'columns'
+
+
+def test_serialize_categories():
+    sectors = np.array(['Tech', 'Energy', 'Utilities'])[np.arange(3000) % 3]
+    serialized = array_to_json(sectors)
+    assert serialized['type'] == 'categories'
+    assert serialized['categories'] == ['Tech', 'Energy', 'Utilities']
+    assert serialized['codes']['dtype'] == 'int8'
+    assert array_from_json(serialized).tolist() == sectors.tolist()
+
+    # pandas categoricals and 2d arrays
+    x = pd.Categorical(sectors.reshape(-1, 2)[:, 0])
+    bars = bqplot.Bars(x=x, y=np.arange(1500))
+    state = bars.get_state()
+    assert state['x']['type'] == 'categories'
+    bars2 = bqplot.Bars()
+    bars2.set_state(state)
+    assert bars2.x.tolist() == list(x)
+
+    serialized = array_to_json(sectors.reshape(-1, 2))
+    assert array_from_json(serialized).tolist() == sectors.reshape(-1, 2).tolist()
+
+    # high cardinality and small arrays are sent as lists
+    names = np.array(['name_%d' % i for i in range(3000)])
+    assert array_to_json(names) == names.tolist()
+    assert array_to_json(sectors[:10]) == sectors[:10].tolist()
+
+
+def test_array_equal():
+    x = np.array([0, np.nan, 2**60], dtype=np.float64)
+    # the same writeable array may have been modified in place
+    assert not _array_equal(x, x)
+    x.flags.writeable = False
+    assert _array_equal(x, x)
+    assert _array_equal(x, x.copy())
+    assert not _array_equal(x, x.astype(np.float32))
+    assert not _array_equal(x, x[:2])
+    y = x.copy()
+    y[-1] += 1e4
+    assert not _array_equal(x, y)
+
+    # non contiguous and datetime arrays
+    z = np.arange(12.).reshape(3, 4)
+    assert _array_equal(z[:, ::2], z.copy()[:, ::2])
+    d = np.arange('2005-02-25', '2005-03', dtype='datetime64[D]')
+    assert _array_equal(d, d.copy())
+    assert not _array_equal(d, d + 1)
+
+    text = np.array(['a', 'b', None], dtype=object)
+    assert _array_equal(text, text.copy())
+
+    assert _array_equal([np.nan, 5], np.array([np.nan, 5]))
+    assert not _array_equal(None, x)
+
+
+def test_mark_array_change_detection():
+    x = np.array([0, np.nan, 2.])
+    scatter = bqplot.Scatter(x=x)
+    changes = []
+    scatter.observe(changes.append, 'x')
+
+    scatter.x = x.copy()
+    scatter.x = [0, np.nan, 2.]
+    assert changes == []
+
+    scatter.x = x.astype(np.float32)
+    assert len(changes) == 1
+
+
+def test_mark_array_modified_in_place(scales):
+    x = np.arange(10.)
+    scatter = bqplot.Scatter(x=x, y=x, scales=scales)
+    changes = []
+    scatter.observe(changes.append, 'y')
+    scatter.y[0] = 5.
+    scatter.y = scatter.y
+    assert len(changes) == 1
+    assert array_from_json(scatter.get_state(['y'])['y'])[0] == 5.
+
+    # with downsampling, the points are downsampled again
+    x = np.arange(100_000.)
+    lines = bqplot.Lines(x=x, y=np.zeros_like(x), scales=scales, downsampling='m4')
+    assert lines._reduced_arrays(['y'])['y'].max() == 0
+    lines.y[1] = 1.
+    lines.y = lines.y
+    assert lines._reduced_arrays(['y'])['y'].max() == 1
+
+
+def test_convert_to_date():
+    dates = convert_to_date(['2005-02-25', '2005-02-26'])
+    assert list(dates) == [pd.Timestamp('2005-02-25'), pd.Timestamp('2005-02-26')]
+
+    rows = np.array([['2005-02-25', '2005-02-26'], ['2005-03-01', None]], dtype=object)
+    dates = convert_to_date(rows)
+    assert len(dates) == 2
+    assert list(dates[0]) == [pd.Timestamp('2005-02-25'), pd.Timestamp('2005-02-26')]
+    assert dates[1][0] == pd.Timestamp('2005-03-01') and dates[1][1] is pd.NaT
+
+    # ragged and empty rows, rows which are not dates are kept as is
+    rows = [['2005-02-25'], [], ['not a date', 'neither'], [dt.datetime(2005, 3, 1)]]
+    dates = convert_to_date(rows)
+    assert list(dates[0]) == [pd.Timestamp('2005-02-25')]
+    assert len(dates[1]) == 0
+    assert dates[2] == ['not a date', 'neither']
+    assert list(dates[3]) == [pd.Timestamp('2005-03-01')]
+
+
+def test_date_serialization():
+    date = dt.datetime(2005, 2, 25, 12, 30, 15, 123456)
+    serialized = date_to_json(date, None)
+    assert serialized == 1109334615123.456
+    assert date_from_json(serialized, None) == date
+    # ISO strings, as sent by older front-ends
+    assert date_from_json('2005-02-25T12:30:15.123Z', None) == date.replace(microsecond=123000)
+    assert date_to_json(None, None) is None
+    assert date_from_json(None, None) is None
+
+    # aware dates are sent as their UTC time
+    aware = dt.datetime(2005, 2, 25, 13, 30, 15, 123456, tzinfo=dt.timezone(dt.timedelta(hours=1)))
+    assert date_to_json(aware, None) == serialized
+
+    # np.datetime64 keeps its precision
+    pie = bqplot.Pie(x=np.datetime64('2005-02-25T12:30:15.123456789'))
+    assert pie.x.nanosecond == 789
+    assert pie.get_state('x')['x'] == pytest.approx(1109334615123.4568, abs=1e-4)
+    pie.set_state({'x': serialized})
+    assert pie.x == date
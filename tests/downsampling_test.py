@@ -0,0 +1,262 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bqplot
+from bqplot.traits import array_from_json, array_to_json
+from bqplot.downsampling import (MinMaxPyramid, as_numbers, downsample, m4_indices,
+                                 minmax_indices, ohlc_period, reducers,
+                                 register_reducer, resample_ohlc)
+
+
+def _walk(n):
+    return np.cumsum(np.random.default_rng(0).normal(size=n))
+
+
+def _per_bucket(x, y, width, *aggregations):
+    buckets = np.floor(x / x[-1] * width).astype(int)
+    return pd.Series(y).groupby(buckets).agg(list(aggregations))
+
+
+def test_m4():
+    x, y = np.arange(100_000.), _walk(100_000)
+    indices = m4_indices(x, y, 0, x[-1], 100)
+    assert len(indices) <= 4 * 101
+    # the same lines at the resolution of the buckets
+    pd.testing.assert_frame_equal(
+        _per_bucket(x, y, 100, 'min', 'max', 'first', 'last'),
+        _per_bucket(x[indices], y[indices], 100, 'min', 'max', 'first', 'last'))
+
+    # a line per row, with gaps
+    y = np.vstack([y, -y])
+    y[0, 1000:2000] = np.nan
+    indices = m4_indices(x, y, 0, x[-1], 100)
+    assert np.isnan(y[0, indices]).any()
+    assert np.nanmax(y[0, indices]) == np.nanmax(y[0])
+    assert np.nanmax(y[1, indices]) == np.nanmax(y[1])
+
+    # the points around the domain are kept
+    indices = m4_indices(x, y, 1000.5, 2000.5, 10)
+    assert indices[0] == 1000 and indices[-1] == 2001
+
+
+@pytest.mark.parametrize('method', ['m4', 'minmax', 'lttb', 'every_nth', 'mean'])
+def test_reducers(method):
+    x, y = np.arange(100_000.), _walk(100_000)
+    dates = pd.date_range('2000-01-01', periods=x.size, freq='s').to_numpy()
+    for x_values in (x, dates):
+        lo, hi = as_numbers(x_values)[[0, -1]]
+        reduced = downsample(method, {'x': x_values, 'y': y}, lo, hi, 100)
+        assert reduced['x'].dtype == x_values.dtype
+        assert 90 <= len(reduced['x']) <= 4 * 101
+        assert len(reduced['x']) == len(reduced['y'])
+        assert np.all(np.diff(as_numbers(reduced['x'])) > 0)
+        # few points are sent as they are
+        reduced = downsample(method, {'x': x_values[:50], 'y': y[:50]}, lo, hi, 100)
+        assert len(reduced['x']) == 50
+
+
+@pytest.mark.parametrize('method', ['m4', 'minmax', 'lttb', 'every_nth', 'mean'])
+def test_reducers_memory_mapped(method, tmp_path, monkeypatch):
+    n = 1 << 20
+    x = np.datetime64('2000-01-01T00:00:00') + np.arange(n).astype('timedelta64[s]')
+    y = _walk(n)
+    lo, hi = as_numbers(x)[[n // 4, -n // 4]]
+    expected = downsample(method, {'x': x, 'y': y}, lo, hi, 100)
+    np.save(tmp_path / 'x.npy', x)
+    np.save(tmp_path / 'y.npy', y)
+    arrays = {name: np.load(tmp_path / ('%s.npy' % name), mmap_mode='r') for name in ('x', 'y')}
+
+    # the points are read a chunk at a time
+    monkeypatch.setattr(bqplot.downsampling, '_CHUNK_SIZE', 1 << 12)
+    tracemalloc.start()
+    try:
+        reduced = downsample(method, arrays, lo, hi, 100)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < n * 8 // 8
+    for name in ('x', 'y'):
+        np.testing.assert_array_equal(reduced[name], expected[name])
+
+
+def test_lttb():
+    x = np.linspace(0, 10, 10_000)
+    y = np.sin(x)
+    reduced = downsample('lttb', {'x': x, 'y': y}, 0, 10, 50)
+    # the extrema of a smooth curve are kept
+    assert np.isclose(reduced['y'].max(), 1, atol=5e-3)
+    assert np.isclose(reduced['y'].min(), -1, atol=5e-3)
+    assert reduced['x'][0] == 0 and reduced['x'][-1] == 10
+
+
+def test_mean():
+    x, y = np.arange(10.), np.arange(10.)
+    reduced = downsample('mean', {'x': x, 'y': y, 'colors': np.array(list('abcdefghij'))}, 0, 10, 2)
+    assert reduced['y'].tolist() == [2, 7]
+    assert reduced['colors'].tolist() == ['a', 'f']
+
+
+def test_register_reducer():
+    @register_reducer('ends')
+    def ends(x, y, lo, hi, width):
+        return np.array([0, len(x) - 1])
+
+    try:
+        scatter = bqplot.Scatter(x=np.arange(10.), y=np.arange(10.), size=np.arange(10.),
+                                 downsampling='ends')
+        reduced = scatter._reduced_arrays(['x', 'size'])
+        assert reduced['size'].tolist() == [0, 9]
+    finally:
+        del reducers['ends']
+
+    with pytest.raises(bqplot.TraitError):
+        bqplot.Lines(downsampling='unknown')
+
+
+def test_downsampling_points_only(scales):
+    # the samples of the boxes are not points
+    boxplot = bqplot.Boxplot(x=np.arange(10.), y=np.random.default_rng(0).uniform(size=(10, 100)),
+                             scales=scales, downsampling='m4')
+    assert boxplot._reduced_arrays(['x', 'y']) == {}
+    assert boxplot.get_state(['y'])['y']['shape'] == (10, 100)
+
+    lines = bqplot.Lines(x=np.arange(10_000.), y=np.zeros(5_000), scales=scales,
+                         downsampling='m4')
+    assert lines._reduced_arrays(['x', 'y']) == {}
+
+
+def test_flexline_downsampling(scales):
+    x = np.arange(10_000.)
+    flexline = bqplot.FlexLine(x=x, y=_walk(x.size), color=x, scales=scales,
+                               downsampling='lttb')
+    flexline.scales = {'x': bqplot.LinearScale(), 'y': scales['y'],
+                       'color': bqplot.ColorScale()}
+    reduced = flexline._reduced_arrays(['x', 'y', 'color'])
+    assert reduced.keys() == {'x', 'y', 'color'}
+    assert reduced['color'].tolist() == reduced['x'].tolist()
+
+
+@pytest.mark.parametrize('block_size', [1, 4, 64])
+def test_minmax_pyramid(block_size):
+    x, y = np.arange(100_000.), _walk(100_000)
+    y = np.vstack([y, -y[::-1]])
+    index = MinMaxPyramid(x, y, block_size=block_size)
+    assert index.levels.dtype == np.int32
+    for lo, hi, width in ((0, x[-1], 10), (1234.5, 98765.4, 37), (50_000, 50_005, 3)):
+        # the same points as scanning the series
+        assert index.indices(lo, hi, width).tolist() == m4_indices(x, y, lo, hi, width).tolist()
+        assert index.indices(lo, hi, width, first_last=False).tolist() == \
+            minmax_indices(x, y, lo, hi, width).tolist()
+
+    with pytest.raises(ValueError):
+        MinMaxPyramid(x, y, block_size=3)
+
+
+def test_minmax_pyramid_save(tmp_path):
+    x, y = np.arange(10_000.), _walk(10_000)
+    index = MinMaxPyramid(x, y, block_size=4)
+    index.save(str(tmp_path / 'index'))
+    np.save(tmp_path / 'y.npy', y)
+    y = np.load(tmp_path / 'y.npy', mmap_mode='r')
+    loaded = MinMaxPyramid.load(str(tmp_path / 'index'), x, y)
+    assert isinstance(loaded.levels, np.memmap)
+    assert loaded.indices(0, x[-1], 10).tolist() == index.indices(0, x[-1], 10).tolist()
+
+    with pytest.raises(ValueError):
+        MinMaxPyramid.load(str(tmp_path / 'index'), x[:10], y[:10])
+
+
+def test_mark_downsampling_index(scales, monkeypatch):
+    monkeypatch.setattr(bqplot.Mark, '_index_min_points', 1000)
+    x, y = np.arange(100_000.), _walk(100_000)
+    lines = bqplot.Lines(x=x, y=y, downsampling='m4')
+    reduced = lines._reduced_arrays(['x'])
+    # built once per series
+    index = lines._index
+    assert index is not None and index.x is x
+    lines.scales = {'x': bqplot.LinearScale(min=10., max=2000.), 'y': scales['y']}
+    lines._reduced_arrays(['x'])
+    assert lines._index is index
+    lines.y = -y
+    lines._reduced_arrays(['x'])
+    assert lines._index is not index
+
+    # or given
+    index = MinMaxPyramid(x, y)
+    lines.downsampling_index = index
+    assert lines._downsampling_index(x, y) is index
+    lines.scales = {'x': bqplot.LinearScale(), 'y': scales['y']}
+    assert lines._reduced_arrays(['x'])['x'].tolist() == reduced['x'].tolist()
+
+
+def test_resample_ohlc():
+    x = np.arange('2020-01-01', '2020-03-01', dtype='datetime64[m]')
+    close = np.cumsum(np.random.default_rng(0).normal(size=len(x)))
+    y = np.stack([close - 0.5, close + 1, close - 1, close], axis=1)
+    span = as_numbers(x[-1]) - as_numbers(x[0])
+    assert ohlc_period(x, span, 100) == (1, 'D')
+    assert ohlc_period(x, span, 5) == (1, 'M')
+    assert ohlc_period(np.arange(10.), 1000., 30) == 50.
+
+    days, candles = resample_ohlc(x, y, (1, 'D'))
+    assert len(days) == 60 and days.dtype == x.dtype
+    assert days[1] == np.datetime64('2020-01-02T00:00')
+    first_day = y[:1440]
+    np.testing.assert_array_equal(candles[0], [first_day[0, 0], first_day[:, 1].max(),
+                                               first_day[:, 2].min(), first_day[-1, 3]])
+    # weeks start on Mondays
+    weeks, _ = resample_ohlc(x, y, (1, 'W'))
+    assert weeks[0] == np.datetime64('2019-12-30T00:00')
+    # the columns follow the format
+    _, hl = resample_ohlc(x, y[:, [1, 2]], (1, 'M'), format='hl')
+    assert hl[0].tolist() == [y[:44640, 1].max(), y[:44640, 2].min()]
+
+
+def test_ohlc_resample():
+    x = np.arange('2020-01-01', '2020-03-01', dtype='datetime64[m]')
+    close = np.cumsum(np.random.default_rng(0).normal(size=len(x)))
+    y = np.stack([close - 0.5, close + 1, close - 1, close], axis=1)
+    scale_x = bqplot.DateScale()
+    ohlc = bqplot.OHLC(x=x, y=y, scales={'x': scale_x, 'y': bqplot.LinearScale()},
+                       resample=True, resample_min_width=10)
+    ohlc._plot_width = 1000
+    # at most 100 candles of 1 day
+    state = ohlc.get_state(['x', 'y'])
+    assert state['x']['shape'] == (60,) and state['y']['shape'] == (60, 4)
+    assert ohlc.x.shape == x.shape
+
+    # finer candles on zoom, in the domain and a domain width on each side
+    sent = []
+    ohlc._send = lambda msg, buffers=None: sent.append(msg)
+    scale_x.set_state({'min': '2020-01-10T00:00:00.000', 'max': '2020-01-10T12:00:00.000'})
+    assert sent[-1]['state'].keys() >= {'x', 'y'}
+    resampled = ohlc._reduced_arrays(['x'])['x']
+    assert resampled[1] - resampled[0] == np.timedelta64(15, 'm')
+    assert resampled[0] <= np.datetime64('2020-01-09T12:00') and \
+        resampled[-1] >= np.datetime64('2020-01-10T23:45')
+    # each period is resampled once
+    assert len(ohlc._resampled[-1]) == 2
+    # the candles sent as they are when wide enough
+    scale_x.set_state({'min': '2020-01-10T00:00:00.000', 'max': '2020-01-10T01:00:00.000'})
+    resampled = ohlc._reduced_arrays(['x'])['x']
+    assert resampled[1] - resampled[0] == np.timedelta64(1, 'm')
+
+    # the indices of the resampled candles refer to the candles of their period
+    scale_x.set_state({'min': '2020-01-10T00:00:00.000', 'max': '2020-01-10T12:00:00.000'})
+    resampled = ohlc._reduced_arrays(['x'])['x']
+    first = np.searchsorted(x, resampled[0])
+    ohlc.set_state({'selected': [0]})
+    assert ohlc.selected.tolist() == list(range(first, first + 15))
+    ohlc.selected = [first + 16]
+    assert array_from_json(ohlc.get_state('selected')['selected']).tolist() == [1]
+    clicks = []
+    ohlc.on_element_click(lambda mark, content: clicks.append(content))
+    ohlc._handle_custom_msgs(None, {'event': 'element_click', 'data': {'index': 1}})
+    assert clicks[-1]['data']['index'] == first + 15
+    # resampled candles cannot be changed in the frontend
+    with pytest.warns(UserWarning):
+        ohlc.set_state({'y': array_to_json(ohlc._reduced_arrays(['y'])['y'] + 1)})
+    np.testing.assert_array_equal(ohlc.y, y)
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import bqplot
+import numpy as np
+
+
+def _sent_states(widgets, sent=None):
+    sent = [] if sent is None else sent
+    for widget in widgets:
+        widget._send = lambda msg, buffers=None, widget=widget: sent.append((widget, msg['state']))
+    return sent
+
+
+def test_batch_updates(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales)
+    axis = bqplot.Axis(scale=scales['x'])
+    figure = bqplot.Figure(marks=[lines], axes=[axis])
+    sent = _sent_states([figure, lines, axis, scales['x'], scales['y']])
+
+    with figure.batch_updates() as scheduler:
+        for i in range(10):
+            lines.y = np.arange(3.) + i
+            lines.colors = ['red']
+            scales['x'].min = float(i)
+        figure.title = 'title'
+        assert sent == []
+        scheduler.flush()
+        # only the latest values are sent, one message per widget
+        assert len(sent) == 3
+        states = {widget: state for widget, state in sent}
+        assert states[lines].keys() == {'y', 'colors'}
+        assert states[scales['x']] == {'min': 9.0}
+        assert states[figure] == {'title': 'title'}
+
+        # marks added later are batched too
+        scatter = bqplot.Scatter(x=[0.], y=[0.], scales=scales)
+        figure.marks = [lines, scatter]
+        scheduler.flush()
+        sent.clear()
+        _sent_states([scatter], sent)
+        scatter.x = [1.]
+        axis.label = 'x'
+        assert sent == []
+
+    # the pending updates are sent when the scheduler stops
+    assert len(sent) == 2
+    assert not scatter._holding_sync
+
+    scatter.x = [2.]
+    assert len(sent) == 3
+    assert scheduler.flushes == 3
+
+
+def test_batch_updates_rate(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales)
+    figure = bqplot.Figure(marks=[lines])
+    sent = _sent_states([lines])
+
+    async def update():
+        start = time.perf_counter()
+        scheduler = figure.batch_updates(max_rate=50)
+        for i in range(20):
+            lines.y = np.arange(3.) + i
+            await asyncio.sleep(0.005)
+        scheduler.stop()
+        return scheduler, time.perf_counter() - start
+
+    scheduler, duration = asyncio.run(update())
+    # 20 updates, sent in at most one message per 20ms
+    assert 1 <= len(sent) <= duration * 50 + 1
+    assert scheduler.flushes == len(sent)
+    assert all(state.keys() == {'y'} for _, state in sent)
+
+
+def test_batch_updates_removed_mark(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales)
+    other = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales)
+    figure = bqplot.Figure(marks=[lines, other])
+    sent = _sent_states([lines, other])
+
+    scheduler = figure.batch_updates()
+    lines.y = np.arange(3.) + 1
+    figure.marks = [other]
+    scheduler.flush()
+    # the pending update is sent, and the removed mark is no longer held
+    assert [widget for widget, _ in sent] == [lines]
+    assert not lines._holding_sync
+    lines.y = np.arange(3.) + 2
+    assert len(sent) == 2
+    other.y = np.arange(3.) + 1
+    assert len(sent) == 2
+    scheduler.stop()
+    assert len(sent) == 3
+
+
+def test_batch_updates_error(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales)
+    broken = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales)
+    figure = bqplot.Figure(marks=[lines, broken])
+    sent = _sent_states([lines])
+
+    def fail(msg, buffers=None):
+        raise ValueError('cannot send')
+    broken._send = fail
+
+    async def update():
+        scheduler = figure.batch_updates(max_rate=100)
+        broken.y = np.arange(3.) + 1
+        lines.y = np.arange(3.) + 1
+        await asyncio.sleep(0.05)
+        # the task survives the error
+        lines.y = np.arange(3.) + 2
+        await asyncio.sleep(0.05)
+        running = scheduler._task is not None and not scheduler._task.done()
+        # the failing mark is no longer held
+        held = broken._holding_sync
+        scheduler.stop()
+        return running, held
+
+    assert asyncio.run(update()) == (True, False)
+    # the updates of the other marks are sent
+    assert len(sent) == 2 and all(state.keys() == {'y'} for _, state in sent)
@@ -1,4 +1,7 @@
+import asyncio
+
 import bqplot
+from bqplot.traits import array_to_json, array_from_json, is_memory_mapped
 import numpy as np
 import pytest
 
@@ -48,3 +51,484 @@ def test_bars(scales):
     assert bars.y[0][1] == 2
     assert bars.y[1][0] == 3
     assert bars.y[1][1] == 4
+
+
+def test_scatter_arrow(scales):
+    pa = pytest.importorskip('pyarrow')
+    x = np.arange(10, dtype=np.float64)
+    scatter = bqplot.Scatter(x=pa.array(x), y=pa.chunked_array([x[:5], x[5:]]), scales=scales)
+    assert isinstance(scatter.x, np.ndarray)
+    assert scatter.x.tolist() == x.tolist()
+    assert scatter.y.tolist() == x.tolist()
+
+    # no copy of the arrow buffers
+    arrow_x = pa.array(x)
+    scatter.x = arrow_x
+    assert np.shares_memory(scatter.x, np.frombuffer(arrow_x.buffers()[1], dtype=np.float64))
+    assert np.shares_memory(np.asarray(scatter.get_state()['x']['value']), scatter.x)
+
+    # nulls are mapped to NaN and NaT
+    scatter.y = pa.array([0, None, 2] * 3 + [3])
+    assert np.isnan(scatter.y[1])
+    lines = bqplot.Lines(x=pa.array([0, None], type=pa.timestamp('ms')), y=[1, 2], scales=scales)
+    assert np.isnat(lines.x[1])
+
+    # dictionary arrays are decoded
+    label = bqplot.Label(text=pa.array(['a', 'b', 'a']).dictionary_encode())
+    assert label.text.tolist() == ['a', 'b', 'a']
+
+
+def _sent_messages(mark):
+    sent = []
+    mark._send = lambda msg, buffers=None: sent.append(msg)
+    return sent
+
+
+def test_split_buffers():
+    from bqplot.marks import _split_buffers
+    x = memoryview(np.arange(3.))
+    content = {'type': 'extend', 'data': {'x': {'value': x, 'shape': (3,)},
+                                          'names': {'codes': [b'ab', 1]}}}
+    state, paths, buffers = _split_buffers(content)
+    assert paths == [['data', 'x', 'value'], ['data', 'names', 'codes', 0]]
+    assert buffers[0] is x and buffers[1] == b'ab'
+    assert state['data']['x'] == {'value': None, 'shape': (3,)}
+    assert state['data']['names']['codes'] == [None, 1]
+    assert content['data']['x']['value'] is x
+
+
+def test_lines_extend(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales)
+    sent = _sent_messages(lines)
+    changes = []
+    lines.observe(changes.append, 'x')
+
+    lines.extend(x=[3, 4], y=[5, 6])
+    assert lines.x.tolist() == [0, 1, 2, 3, 4]
+    assert lines.y.tolist() == [0, 1, 2, 5, 6]
+    assert len(changes) == 1
+    # only the new points are sent, in the dtype of the current arrays
+    assert len(sent) == 1
+    content = sent[0]['content']
+    assert content['type'] == 'extend'
+    assert content['data']['x']['dtype'] == 'float64'
+    assert content['data']['x']['shape'] == (2,)
+    assert content['axis'] == {'x': 0, 'y': 0}
+
+    lines.append(x=5, y=7)
+    assert lines.x.tolist() == [0, 1, 2, 3, 4, 5]
+    assert sent[-1]['content']['data']['y']['shape'] == (1,)
+
+    # a point for each line
+    lines = bqplot.Lines(x=np.arange(2.), y=np.zeros((3, 2)), scales=scales)
+    sent = _sent_messages(lines)
+    lines.append(x=2, y=[1, 2, 3])
+    assert lines.y.tolist() == [[0, 0, 1], [0, 0, 2], [0, 0, 3]]
+    assert sent[-1]['content']['axis'] == {'x': 0, 'y': 1}
+
+    # the whole array is sent if its dtype changes
+    lines = bqplot.Lines(x=np.arange(3), y=np.arange(3), scales=scales)
+    sent = _sent_messages(lines)
+    lines.extend(x=[3.5], y=[4])
+    methods = {msg['method']: msg for msg in sent}
+    assert methods['custom']['content']['data'].keys() == {'y'}
+    assert methods['update']['state'].keys() == {'x'}
+    assert lines.x.tolist() == [0, 1, 2, 3.5]
+
+    with pytest.raises(bqplot.TraitError):
+        lines.extend(colors=['red'])
+
+
+def test_ohlc_extend(scales):
+    ohlc = bqplot.OHLC(x=np.arange(2.), y=np.arange(8.).reshape(2, 4), scales=scales)
+    sent = _sent_messages(ohlc)
+    ohlc.append(x=2, y=[1, 2, 3, 4])
+    assert ohlc.y.shape == (3, 4)
+    assert ohlc.y[-1].tolist() == [1, 2, 3, 4]
+    assert sent[-1]['content']['data']['y']['shape'] == (1, 4)
+    assert sent[-1]['content']['axis'] == {'x': 0, 'y': 0}
+
+
+def test_extend_fresh_marks(scales):
+    # the empty defaults are replaced by the first points
+    ohlc = bqplot.OHLC(scales=scales)
+    ohlc.append(x=1., y=[1, 2, 0, 1])
+    ohlc.append(x=2., y=[1, 3, 0, 2])
+    assert ohlc.x.tolist() == [1., 2.]
+    assert ohlc.y.tolist() == [[1, 2, 0, 1], [1, 3, 0, 2]]
+
+    lines = bqplot.Lines(scales=scales)
+    lines.extend(x=[0., 1.], y=[[1., 3.], [2., 4.]])
+    lines.append(x=2., y=[5., 6.])
+    assert lines.x.tolist() == [0., 1., 2.]
+    assert lines.y.tolist() == [[1., 3., 5.], [2., 4., 6.]]
+
+
+def test_lines_max_points(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales, max_points=4)
+    sent = _sent_messages(lines)
+
+    lines.extend(x=[3, 4], y=[3, 4])
+    assert lines.x.tolist() == [1, 2, 3, 4]
+    assert sent[-1]['content']['evict'] == {'x': 1, 'y': 1}
+    x = lines.x
+
+    for i in range(5, 100):
+        lines.append(x=i, y=i)
+        assert sent[-1]['content']['evict'] == {'x': 1, 'y': 1}
+    assert lines.x.tolist() == [96, 97, 98, 99]
+    assert lines.y.tolist() == [96, 97, 98, 99]
+    # previous values are left unchanged
+    assert x.tolist() == [1, 2, 3, 4]
+
+    # only the points which are kept are sent
+    lines.extend(x=np.arange(10.), y=np.arange(10.))
+    assert lines.x.tolist() == [6, 7, 8, 9]
+    assert sent[-1]['content']['data']['x']['shape'] == (4,)
+    assert sent[-1]['content']['evict'] == {'x': 4, 'y': 4}
+
+    # a point for each line
+    lines = bqplot.Lines(x=np.arange(2.), y=np.zeros((2, 2)), scales=scales, max_points=2)
+    sent = _sent_messages(lines)
+    lines.append(x=2, y=[1, 2])
+    assert lines.y.tolist() == [[0, 1], [0, 2]]
+    assert sent[-1]['content']['evict'] == {'x': 1, 'y': 1}
+
+
+def _ack(mark, msg):
+    sync_id = msg['content']['sync_id'] if msg['method'] == 'custom' \
+        else msg['state']['_sync_id']
+    mark._handle_custom_msgs(None, {'event': 'ack', 'sync_id': sync_id})
+
+
+def test_sync_policy_latest(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales,
+                         sync_policy='latest', max_pending=1)
+    sent = _sent_messages(lines)
+
+    lines.y = np.ones(3)
+    assert len(sent) == 1
+    # the frontend is lagging, only the latest values are sent once it caught up
+    lines.y = np.zeros(3)
+    lines.colors = ['red']
+    lines.append(x=3, y=4)
+    assert len(sent) == 1
+    assert lines.sync_metrics['pending'] == 1
+    assert lines.sync_metrics['held_back'] == 3
+
+    _ack(lines, sent[0])
+    assert len(sent) == 2
+    assert sent[1]['method'] == 'update'
+    assert sent[1]['state'].keys() == {'x', 'y', 'colors', '_sync_id'}
+    metrics = lines.sync_metrics
+    assert metrics['sent'] == 2
+    assert metrics['acked'] == 1
+    assert metrics['pending'] == 1
+    assert metrics['latency'] >= 0
+
+    # updates which are never acknowledged expire
+    lines._ack_timeout = 0
+    lines.y = np.ones(4)
+    assert len(sent) == 3
+    assert lines.sync_metrics['timeouts'] == 1
+
+
+def test_sync_policy_coalesce(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales,
+                         sync_policy='coalesce', max_pending=1, max_points=4)
+    sent = _sent_messages(lines)
+
+    lines.append(x=3, y=3)
+    for i in range(4, 10):
+        lines.append(x=i, y=i)
+    assert len(sent) == 1
+    assert lines.x.tolist() == [6, 7, 8, 9]
+
+    # the points extended in between are sent at once
+    _ack(lines, sent[0])
+    content = sent[-1]['content']
+    assert content['type'] == 'extend'
+    assert content['data']['x']['shape'] == (4,)
+    assert content['evict'] == {'x': 4, 'y': 4}
+
+    # an assignment supersedes the points
+    lines.append(x=10, y=10)
+    lines.y = np.zeros(4)
+    _ack(lines, sent[-1])
+    assert len(sent) == 4
+    assert sent[-2]['content']['data'].keys() == {'x'}
+    assert sent[-1]['state'].keys() == {'y', '_sync_id'}
+
+
+def test_sync_policy_block(scales):
+    lines = bqplot.Lines(x=np.arange(3.), y=np.arange(3.), scales=scales,
+                         sync_policy='block', max_pending=1)
+    sent = _sent_messages(lines)
+    lines.append(x=3, y=3)
+    lines.append(x=4, y=4)
+    # all the updates are sent
+    assert len(sent) == 2
+
+    async def produce():
+        assert not await lines.wait_for_acks(timeout=0.01)
+        asyncio.get_running_loop().call_soon(_ack, lines, sent[-1])
+        assert await lines.wait_for_acks(timeout=1)
+    asyncio.run(produce())
+    assert lines.sync_metrics['acked'] == 2
+
+
+def test_lines_downsampling(scale_y):
+    x = np.arange(100_000.)
+    y = np.sin(x / 100) + np.random.default_rng(0).normal(size=x.size)
+    scale_x = bqplot.LinearScale()
+    lines = bqplot.Lines(x=x, y=y, scales={'x': scale_x, 'y': scale_y},
+                         downsampling='m4')
+    lines._plot_width = 500
+    sent = _sent_messages(lines)
+    lines._handle_custom_msgs(None, {'event': 'plot_size', 'width': 200, 'height': 100})
+    # the kernel keeps the whole arrays
+    assert lines.x.shape == (100_000,)
+    state = lines.get_state(['x'])
+    assert state['x']['shape'][0] <= 4 * 200
+    # x and y are sent together
+    assert sent[-1]['state'].keys() == {'x', 'y'}
+    assert sent[-1]['state']['y']['shape'] == state['x']['shape']
+    # the min and max of each pixel column are kept
+    reduced = lines._reduced_arrays(['y'])['y']
+    assert reduced.max() == y.max() and reduced.min() == y.min()
+
+    # on zoom, the visible domain and one more domain width on each side
+    scale_x.min, scale_x.max = 1000., 2000.
+    reduced = lines._reduced_arrays(['x'])['x']
+    assert reduced[0] == 0 and reduced[-1] == 3001
+    assert sent[-1]['state']['x']['shape'] == reduced.shape
+    # no update when panning within the points sent
+    count = len(sent)
+    # as PanZoom does, through the frontend
+    scale_x.set_state({'min': 1500., 'max': 2500.})
+    assert len(sent) == count
+    scale_x.set_state({'min': 3500., 'max': 4500.})
+    assert len(sent) == count + 1
+
+    # extended points are sent downsampled
+    lines.extend(x=np.arange(100_000., 100_010.), y=np.zeros(10))
+    assert sent[-1]['method'] == 'update'
+    assert lines.x.shape == (100_010,)
+
+    # unsorted x are sent as they are
+    lines.x = x[::-1]
+    assert lines.get_state(['x'])['x']['shape'] == (100_000,)
+
+
+def test_lines_downsampling_handdraw(scale_y):
+    x = np.arange(10_000.)
+    y = np.sin(x / 100)
+    lines = bqplot.Lines(x=x, y=y, scales={'x': bqplot.LinearScale(), 'y': scale_y},
+                         downsampling='m4')
+    lines._plot_width = 50
+    sent = _sent_messages(lines)
+    bqplot.interacts.HandDraw(lines=lines)
+    reduced = lines._reduced_arrays(['x', 'y'])
+    rows = reduced['x'].astype(np.int64)
+    assert len(rows) < 10_000
+
+    # the lines drawn in the frontend update the rows of the points sent
+    drawn = reduced['y'].copy()
+    drawn[10:20] = 5.
+    lines.set_state({'y': array_to_json(drawn)})
+    assert lines.y.shape == (10_000,) and lines.x.shape == (10_000,)
+    np.testing.assert_array_equal(lines.y[rows], drawn)
+    others = np.setdiff1d(np.arange(10_000), rows)
+    np.testing.assert_array_equal(lines.y[others], y[others])
+
+    # indices of the points sent are mapped to rows of the data
+    lines.set_state({'selected': [1, 3]})
+    np.testing.assert_array_equal(lines.selected, rows[[1, 3]])
+    lines.selected = [rows[2], others[0]]
+    np.testing.assert_array_equal(array_from_json(lines.get_state('selected')['selected']), [2])
+
+    # averaged points cannot be mapped to the data
+    lines.downsampling = 'mean'
+    count = len(sent)
+    with pytest.warns(UserWarning):
+        lines.set_state({'y': array_to_json(lines._reduced_arrays(['y'])['y'] + 1)})
+    np.testing.assert_array_equal(lines.y[rows], drawn)
+    # and the frontend gets the data of the kernel back
+    assert 'y' in sent[count]['state']
+    # the selection of a mean is the rows of its bucket
+    lines.set_state({'selected': [0]})
+    assert lines.selected.tolist() == list(range(len(lines.selected)))
+    assert len(lines.selected) > 1
+
+
+def _domain_observers(scale):
+    return [getattr(handler, '__self__', None)
+            for name in ('min', 'max')
+            for handler in scale._trait_notifiers.get(name, {}).get('change', [])]
+
+
+def test_downsampling_scale_observers(scales):
+    scale_x = scales['x']
+    # the domains are only observed by marks which downsample
+    lines = bqplot.Lines(x=np.arange(10.), y=np.arange(10.), scales=scales)
+    assert lines not in _domain_observers(scale_x)
+    lines.downsampling = 'm4'
+    assert lines in _domain_observers(scale_x)
+    lines.downsampling = None
+    assert lines not in _domain_observers(scale_x)
+
+    lines.downsampling = 'm4'
+    lines.close()
+    assert lines not in _domain_observers(scale_x)
+
+
+def test_needs_plot_size(scale_y):
+    x = np.arange(100.)
+    lines = bqplot.Lines(x=x, y=x, scales={'x': bqplot.LinearScale(), 'y': scale_y})
+    sent = _sent_messages(lines)
+    assert not lines._needs_plot_size
+    # the frontend reports the size of the plot area only when it is needed
+    lines.downsampling = 'm4'
+    assert lines._needs_plot_size
+    assert any(msg['state'].get('_needs_plot_size') for msg in sent)
+    lines.downsampling = None
+    assert not lines._needs_plot_size
+    scatter = bqplot.Scatter(x=x, y=x, scales=lines.scales, cull_to_viewport=True)
+    assert scatter._needs_plot_size
+    density = bqplot.DensityScatter(x=x, y=x)
+    assert density._needs_plot_size
+
+
+def test_density_scatter():
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=100_000), rng.normal(size=100_000)
+    scale_x, scale_y = bqplot.LinearScale(), bqplot.LinearScale()
+    density = bqplot.DensityScatter(x=x, y=y, scales={'x': scale_x, 'y': scale_y},
+                                    bin_size=4)
+    sent = _sent_messages(density)
+    density._handle_custom_msgs(None, {'event': 'plot_size', 'width': 200, 'height': 100})
+    # the grid is sent in place of the points
+    assert sent[-1]['state'].keys() == {'x', 'y', 'color'}
+    state = density.get_state(['x', 'y', 'color'])
+    assert state['x']['shape'] == (50,) and state['y']['shape'] == (25,)
+    assert state['color']['shape'] == (25, 50)
+    color = density._reduced_arrays(['color'])['color']
+    assert np.nansum(color) == 100_000
+    assert np.isnan(color).any() and np.nanmin(color) >= 1
+
+    # aggregated again on zoom
+    count = len(sent)
+    scale_x.set_state({'min': 0., 'max': 1.})
+    assert len(sent) == count + 1
+    color = density._reduced_arrays(['color'])['color']
+    assert np.nansum(color) == np.sum((x >= 0) & (x <= 1))
+    # not when nothing changed
+    scale_y.set_state({'min': None, 'max': None})
+    assert len(sent) == count + 1
+
+    # weights are summed
+    density.weights = np.full(100_000, 0.5)
+    assert len(sent) == count + 2
+    color = density._reduced_arrays(['color'])['color']
+    assert np.nansum(color) == 0.5 * np.sum((x >= 0) & (x <= 1))
+
+
+def test_scatter_cull_to_viewport():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0, 100, size=10_000), rng.uniform(0, 100, size=10_000)
+    scale_x, scale_y = bqplot.LinearScale(), bqplot.LinearScale()
+    scatter = bqplot.Scatter(x=x, y=y, color=np.arange(10_000.),
+                             scales={'x': scale_x, 'y': scale_y},
+                             cull_to_viewport=True, cull_margin=0.5, selected=[0])
+    sent = _sent_messages(scatter)
+    # all the points without scale domains
+    assert scatter.get_state(['x'])['x']['shape'] == (10_000,)
+
+    scale_x.set_state({'min': 10., 'max': 20.})
+    scale_y.set_state({'min': 50., 'max': 60.})
+    inside = (x >= 5) & (x <= 25) & (y >= 45) & (y <= 65)
+    state = sent[-1]['state']
+    assert {'x', 'y', 'color', 'selected'} <= state.keys()
+    assert state['x']['shape'] == (inside.sum(),)
+    # the kernel keeps the whole arrays
+    assert scatter.x.shape == (10_000,)
+    reduced = scatter._reduced_arrays(['x', 'color'])
+    np.testing.assert_array_equal(reduced['x'], x[inside])
+    np.testing.assert_array_equal(reduced['color'], np.flatnonzero(inside))
+
+    # no update when panning within the margin
+    count = len(sent)
+    scale_x.set_state({'min': 12., 'max': 22.})
+    assert len(sent) == count
+    scale_x.set_state({'min': 40., 'max': 50.})
+    assert len(sent) == count + 1
+    rows = np.flatnonzero((x >= 35) & (x <= 55) & (y >= 45) & (y <= 65))
+
+    # selections are rows of the data
+    scatter.set_state({'selected': [1, 3]})
+    np.testing.assert_array_equal(scatter.selected, rows[[1, 3]])
+    scatter.selected = [rows[2], 0]
+    np.testing.assert_array_equal(array_from_json(scatter.get_state('selected')['selected']), [2])
+    clicks = []
+    scatter.on_element_click(lambda mark, content: clicks.append(content))
+    scatter._handle_custom_msgs(None, {'event': 'element_click', 'data': {'index': 4}})
+    assert clicks[-1]['data']['index'] == rows[4]
+
+    # moved points update the rows of the data
+    moved = scatter._reduced_arrays(['x'])['x'].copy()
+    moved[0] = 42.5
+    scatter.set_state({'x': array_to_json(moved)})
+    assert scatter.x.shape == (10_000,) and scatter.x[rows[0]] == 42.5
+
+
+def test_heatmap_tiled(tmp_path):
+    values = np.memmap(tmp_path / 'color.dat', dtype=np.float64, mode='w+', shape=(3000, 2000))
+    values[:] = np.add.outer(np.arange(3000.), np.arange(2000.))
+    scale_x, scale_y = bqplot.LinearScale(), bqplot.LinearScale()
+    heatmap = bqplot.HeatMap(color=values, scales={'x': scale_x, 'y': scale_y}, tiled=True)
+    heatmap._tile_size = 256
+    heatmap._plot_width, heatmap._plot_height = 500, 400
+    # the whole matrix at the level of a cell per 8x8 block
+    state = heatmap.get_state(['x', 'y', 'color'])
+    assert state['color']['shape'] == (375, 250)
+    reduced = heatmap._reduced_arrays(['x', 'y', 'color'])
+    assert reduced['x'][0] == 3.5 and reduced['y'][1] == 11.5
+    assert reduced['color'][1, 0] == 11.5 + 3.5
+    assert heatmap.color.shape == (3000, 2000)
+
+    # the tiles in the domains at a finer level on zoom
+    sent = _sent_messages(heatmap)
+    scale_x.set_state({'min': 600., 'max': 900.})
+    scale_y.set_state({'min': 1000., 'max': 1300.})
+    assert sent[-1]['state'].keys() >= {'x', 'y', 'color'}
+    reduced = heatmap._reduced_arrays(['x', 'y', 'color'])
+    assert reduced['x'][0] == 512 and reduced['x'][-1] == 1023
+    assert reduced['y'][0] == 768 and reduced['y'][-1] == 1535
+    assert reduced['color'].shape == (768, 512)
+    np.testing.assert_array_equal(reduced['color'], values[768:1536, 512:1024])
+    # no update when panning within the tiles sent
+    count = len(sent)
+    scale_x.set_state({'min': 650., 'max': 950.})
+    assert len(sent) == count
+
+
+def test_memory_mapped_data(tmp_path, scale_y):
+    x, y = np.arange(100_000.), np.sin(np.arange(100_000.) / 100)
+    np.save(tmp_path / 'x.npy', x)
+    y_file = np.memmap(tmp_path / 'y.dat', dtype=np.float64, mode='w+', shape=y.shape)
+    y_file[:] = y
+    lines = bqplot.Lines(x=tmp_path / 'x.npy', y=y_file, downsampling='m4',
+                         scales={'x': bqplot.LinearScale(), 'y': scale_y})
+    # the data stays on disk
+    assert is_memory_mapped(lines.x) and is_memory_mapped(lines.y)
+    np.testing.assert_array_equal(lines.x, x)
+    # and is sent downsampled
+    lines._plot_width = 200
+    state = lines.get_state(['x', 'y'])
+    assert state['x']['shape'][0] <= 4 * 200
+    np.testing.assert_array_equal(lines._reduced_arrays(['y'])['y'],
+                                  y[lines._reduced_arrays(['x'])['x'].astype(int)])
+
+    density = bqplot.DensityScatter(x=y_file, y=tmp_path / 'x.npy')
+    color = density._reduced_arrays(['color'])['color']
+    assert np.nansum(color) == 100_000